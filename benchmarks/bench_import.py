@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# benchmarks/bench_import.py
+"""Бенчмарк загрузки категории из локального CSV (CSVSource -> cache.ingest).
+
+    python -m benchmarks.bench_import --rows 1000000
+
+Генерирует CSV с заданным числом строк и дважды импортирует его в одну
+категорию (первая загрузка и повторная - с расчетом истории цен).
+Для каждого прогона: время, строк в секунду, пиковая память Python
+(tracemalloc) и прирост RSS процесса.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def write_csv(path: str, rows: int, seed: int = 1) -> None:
+    """CSV «модель;цена» с заголовком, как выгрузка прайса из Excel"""
+    rnd = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["Модель", "Цена"])
+        for i in range(rows):
+            writer.writerow([f"Synthetic model {i} 256GB", f"{rnd.randrange(5000, 250000, 100)}"])
+
+def run_case(path: str, db_path: str) -> dict:
+    from bot.config import config
+    from data import cache
+    from data.database import Database
+    from services import CSVSource
+
+    cache.db = Database(db_path)
+    source = CSVSource(path)
+
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    count = asyncio.run(cache.ingest("bench_import", "Bench import", source.iter_products()))
+
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rows": count,
+        "wall": wall,
+        "rate": count / wall if wall else 0,
+        "peak_mb": peak / 1024 / 1024,
+        "rss_mb": (process.memory_info().rss - rss_before) / 1024 / 1024,
+        "chunk": config.FILE_CHUNK_ROWS,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта CSV")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.csv")
+        started = time.perf_counter()
+        write_csv(path, args.rows)
+        print(f"CSV: {args.rows} строк, {os.path.getsize(path) / 1024 / 1024:.1f} MB "
+              f"(сгенерирован за {time.perf_counter() - started:.1f} с)")
+
+        header = f"{'run':>8} {'rows':>9} {'wall, s':>8} {'rows/s':>9} {'peak, MB':>9} {'rss, MB':>8}"
+        print(header)
+        print("-" * len(header))
+        # Второй прогон заменяет данные категории и считает изменения цен
+        for run in ("first", "reload"):
+            r = run_case(path, os.path.join(tmp, "bench.db"))
+            print(f"{run:>8} {r['rows']:>9} {r['wall']:>8.2f} {r['rate']:>9.0f} "
+                  f"{r['peak_mb']:>9.1f} {r['rss_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# benchmarks/bench_logging.py
+"""Бенчмарк затрат на логирование в расчете на одно обновление.
+
+    python -m benchmarks.bench_logging --updates 20000
+
+Одно обновление - те же записи, что пишут aiogram и обработчик редактирования
+категории: «Update is handled» от aiogram, вход в обработчик и состояние FSM.
+
+before - как было: basicConfig (запись в файл в потоке вызова), f-строки на INFO,
+полный словарь состояния в сообщении.
+after - setup_logging (очередь, вывод в отдельном потоке), ленивое форматирование,
+подробности на DEBUG; вариант json - то же в формате JSON.
+Время - в потоке вызова (для бота это event loop) и полное, до записи в файл.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitoring.logs import setup_logging, stop_logging
+
+STATE = {
+    "category_id": "apple",
+    "subcategory_id": "iphone_16_pro",
+    "field": "sheet_name",
+    "message_id": 123456,
+    "sheets": [f"Лист {i}" for i in range(20)],
+}
+
+def update_before(logger: logging.Logger, aiogram_logger: logging.Logger, update_id: int) -> None:
+    logger.info(f"Обработка изменения значения от пользователя {100500}: {'iPhone 16 Pro'}")
+    logger.info(f"Данные состояния: {STATE}")
+    aiogram_logger.info(f"Update id={update_id} is handled. Duration {12} ms by bot id={777}")
+
+def update_after(logger: logging.Logger, aiogram_logger: logging.Logger, update_id: int) -> None:
+    logger.debug("Обработка изменения значения от пользователя %s", 100500)
+    logger.debug("Поля состояния: %s", STATE)
+    aiogram_logger.info("Update id=%d is handled. Duration %d ms by bot id=%d", update_id, 12, 777)
+
+def reset_root() -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+def run_case(name: str, updates: int, path: str) -> dict:
+    logger = logging.getLogger("bot.handlers.category_management")
+    aiogram_logger = logging.getLogger("aiogram.event")
+    reset_root()
+
+    if name == "before":
+        logging.basicConfig(level=logging.INFO, filename=path,
+                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        emit = update_before
+    else:
+        listener = setup_logging("INFO", "json" if name == "after-json" else "text")
+        listener.handlers[0].setStream(open(path, "w", encoding="utf-8"))
+        emit = update_after
+
+    started = time.perf_counter()
+    for update_id in range(updates):
+        emit(logger, aiogram_logger, update_id)
+    caller = time.perf_counter() - started
+
+    if name != "before":
+        # Дождаться, пока поток выведет очередь
+        stop_logging()
+    total = time.perf_counter() - started
+    reset_root()
+
+    return {
+        "caller_us": caller / updates * 1e6,
+        "total_us": total / updates * 1e6,
+        "size_kb": os.path.getsize(path) / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк логирования")
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    header = f"{'case':>11} {'loop, us/upd':>13} {'total, us/upd':>14} {'log, KB':>9}"
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("before", "after", "after-json"):
+            r = run_case(name, args.updates, os.path.join(tmp, f"{name}.log"))
+            print(f"{name:>11} {r['caller_us']:>13.1f} {r['total_us']:>14.1f} {r['size_kb']:>9.0f}")
+
+if __name__ == "__main__":
+    main()
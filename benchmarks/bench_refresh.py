@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# benchmarks/bench_refresh.py
+"""Бенчмарк полного обновления (cache.update_all) на fake Sheets API.
+
+    python -m benchmarks.bench_refresh --sizes 10 100 1000 --rows 200 --latency 20
+
+Для каждого размера: время update_all, время записи в SQLite,
+пиковая память Python (tracemalloc) и прирост RSS процесса.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_sheets_server import FakeSheetsServer
+
+def build_categories(sheet_names, per_category: int = 20) -> dict:
+    """Категории с подкатегориями по 20 листов"""
+    categories = {}
+    for start in range(0, len(sheet_names), per_category):
+        cat_key = f"bench_{start // per_category}"
+        categories[cat_key] = {
+            "name": f"Bench {start // per_category}",
+            "emoji": "🧪",
+            "callback": f"menu_{cat_key}",
+            "order": start // per_category + 1,
+            "subcategories": {
+                f"{cat_key}_{name}": {
+                    "name": name,
+                    "emoji": "📄",
+                    "sheet_name": name,
+                    "callback": f"show_{cat_key}_{name}",
+                    "order": i + 1
+                }
+                for i, name in enumerate(sheet_names[start:start + per_category])
+            }
+        }
+    return categories
+
+def run_case(sheets: int, rows: int, latency: float, quota: int) -> dict:
+    server = FakeSheetsServer(sheets=sheets, rows=rows, latency=latency)
+    server.start_in_thread()
+
+    # Настройки читаются при импорте - задаем их до импорта бота
+    os.environ["SHEETS_API_ENDPOINT"] = server.url
+    os.environ["SPREADSHEET_ID"] = "bench"
+
+    from bot.config import config
+    from data import cache
+    from data.database import Database
+    from services import QuotaManager, sheets_reader
+
+    config.SPREADSHEET_ID = "bench"
+    config.CATEGORIES = build_categories(server.sheet_names())
+    # Новый клиент на адрес сервера этого прогона
+    sheets_reader.api_endpoint = server.url
+    sheets_reader.client = None
+    # Fake API квоту не ограничивает - по умолчанию меряем чистую пропускную способность
+    sheets_reader.quota = QuotaManager(quota, quota)
+
+    write_time = 0.0
+
+    def timed(method):
+        def wrapper(*args, **kwargs):
+            nonlocal write_time
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                write_time += time.perf_counter() - started
+        return wrapper
+
+    class TimedDatabase(Database):
+        def open_writer(self, *args, **kwargs):
+            writer = super().open_writer(*args, **kwargs)
+            writer.write = timed(writer.write)
+            writer.commit = timed(writer.commit)
+            return writer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.db = TimedDatabase(os.path.join(tmp, "bench.db"))
+
+        process = psutil.Process()
+        rss_before = process.memory_info().rss
+        tracemalloc.start()
+        started = time.perf_counter()
+
+        async def refresh():
+            try:
+                await cache.update_all()
+            finally:
+                await sheets_reader.close()
+
+        asyncio.run(refresh())
+
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = process.memory_info().rss
+        db_size = os.path.getsize(os.path.join(tmp, "bench.db"))
+
+    requests = server.requests
+    server.stop_thread()
+
+    return {
+        "sheets": sheets,
+        "rows": sheets * rows,
+        "requests": requests,
+        "wall": wall,
+        "db_write": write_time,
+        "peak_mb": peak / 1024 / 1024,
+        "rss_mb": (rss_after - rss_before) / 1024 / 1024,
+        "db_mb": db_size / 1024 / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обновления данных")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=200, help="строк на лист")
+    parser.add_argument("--latency", type=float, default=20, help="задержка fake API, мс")
+    parser.add_argument("--quota", type=int, default=100000, help="квота планировщика, запросов в минуту")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    header = f"{'sheets':>7} {'rows':>9} {'req':>6} {'wall, s':>9} {'db, s':>8} {'peak, MB':>9} {'rss, MB':>8} {'db, MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        r = run_case(size, args.rows, args.latency / 1000, args.quota)
+        print(
+            f"{r['sheets']:>7} {r['rows']:>9} {r['requests']:>6} {r['wall']:>9.2f} "
+            f"{r['db_write']:>8.2f} {r['peak_mb']:>9.1f} {r['rss_mb']:>8.1f} {r['db_mb']:>7.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# benchmarks/bench_render.py
+"""Бенчмарк форматирования списка товаров категории.
+
+    python -m benchmarks.bench_render --rows 1000 10000 100000
+
+before - прежний format_products_list: строка собирается через +=, цена
+форматируется заново в каждой строке, разметка не экранируется.
+after - render_product_pages: строки копятся в списке и склеиваются один раз
+на страницу, format_price кэшируется; вариант after-pages - то же с разбиением
+на сообщения по 4096 символов.
+Прайс - как в таблицах: разделы с короткими заголовками, повторяющиеся цены,
+часть строк с ценой «0» и «FALSE».
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.utils.renderer import MESSAGE_LIMIT, render_product_pages
+from bot.utils.renderer import format_price as cached_format_price
+
+def format_price_before(price: str) -> str:
+    try:
+        price_clean = price.replace(' ', '').replace('₽', '').replace('$', '').strip()
+        if '.' in price_clean:
+            price_float = float(price_clean)
+            if price_float.is_integer():
+                formatted = f"{int(price_float):,}".replace(',', ' ')
+            else:
+                formatted = f"{price_float:,.2f}".replace(',', ' ')
+        else:
+            formatted = f"{int(price_clean):,}".replace(',', ' ')
+        return f"{formatted} ₽"
+    except (ValueError, TypeError):
+        return price
+
+def format_products_list_before(products, label: str) -> str:
+    count = 1
+    if not products:
+        return f"❌ Нет данных по категории {label}"
+
+    text = f"<b>{label}</b>\n"
+    text += "_" * 35 + "\n"
+    text += "<i>Вы можете скопировать нужную позицию простым нажатием на текст, а затем отправить её в личные сообщения</i> \n"
+    text += "_" * 35 + "\n\n"
+
+    for model, price in products:
+        if price != 'FALSE':
+            formatted_price = format_price_before(price)
+            if len(model) > 17:
+                if price != "0":
+                    text += f"<code><i>{count}. {model}</i>\n   💰 <b>{formatted_price}</b></code>\n\n"
+                    count += 1
+            else:
+                text += f"<b>_______  {model}  _______</b>\n"
+                count = 1
+    return text
+
+def make_products(rows: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    prices = [f"{rng.randrange(10, 300) * 500}" for _ in range(300)]
+    products = []
+    for i in range(rows):
+        if i % 40 == 0:
+            products.append((f"iPhone {i // 40}", ""))
+            continue
+        roll = rng.random()
+        price = "0" if roll < 0.03 else "FALSE" if roll < 0.05 else rng.choice(prices)
+        products.append((f"Apple iPhone 16 Pro {i} 256GB Desert Titanium", price))
+    return products
+
+def measure(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк форматирования списка товаров")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    label = "📦 apple_iphone"
+    header = f"{'rows':>7} {'case':>11} {'ms':>9} {'pages':>6}"
+    print(header)
+    print("-" * len(header))
+    for rows in args.rows:
+        products = make_products(rows)
+        # Без спецсимволов HTML вывод совпадает с прежним символ в символ
+        before = format_products_list_before(products, label)
+        assert render_product_pages(products, "apple_iphone", limit=None)[0] == before
+        assert all(len(page) <= MESSAGE_LIMIT for page in render_product_pages(products, "apple_iphone"))
+
+        cases = {
+            "before": lambda: format_products_list_before(products, label),
+            "after": lambda: render_product_pages(products, "apple_iphone", limit=None),
+            "after-pages": lambda: render_product_pages(products, "apple_iphone"),
+        }
+        for name, func in cases.items():
+            cached_format_price.cache_clear()
+            ms = measure(func, args.repeat)
+            pages = len(render_product_pages(products, "apple_iphone")) if name == "after-pages" else 1
+            print(f"{rows:>7} {name:>11} {ms:>9.2f} {pages:>6}")
+
+if __name__ == "__main__":
+    main()
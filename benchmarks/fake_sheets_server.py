@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# benchmarks/fake_sheets_server.py
+"""Локальный заменитель Google Sheets API для бенчмарков и отладки без ключей.
+
+Запуск отдельно:
+    python -m benchmarks.fake_sheets_server --sheets 100 --rows 500 --latency 50
+
+Затем в .env:
+    SHEETS_API_ENDPOINT=http://127.0.0.1:8085/
+    SPREADSHEET_ID=fake
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+def make_sheet_name(index: int) -> str:
+    """Название синтетического листа"""
+    return f"sheet_{index}"
+
+def generate_rows(rows: int, seed: int) -> List[List[str]]:
+    """Синтетический лист: заголовок, разделы и позиции «модель - цена»"""
+    rnd = random.Random(seed)
+    values = [["Модель", "Цена"]]
+    for i in range(rows):
+        if i % 25 == 0:
+            # Короткое название - заголовок раздела
+            values.append([f"Серия {i // 25 + 1}", "-"])
+        else:
+            price = rnd.choice([0, rnd.randrange(5000, 250000, 100)])
+            values.append([f"Synthetic model {seed}-{i} 256GB", f"{price}"])
+    return values
+
+class FakeSheetsServer:
+    """aiohttp-сервер с подмножеством Sheets API v4 (и метаданными файла из Drive API v3)"""
+
+    def __init__(self, sheets: int = 10, rows: int = 200, latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 1, error_rate: float = 0.0,
+                 quota: int = 0):
+        self.sheets = sheets
+        self.rows = rows
+        self.latency = latency
+        # Доля ответов 503 - для проверки повторов и размыкателя
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        # Квота запросов в минуту (скользящее окно) - сверх нее ответ 429, как у Google
+        self.quota = quota
+        self.quota_errors = 0
+        self._recent = deque()
+        self.host = host
+        self.port = port
+        self.seed = seed
+        self.requests = 0
+        # Ревизия таблицы для Drive files.get, растет при touch()
+        self.version = 1
+        self.modified_at = time.time()
+
+        self._data: Dict[str, List[List[str]]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Адрес для SHEETS_API_ENDPOINT"""
+        return f"http://{self.host}:{self.port}/"
+
+    def sheet_names(self) -> List[str]:
+        return [make_sheet_name(i) for i in range(self.sheets)]
+
+    def touch(self) -> None:
+        """Имитировать правку таблицы: новая ревизия и новые данные"""
+        self.version += 1
+        self.modified_at = time.time()
+        self.seed += 1
+        self._data.clear()
+
+    def _get_values(self, sheet_name: str) -> Optional[List[List[str]]]:
+        if sheet_name not in self._data:
+            if sheet_name not in self.sheet_names():
+                return None
+            self._data[sheet_name] = generate_rows(self.rows, self.seed + len(self._data))
+        return self._data[sheet_name]
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _fault(self) -> Optional[web.Response]:
+        if self.quota:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota:
+                self.quota_errors += 1
+                return web.json_response(
+                    {"error": {"code": 429, "message": "Quota exceeded for quota metric 'Read requests'"}},
+                    status=429
+                )
+            self._recent.append(now)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response(
+                {"error": {"code": 503, "message": "The service is currently unavailable."}},
+                status=503
+            )
+        return None
+
+    async def handle_values(self, request: web.Request) -> web.Response:
+        """GET /v4/spreadsheets/{id}/values/{range}"""
+        await self._delay()
+        fault = self._fault()
+        if fault:
+            return fault
+        range_name = request.match_info["range"]
+        sheet_name, _, cells = range_name.partition("!")
+        sheet_name = sheet_name.strip("'")
+
+        values = self._get_values(sheet_name)
+        if values is None:
+            return web.json_response(
+                {"error": {"code": 400, "message": f"Unable to parse range: {range_name}"}},
+                status=400
+            )
+
+        # Диапазон строк вида A5001:B10000 (A:B - весь лист)
+        rows = re.fullmatch(r"[A-Z]+(\d+):[A-Z]+(\d+)", cells)
+        if rows:
+            values = values[int(rows.group(1)) - 1:int(rows.group(2))]
+
+        response = web.json_response({
+            "range": range_name,
+            "majorDimension": "ROWS",
+            "values": values
+        })
+        # Как и Google - gzip, если клиент его принимает
+        response.enable_compression()
+        return response
+
+    async def handle_spreadsheet(self, request: web.Request) -> web.Response:
+        """GET /v4/spreadsheets/{id}"""
+        await self._delay()
+        fault = self._fault()
+        if fault:
+            return fault
+        return web.json_response({
+            "spreadsheetId": request.match_info["spreadsheet_id"],
+            "sheets": [
+                {"properties": {"sheetId": i, "title": title, "index": i,
+                                "gridProperties": {"rowCount": self.rows + 1, "columnCount": 2}}}
+                for i, title in enumerate(self.sheet_names())
+            ]
+        })
+
+    async def handle_drive_file(self, request: web.Request) -> web.Response:
+        """GET /drive/v3/files/{id} - только метаданные"""
+        await self._delay()
+        fault = self._fault()
+        if fault:
+            return fault
+        return web.json_response({
+            "version": str(self.version),
+            "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(self.modified_at))
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v4/spreadsheets/{spreadsheet_id}/values/{range}", self.handle_values)
+        app.router.add_get("/v4/spreadsheets/{spreadsheet_id}", self.handle_spreadsheet)
+        app.router.add_get("/drive/v3/files/{file_id}", self.handle_drive_file)
+        return app
+
+    async def start(self) -> None:
+        """Запустить сервер в текущем event loop"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 порт выбирает ОС
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"🧪 Fake Sheets API: {self.url} ({self.sheets} листов × {self.rows} строк)")
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self) -> None:
+        """Запустить сервер в отдельном потоке (для блокирующих клиентов)"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-sheets", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self) -> None:
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+async def _serve(args) -> None:
+    server = FakeSheetsServer(args.sheets, args.rows, args.latency / 1000, args.host, args.port,
+                              error_rate=args.error_rate, quota=args.quota)
+    await server.start()
+    logger.info("SHEETS_API_ENDPOINT=%s", server.url)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Google Sheets API")
+    parser.add_argument("--sheets", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа, мс")
+    parser.add_argument("--error-rate", type=float, default=0, help="доля ответов 503")
+    parser.add_argument("--quota", type=int, default=0, help="запросов в минуту, сверх - 429")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,5 @@
 # bot/config/__init__.py
 from .settings import config, Config
+from .category_store import CategoryConflict
 
-__all__ = ['config', 'Config']
\ No newline at end of file
+__all__ = ['config', 'Config', 'CategoryConflict']
\ No newline at end of file
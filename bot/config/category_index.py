@@ -0,0 +1,71 @@
+# bot/config/category_index.py
+from typing import Any, Dict, Iterable, Optional
+
+from .category_store import NodeKey
+
+class CategoryMeta:
+    """Метаданные категории с товарами: прямой категории или подкатегории"""
+
+    __slots__ = ("key", "name", "emoji", "parent", "sheet")
+
+    def __init__(self, key: str, node: Dict[str, Any], parent: Optional[str] = None):
+        self.key = key
+        self.name = node.get("name", key)
+        self.emoji = node.get("emoji") or "📦"
+        # Ключ родительской категории; None - прямая категория верхнего уровня
+        self.parent = parent
+        self.sheet = node.get("sheet_name")
+
+    @property
+    def label(self) -> str:
+        return f"{self.emoji} {self.name}"
+
+class CategoryIndex:
+    """Индекс категорий с товарами по ключу (тому же, что у товаров в БД).
+
+    Строится при загрузке дерева и обновляется правками (Config._after_edit) - форматтеры
+    и обработчики получают название, эмодзи, родителя и лист за один поиск в словаре
+    вместо обхода всего дерева.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, CategoryMeta] = {}
+
+    def rebuild(self, categories: Dict[str, Dict[str, Any]]) -> None:
+        entries = {}
+        for cat_key, category in categories.items():
+            if category.get("is_direct"):
+                entries[cat_key] = CategoryMeta(cat_key, category)
+            for sub_key, subcategory in category.get("subcategories", {}).items():
+                entries[sub_key] = CategoryMeta(sub_key, subcategory, cat_key)
+        self._entries = entries
+
+    def update(self, categories: Dict[str, Dict[str, Any]],
+               changed: Iterable[NodeKey], deleted: Iterable[NodeKey]) -> None:
+        """Обновить записи измененных и удаленных узлов (parent, key)"""
+        for parent, key in deleted:
+            entry = self._entries.get(key)
+            if entry is not None and entry.parent == (parent or None):
+                del self._entries[key]
+
+        for parent, key in changed:
+            if parent:
+                node = categories.get(parent, {}).get("subcategories", {}).get(key)
+                if node is not None:
+                    self._entries[key] = CategoryMeta(key, node, parent)
+                continue
+            node = categories.get(key)
+            if node is not None and node.get("is_direct"):
+                self._entries[key] = CategoryMeta(key, node)
+            elif key in self._entries and self._entries[key].parent is None:
+                # Прямая категория стала группой - товаров у нее больше нет
+                del self._entries[key]
+
+    def get(self, key: str) -> Optional[CategoryMeta]:
+        return self._entries.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
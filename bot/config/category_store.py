@@ -0,0 +1,373 @@
+# bot/config/category_store.py
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Узел дерева: (родитель, ключ); у категорий верхнего уровня родитель - пустая строка
+NodeKey = Tuple[str, str]
+
+class CategoryConflict(Exception):
+    """Узел уже изменен или удален другим администратором (или такой ключ уже есть)"""
+
+def node_key(category_id: str, subcategory_id: Optional[str] = None) -> NodeKey:
+    return (category_id, subcategory_id) if subcategory_id is not None else ("", category_id)
+
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+def make_key(text: str, taken: Iterable[str] = ()) -> str:
+    """Ключ узла из названия: "Айфон 15 Про" -> aifon_15_pro; занятый ключ получает суффикс _2, _3...
+
+    Длина ограничена: ключ попадает в callback_data (не больше 64 байт).
+    """
+    base = re.sub(r"[^a-z0-9]+", "_", text.lower().translate(_TRANSLIT)).strip("_")[:40] or "sub"
+    taken = set(taken)
+    key, suffix = base, 2
+    while key in taken:
+        key = f"{base}_{suffix}"
+        suffix += 1
+    return key
+
+def _row_fields(node: Dict[str, Any]) -> Tuple[Optional[int], str]:
+    """Порядок и остальные поля узла (name, emoji, sheet_name, callback, is_direct...) в JSON"""
+    fields = {name: value for name, value in node.items() if name not in ("order", "subcategories")}
+    return node.get("order"), json.dumps(fields, ensure_ascii=False, sort_keys=True)
+
+def flatten(tree: Dict[str, Dict[str, Any]]) -> Dict[NodeKey, Dict[str, Any]]:
+    """Дерево categories.json -> узлы по (родитель, ключ); категория идет раньше своих подкатегорий"""
+    nodes = {}
+    for cat_key, category in tree.items():
+        nodes[("", cat_key)] = category
+        for sub_key, subcategory in category.get("subcategories", {}).items():
+            nodes[(cat_key, sub_key)] = subcategory
+    return nodes
+
+def build_tree(rows: Iterable[Tuple[str, str, Optional[int], str, int]]
+               ) -> Tuple[Dict[str, Dict[str, Any]], Dict[NodeKey, int]]:
+    """Строки (родитель, ключ, порядок, поля, версия) -> дерево и версии узлов.
+
+    Строки категорий должны идти раньше строк подкатегорий (см. _SELECT_NODES).
+    """
+    tree: Dict[str, Dict[str, Any]] = {}
+    versions: Dict[NodeKey, int] = {}
+    for parent, key, order, fields, node_version in rows:
+        node = json.loads(fields)
+        if order is not None:
+            node["order"] = order
+        if parent == "":
+            if not node.get("is_direct"):
+                node["subcategories"] = {}
+            tree[key] = node
+        elif parent in tree:
+            tree[parent].setdefault("subcategories", {})[key] = node
+        else:
+            logger.warning("⚠️ Подкатегория %s без категории %s пропущена", key, parent)
+            continue
+        versions[(parent, key)] = node_version
+    return tree, versions
+
+def apply_change(state: Dict[str, Any], op: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Дерево после записи истории: base - дерево целиком, patch - измененные и удаленные категории"""
+    if op == "base":
+        return dict(changes)
+    state = dict(state)
+    for key in changes.get("delete", []):
+        state.pop(key, None)
+    state.update(changes.get("set", {}))
+    return state
+
+# Узлы дерева - строки categories с полями (без fields - удаленная категория или известная
+# только по товарам, см. data/database.py, v4). Родитель - ключ строки parent_id, у верхних ''
+_SELECT_NODES = '''
+    SELECT COALESCE(p.key, ''), c.key, c.sort_order, c.fields, c.version
+    FROM categories c LEFT JOIN categories p ON p.id = c.parent_id
+    WHERE c.fields IS NOT NULL{where}
+    ORDER BY c.parent_id IS NOT NULL, COALESCE(c.sort_order, 999), c.key
+'''
+
+# Условие на узел (родитель, ключ): параметры - ключ родителя ('' у верхних) и ключ
+_NODE = '''COALESCE((SELECT p.key FROM categories p WHERE p.id = categories.parent_id), '') = ?
+    AND key = ? AND fields IS NOT NULL'''
+
+_UPSERT = '''
+    INSERT INTO categories (key, name, emoji, sort_order, parent_id, fields) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET
+        name = excluded.name, emoji = excluded.emoji, sort_order = excluded.sort_order,
+        parent_id = excluded.parent_id, fields = excluded.fields, version = version + 1
+    {where}
+    RETURNING version
+'''
+
+class CategoryTransaction:
+    """Правки дерева внутри одной транзакции (см. CategoryStore.transaction).
+
+    Каждая правка узла увеличивает его версию. Если передана expected_version,
+    а строка уже другой версии (или удалена), правка отклоняется CategoryConflict -
+    так две одновременные правки не затирают друг друга молча.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, base_version: int):
+        self.conn = conn
+        # Версия дерева до транзакции и после нее (заполняется при commit)
+        self.base_version = base_version
+        self.version = base_version
+        # Новые версии узлов, измененных в транзакции, и удаленные узлы
+        self.versions: Dict[NodeKey, int] = {}
+        self.deleted: Set[NodeKey] = set()
+
+    def _parent_id(self, parent: str) -> Optional[int]:
+        if not parent:
+            return None
+        row = self.conn.execute(
+            'SELECT id FROM categories WHERE key = ? AND parent_id IS NULL AND fields IS NOT NULL', (parent,)
+        ).fetchone()
+        if row is None:
+            raise CategoryConflict(f"{parent} не найден")
+        return row[0]
+
+    def _upsert(self, key: NodeKey, node: Dict[str, Any], where: str = "") -> Optional[int]:
+        order, fields = _row_fields(node)
+        row = self.conn.execute(
+            _UPSERT.format(where=where),
+            (key[1], node.get("name", key[1]), node.get("emoji"), order, self._parent_id(key[0]), fields)
+        ).fetchone()
+        return row[0] if row else None
+
+    def insert(self, key: NodeKey, node: Dict[str, Any]) -> int:
+        """Новый узел. Ключи уникальны во всем дереве: товары ссылаются на категорию по ключу.
+
+        Строка удаленной категории с тем же ключом (и ее товары) переходит к новому узлу.
+        """
+        version = self._upsert(key, node, "WHERE categories.fields IS NULL")
+        if version is None:
+            raise CategoryConflict(f"{key[1]} уже существует")
+        self.versions[key] = version
+        return version
+
+    def update(self, key: NodeKey, node: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        """Записать поля узла целиком; новая версия узла"""
+        order, fields = _row_fields(node)
+        row = self.conn.execute(f'''
+            UPDATE categories SET name = ?, emoji = ?, sort_order = ?, fields = ?, version = version + 1
+            WHERE {_NODE} AND (? IS NULL OR version = ?)
+            RETURNING version
+        ''', (node.get("name", key[1]), node.get("emoji"), order, fields,
+              *key, expected_version, expected_version)).fetchone()
+        if row is None:
+            raise CategoryConflict(f"{key[1]} изменен или удален")
+        self.versions[key] = row[0]
+        return row[0]
+
+    def set_orders(self, parent: str, orders: Iterable[Tuple[str, int]]) -> int:
+        """Порядок нескольких соседних узлов; обновляются только строки с другим порядком"""
+        changed = 0
+        for key, order in orders:
+            row = self.conn.execute(f'''
+                UPDATE categories SET sort_order = ?, version = version + 1
+                WHERE {_NODE} AND sort_order IS NOT ?
+                RETURNING version
+            ''', (order, parent, key, order)).fetchone()
+            if row is not None:
+                self.versions[(parent, key)] = row[0]
+                changed += 1
+        return changed
+
+    def delete(self, key: NodeKey, expected_version: Optional[int] = None) -> None:
+        """Удалить узел (категорию - вместе с подкатегориями).
+
+        Строка остается без полей: на нее ссылаются товары и сводка по категории.
+        """
+        cursor = self.conn.execute(
+            f'UPDATE categories SET fields = NULL, version = version + 1 WHERE {_NODE} AND (? IS NULL OR version = ?)',
+            (*key, expected_version, expected_version)
+        )
+        if cursor.rowcount == 0:
+            raise CategoryConflict(f"{key[1]} изменен или удален")
+        self.deleted.add(key)
+        if key[0] == "":
+            self.delete_children(key[1])
+
+    def delete_children(self, parent: str) -> int:
+        keys = self.conn.execute('''
+            UPDATE categories SET fields = NULL, version = version + 1
+            WHERE fields IS NOT NULL AND parent_id = (SELECT id FROM categories WHERE key = ?)
+            RETURNING key
+        ''', (parent,)).fetchall()
+        self.deleted.update((parent, key) for key, in keys)
+        return len(keys)
+
+    def replace_all(self, tree: Dict[str, Dict[str, Any]]) -> int:
+        """Привести таблицу к дереву целиком: пишутся только отличающиеся строки"""
+        new_nodes = flatten(tree)
+        old_rows = {
+            (parent, key): (order, fields)
+            for parent, key, order, fields, _ in self.conn.execute(_SELECT_NODES.format(where=""))
+        }
+        changed = 0
+        for key, node in new_nodes.items():
+            if old_rows.get(key) == _row_fields(node):
+                continue
+            self.versions[key] = self._upsert(key, node)
+            changed += 1
+        # Узел, перенесенный к другому родителю, уже переписан выше - на старом месте его нет
+        moved = {key for _, key in new_nodes}
+        for key in old_rows.keys() - new_nodes.keys():
+            if key[1] not in moved:
+                self.conn.execute(f'UPDATE categories SET fields = NULL, version = version + 1 WHERE {_NODE}', key)
+            self.deleted.add(key)
+            changed += 1
+        return changed
+
+class CategoryStore:
+    """Дерево категорий в базе бота (таблица categories): строка на категорию или подкатегорию.
+
+    Правка одного узла - обновление одной строки в транзакции, а не перезапись файла.
+    Версия узла растет при каждой его правке (оптимистическая блокировка правок админов),
+    версия дерева - при каждой транзакции: по ней Config понимает, что его копия
+    устарела (правка из другого процесса). Та же транзакция пишет правку в историю
+    (category_history) - по ней /history и /rollback.
+    Схему создает и обновляет data.Database; соединение одно на процесс, под блокировкой.
+    """
+
+    # История сжимается, когда записей больше max_history: база на месте старых и keep последних
+    max_history = 1000
+    keep_history = 200
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # Правки редкие и мелкие: fsync только на контрольных точках WAL
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+
+    @contextmanager
+    def transaction(self, reason: str = "") -> Iterator[CategoryTransaction]:
+        """Транзакция записи: все правки внутри with применяются вместе или никак"""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                tx = CategoryTransaction(self.conn, self._tree_version())
+                yield tx
+                tx.version = self.conn.execute(
+                    'UPDATE category_tree SET version = version + 1 WHERE id = 1 RETURNING version'
+                ).fetchone()[0]
+                if tx.versions or tx.deleted:
+                    self._record(tx, reason)
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def _record(self, tx: CategoryTransaction, reason: str) -> None:
+        """Запись истории: затронутые категории целиком (первая запись - все дерево)"""
+        if self.conn.execute('SELECT 1 FROM category_history LIMIT 1').fetchone() is None:
+            op = "base"
+            changes, _ = build_tree(self.conn.execute(_SELECT_NODES.format(where="")))
+        else:
+            op = "patch"
+            touched = sorted({parent or key for parent, key in [*tx.versions, *tx.deleted]})
+            tree, _ = build_tree(self.conn.execute(
+                _SELECT_NODES.format(where=" AND COALESCE(p.key, c.key) IN (SELECT value FROM json_each(?))"),
+                (json.dumps(touched),)
+            ))
+            changes = {"set": {key: tree[key] for key in touched if key in tree},
+                       "delete": [key for key in touched if key not in tree]}
+        self.conn.execute(
+            'INSERT INTO category_history (version, changed_at, op, reason, changes) VALUES (?, ?, ?, ?, ?)',
+            (tx.version, time.time(), op, reason, json.dumps(changes, ensure_ascii=False))
+        )
+
+        count = self.conn.execute('SELECT COUNT(*) FROM category_history').fetchone()[0]
+        if count > self.max_history:
+            cut = self.conn.execute(
+                'SELECT version FROM category_history ORDER BY version DESC LIMIT 1 OFFSET ?',
+                (self.keep_history,)
+            ).fetchone()[0]
+            self.conn.execute(
+                "UPDATE category_history SET op = 'base', changes = ? WHERE version = ?",
+                (json.dumps(self._state_at(cut), ensure_ascii=False), cut)
+            )
+            self.conn.execute('DELETE FROM category_history WHERE version < ?', (cut,))
+
+    def _tree_version(self) -> int:
+        return self.conn.execute('SELECT version FROM category_tree WHERE id = 1').fetchone()[0]
+
+    def tree_version(self) -> int:
+        with self._lock:
+            return self._tree_version()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self.conn.execute('SELECT 1 FROM categories WHERE fields IS NOT NULL LIMIT 1').fetchone() is None
+
+    def load(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[NodeKey, int], int]:
+        """Дерево в формате categories.json, версии узлов и версия дерева"""
+        with self._lock:
+            # Чтение и версия дерева - из одного снимка базы
+            self.conn.execute('BEGIN')
+            try:
+                rows = self.conn.execute(_SELECT_NODES.format(where="")).fetchall()
+                version = self._tree_version()
+            finally:
+                self.conn.execute('COMMIT')
+        return (*build_tree(rows), version)
+
+    def last_change(self) -> Optional[float]:
+        """Время последней правки дерева (None - правок не было)"""
+        with self._lock:
+            return self.conn.execute('SELECT MAX(changed_at) FROM category_history').fetchone()[0]
+
+    def history(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние правки по порядку: номер (версия дерева), время, причина, затронутые категории"""
+        with self._lock:
+            rows = self.conn.execute('''
+                SELECT version, changed_at, op, reason, changes FROM category_history
+                ORDER BY version DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        result = []
+        for version, changed_at, op, reason, changes in reversed(rows):
+            changes = json.loads(changes) if op == "patch" else {}
+            result.append({
+                "seq": version,
+                "ts": changed_at,
+                "op": op,
+                "reason": reason,
+                "keys": list(changes.get("set", {})) + changes.get("delete", []),
+            })
+        return result
+
+    def _state_at(self, version: int) -> Optional[Dict[str, Any]]:
+        # От последней базы не позже version - правки по порядку
+        rows = self.conn.execute('''
+            SELECT version, op, changes FROM category_history
+            WHERE version <= ? AND version >= COALESCE(
+                (SELECT MAX(version) FROM category_history WHERE op = 'base' AND version <= ?), 0)
+            ORDER BY version
+        ''', (version, version)).fetchall()
+        if not rows or rows[-1][0] != version:
+            return None
+        state: Dict[str, Any] = {}
+        for _, op, changes in rows:
+            state = apply_change(state, op, json.loads(changes))
+        return state
+
+    def state_at(self, version: int) -> Optional[Dict[str, Any]]:
+        """Дерево сразу после правки version (для отката); None - такой правки в истории нет"""
+        with self._lock:
+            return self._state_at(version)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,131 @@
+# bot/config/persistence.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def atomic_write(path: Path, text: str) -> None:
+    """Записать файл целиком или не записать вовсе: временный файл рядом, fsync, rename.
+
+    При сбое посреди записи на месте остается прежний файл, а не обрезанный JSON.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # rename попадает на диск вместе с записью каталога
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class CategoryPersistence:
+    """Копия дерева категорий в categories.json, записываемая вне event loop.
+
+    Основное хранилище дерева и история правок - база бота (category_store); файл -
+    копия для чтения человеком и переноса. Правленный вручную файл загружается
+    обратно кнопкой «Загрузить из файла» (Config.reimport_categories_file).
+
+    schedule() только снимает копию дерева (компактный json.dumps - доли миллисекунды).
+    Через debounce секунд после последней правки одна фоновая запись атомарно
+    переписывает файл и его копию - серия кликов админа дает одну запись на диск.
+    Без запущенного loop запись синхронная.
+    """
+
+    def __init__(self, path: Path, backup_path: Path, debounce: float = 0.5):
+        self.path = Path(path)
+        self.backup_path = Path(backup_path)
+        self.debounce = debounce
+        # Последний снимок дерева, еще не записанный в файл, и число правок в нем
+        self._pending: Optional[str] = None
+        self._edits = 0
+        self._tasks = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._write_lock = asyncio.Lock()
+
+    def track(self, state: Dict[str, Any], changed_at: Optional[float]) -> None:
+        """Сверить файл с деревом из базы при загрузке.
+
+        Файл, отставший от базы (сбой до отложенной записи), переписывается. Файл новее
+        последней правки в базе изменен вручную - он остается до загрузки в базу.
+        """
+        if not state and not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                if json.load(f) == state:
+                    return
+            if changed_at is not None and self.path.stat().st_mtime > changed_at:
+                logger.warning("⚠️ %s изменен вручную - загрузите его в базу кнопкой «Загрузить из файла»",
+                               self.path)
+                return
+        except (OSError, ValueError):
+            pass
+        self.schedule(state)
+
+    def schedule(self, categories: Dict[str, Any]) -> None:
+        """Поставить текущее дерево на запись"""
+        self._pending = json.dumps(categories, ensure_ascii=False)
+        self._edits += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_pending()
+            return
+
+        # Каждая новая правка откладывает запись еще на debounce
+        if self._timer:
+            self._timer.cancel()
+        self._timer = loop.call_later(self.debounce, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        # Записи идут по очереди (flush под блокировкой); ссылка держит задачу до завершения
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        """Записать отложенную копию (вызывается и при остановке бота)"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        async with self._write_lock:
+            if self._pending is not None:
+                await asyncio.to_thread(self._write_pending)
+
+    def _write_pending(self) -> None:
+        snapshot, edits = self._pending, self._edits
+        self._pending, self._edits = None, 0
+        if snapshot is None:
+            return
+
+        try:
+            text = self._render(json.loads(snapshot))
+            atomic_write(self.path, text)
+            atomic_write(self.backup_path, text)
+            logger.info("✅ Категории сохранены в: %s (правок: %d)", self.path, edits)
+        except Exception as e:
+            logger.error("❌ Ошибка сохранения категорий: %s", e)
+
+    @staticmethod
+    def _render(state: Dict[str, Any]) -> str:
+        return json.dumps(state, ensure_ascii=False, indent=2)
@@ -1,10 +1,22 @@
 # bot/config/settings.py
 from dotenv import load_dotenv
 import os
+import asyncio
+import functools
 import json
-from typing import Dict, List, Any
+import logging
+from typing import Callable, Dict, List, Any, Optional, Tuple, TypeVar
 from pathlib import Path
 
+from monitoring.logs import parse_sampling
+from .category_index import CategoryIndex
+from .category_store import CategoryConflict, CategoryStore, CategoryTransaction, NodeKey, node_key
+from .persistence import CategoryPersistence
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
 # Находим корневую директорию проекта
 root_dir = Path(__file__).parent.parent.parent
 env_path = root_dir / '.env'
@@ -12,9 +24,17 @@ env_path = root_dir / '.env'
 # Загружаем переменные окружения
 if env_path.exists():
     load_dotenv(env_path)
-    print(f"✅ Файл .env загружен из: {env_path}")
+    logger.info("✅ Файл .env загружен из: %s", env_path)
 else:
-    print(f"⚠️ Файл .env не найден по пути: {env_path}")
+    logger.warning("⚠️ Файл .env не найден по пути: %s", env_path)
+
+def _edit(method):
+    """Правки дерева по одной: подготовка по копии, транзакция и обновление копии не перемежаются"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with self._edit_lock:
+            return await method(self, *args, **kwargs)
+    return wrapper
 
 class Config:
     """Класс конфигурации"""
@@ -29,58 +49,434 @@ class Config:
     # Google Sheets
     SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
     SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
+    # Адрес альтернативного Sheets API (например, локальный fake-сервер для бенчмарков)
+    SHEETS_API_ENDPOINT = os.getenv('SHEETS_API_ENDPOINT')
+    # Размер пула keep-alive соединений к Sheets API
+    SHEETS_MAX_CONNECTIONS = int(os.getenv('SHEETS_MAX_CONNECTIONS', 10))
+    # Повторы запросов и размыкатель (после N сбоев подряд таблица пропускается на M секунд)
+    SHEETS_RETRY_ATTEMPTS = int(os.getenv('SHEETS_RETRY_ATTEMPTS', 4))
+    SHEETS_RETRY_BASE_DELAY = float(os.getenv('SHEETS_RETRY_BASE_DELAY', 0.5))
+    SHEETS_BREAKER_THRESHOLD = int(os.getenv('SHEETS_BREAKER_THRESHOLD', 5))
+    SHEETS_BREAKER_RESET = int(os.getenv('SHEETS_BREAKER_RESET', 60))
+    # Квота Sheets API: запросов чтения в минуту на пользователя (сервисный аккаунт) и всплеск
+    SHEETS_READ_QUOTA = int(os.getenv('SHEETS_READ_QUOTA', 60))
+    SHEETS_QUOTA_BURST = int(os.getenv('SHEETS_QUOTA_BURST', 10))
+    # Большие листы читаются блоками по столько строк (память не растет с размером листа)
+    SHEETS_CHUNK_ROWS = int(os.getenv('SHEETS_CHUNK_ROWS', 5000))
+    # Локальные файлы-источники (CSV/XLSX/JSON) разбираются блоками по столько строк
+    FILE_CHUNK_ROWS = int(os.getenv('FILE_CHUNK_ROWS', 20000))
 
     # Настройки кэша
+    # Период фоновой проверки таблицы, секунд (0 - только при запуске).
+    # Неизмененная таблица стоит одного запроса метаданных Drive
     CACHE_UPDATE_INTERVAL = int(os.getenv('CACHE_UPDATE_INTERVAL', 300))
+    # Обновление при запуске: background (в фоне), wait (дождаться) или off
+    STARTUP_REFRESH = os.getenv('STARTUP_REFRESH', 'background')
+    FILTER_CACHE_SIZE = int(os.getenv('FILTER_CACHE_SIZE', 256))
+
+    # Метрики: экспорт в формате Prometheus на локальный порт (0 - выключен) и период замера задержки event loop
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', 1.0))
+    # Сторож event loop: если loop не отвечает дольше порога (секунд), в лог пишется стек блокирующего вызова (0 - выключен)
+    LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', 0.5))
+
+    # Профилирование обновлений (/profile): включено при запуске, порог медленного обновления (с),
+    # доля медленных обновлений с профилем cProfile/tracemalloc, каталог и число хранимых профилей
+    PROFILE_UPDATES = os.getenv('PROFILE_UPDATES', 'false').lower() == 'true'
+    PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 1.0))
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 1.0))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'data/profiles')
+    PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+
+    # Логирование: уровень, формат (text или json) и выборка частых записей по модулям
+    # ("aiogram.event=0.1,services.google_sheets=0.2" - выводить каждую 10-ю / 5-ю запись ниже WARNING)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_SAMPLING = parse_sampling(os.getenv('LOG_SAMPLING', ''))
+
+    # Период /changes для первого визита (секунды) и лимит строк в ответе
+    CHANGES_DEFAULT_PERIOD = int(os.getenv('CHANGES_DEFAULT_PERIOD', 86400))
+    CHANGES_LIMIT = int(os.getenv('CHANGES_LIMIT', 30))
+
+    # Ценовые диапазоны для фильтров (от, до); None - без верхней границы
+    PRICE_BANDS = [
+        (0, 30000),
+        (30000, 60000),
+        (60000, 100000),
+        (100000, None),
+    ]
 
     # Пути к файлам
     BASE_DIR = Path(__file__).parent.parent.parent
     CATEGORIES_FILE = BASE_DIR / 'categories.json'
     CATEGORIES_BACKUP_FILE = BASE_DIR / 'categories_backup.json'
+    # Серия правок подряд сохраняется одной записью через столько секунд после последней
+    CATEGORIES_SAVE_DELAY = float(os.getenv('CATEGORIES_SAVE_DELAY', 0.5))
 
-    # Категории (будут загружены из файла)
+    # Категории (копия дерева из базы бота; меняются только через методы правки ниже)
     CATEGORIES: Dict[str, Dict[str, Any]] = {}
+    # Растет при каждой загрузке/сохранении категорий - по нему кэши понимают, что дерево изменилось
+    CATEGORIES_VERSION = 0
 
     def __init__(self):
         """Инициализация конфигурации"""
+        self.persistence = CategoryPersistence(
+            self.CATEGORIES_FILE,
+            self.CATEGORIES_BACKUP_FILE,
+            self.CATEGORIES_SAVE_DELAY
+        )
+        # Дерево хранится в базе бота вместе с товарами (см. open_store)
+        self.store: Optional[CategoryStore] = None
+        # Версии узлов и дерева, с которых снята копия CATEGORIES
+        self._node_versions: Dict[NodeKey, int] = {}
+        self._tree_version = 0
+        # Название, эмодзи, родитель и лист по ключу категории с товарами
+        self.category_index = CategoryIndex()
+        self._edit_lock = asyncio.Lock()
+
+    def open_store(self, db_path: str) -> None:
+        """Подключить дерево категорий в базе бота и загрузить копию.
+
+        Вызывается из data.cache, когда data.Database уже создал и обновил схему:
+        bot.config импортируется раньше data и базу сам не открывает.
+        """
+        self.store = CategoryStore(db_path)
         self.load_categories()
 
     def load_categories(self) -> None:
-        """Загрузить категории из JSON файла"""
+        """Загрузить категории из базы (при первом запуске - перенести из categories.json)"""
         try:
-            if self.CATEGORIES_FILE.exists():
-                with open(self.CATEGORIES_FILE, 'r', encoding='utf-8') as f:
-                    self.CATEGORIES = json.load(f)
-                print(f"✅ Категории загружены из: {self.CATEGORIES_FILE}")
+            if self.store.is_empty() and self.CATEGORIES_FILE.exists():
+                self.import_categories_file()
             else:
-                print(f"⚠️ Файл категорий не найден: {self.CATEGORIES_FILE}")
-                self.CATEGORIES = {}
+                self._load_from_store()
+                logger.info("✅ Категории загружены из: %s", self.store.db_path)
+            self.persistence.track(self._sorted_tree(), self.store.last_change())
         except Exception as e:
-            print(f"❌ Ошибка загрузки категорий: {e}")
+            logger.error("❌ Ошибка загрузки категорий: %s", e)
             self.CATEGORIES = {}
 
-    def save_categories(self) -> bool:
-        """Сохранить категории в JSON файл"""
+    def _set_tree(self, loaded: Tuple[Dict[str, Dict[str, Any]], Dict[NodeKey, int], int]) -> None:
+        self.CATEGORIES, self._node_versions, self._tree_version = loaded
+        self.category_index.rebuild(self.CATEGORIES)
+        self.CATEGORIES_VERSION += 1
+
+    def _load_from_store(self) -> None:
+        self._set_tree(self.store.load())
+
+    async def _reload(self) -> None:
+        """Перечитать копию из обработчика: чтение базы - в отдельном потоке, замена копии - в event loop"""
+        self._set_tree(await asyncio.to_thread(self.store.load))
+
+    def import_categories_file(self) -> int:
+        """Перенести в базу categories.json; число измененных узлов"""
+        changed = self._import_file()
+        self._load_from_store()
+        return changed
+
+    @_edit
+    async def reimport_categories_file(self) -> int:
+        """import_categories_file для обработчиков: чтение файла и запись в базу - вне event loop"""
+        # Отложенная запись файла не должна пересечься с его чтением
+        await self.persistence.flush()
+        changed = await asyncio.to_thread(self._import_file)
+        await self._reload()
+        return changed
+
+    def _import_file(self) -> int:
+        categories = None
+        if self.CATEGORIES_FILE.exists():
+            with open(self.CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+                categories = json.load(f)
+        if not categories:
+            # Пустой файл не должен стереть дерево в базе
+            raise FileNotFoundError(f"Нет категорий для переноса: {self.CATEGORIES_FILE}")
+
+        with self.store.transaction("загрузка categories.json") as tx:
+            changed = tx.replace_all(categories)
+        logger.info("✅ Категории загружены из: %s (изменено узлов: %d)", self.CATEGORIES_FILE, changed)
+        return changed
+
+    async def _refresh_if_stale(self) -> None:
+        """Перечитать копию, если базу менял другой процесс (один SELECT версии дерева)"""
+        if await asyncio.to_thread(self.store.tree_version) != self._tree_version:
+            await self._reload()
+
+    async def _transaction(self, edit: Callable[[CategoryTransaction], T],
+                           reason: str) -> Tuple[CategoryTransaction, T]:
+        """Выполнить правки edit(tx) одной транзакцией в отдельном потоке (reason - запись в истории).
+
+        BEGIN IMMEDIATE ждет чужую запись до busy_timeout - event loop при этом не стоит.
+        Копия дерева в потоке не меняется: это делает _after_edit уже в event loop.
+        """
+        def run():
+            with self.store.transaction(reason) as tx:
+                return tx, edit(tx)
+        return await asyncio.to_thread(run)
+
+    async def _after_edit(self, tx: CategoryTransaction, apply: Callable[[], None]) -> None:
+        """Учесть транзакцию в копии дерева.
+
+        apply правит копию - только измененные узлы. Если до транзакции базу менял
+        кто-то еще (другой процесс), копия вместо этого перечитывается целиком.
+        """
+        if tx.base_version != self._tree_version:
+            await self._reload()
+        else:
+            apply()
+            self.category_index.update(self.CATEGORIES, tx.versions, tx.deleted)
+            for key in tx.deleted:
+                self._node_versions.pop(key, None)
+            self._node_versions.update(tx.versions)
+            self._tree_version = tx.version
+            self.CATEGORIES_VERSION += 1
+        # Копия в categories.json - в фоне, одной записью на серию правок
+        self.persistence.schedule(self._sorted_tree())
+
+    def _sorted_tree(self) -> Dict[str, Dict[str, Any]]:
+        return dict(sorted(self.CATEGORIES.items(), key=lambda x: x[1].get('order', 999)))
+
+    def category_version(self, category_id: str, subcategory_id: Optional[str] = None) -> Optional[int]:
+        """Версия узла - запомнить при начале правки и передать в update_node"""
+        return self._node_versions.get(node_key(category_id, subcategory_id))
+
+    @_edit
+    async def add_category(self, category_id: str, data: Dict[str, Any]) -> None:
+        """Новая категория; CategoryConflict, если такой ключ уже есть"""
+        await self._refresh_if_stale()
+        node = {**data, "subcategories": {}}
+        tx, _ = await self._transaction(lambda tx: tx.insert(node_key(category_id), node),
+                                        f"добавлена категория {category_id}")
+        await self._after_edit(tx, lambda: self.CATEGORIES.__setitem__(category_id, node))
+
+    async def add_subcategory(self, category_id: str, subcategory_id: str, data: Dict[str, Any]) -> None:
+        """Новая подкатегория; CategoryConflict, если такой ключ уже есть"""
+        await self.add_subcategories(category_id, {subcategory_id: data},
+                                     f"добавлена подкатегория {category_id}/{subcategory_id}")
+
+    @_edit
+    async def add_subcategories(self, category_id: str, nodes: Dict[str, Dict[str, Any]], reason: str = "") -> None:
+        """Несколько новых подкатегорий одной транзакцией (все или ни одной).
+
+        Прямая категория (is_direct) при этом становится группой: лист переходит к подкатегориям.
+        """
+        await self._refresh_if_stale()
+        category = self.CATEGORIES.get(category_id)
+        if category is None:
+            raise CategoryConflict(f"{category_id} не найден")
+        group = None
+        if category.get("is_direct"):
+            group = {key: value for key, value in category.items()
+                     if key not in ("is_direct", "sheet_name", "subcategories")}
+        group_version = self._node_versions.get(node_key(category_id))
+
+        def edit(tx: CategoryTransaction) -> None:
+            if group is not None:
+                tx.update(node_key(category_id), group, group_version)
+            for subcategory_id, data in nodes.items():
+                tx.insert(node_key(category_id, subcategory_id), data)
+
+        tx, _ = await self._transaction(edit, reason or f"добавлено подкатегорий в {category_id}: {len(nodes)}")
+
+        def apply():
+            if group is not None:
+                for key in ("is_direct", "sheet_name"):
+                    category.pop(key, None)
+            subcategories = category.setdefault("subcategories", {})
+            for subcategory_id, data in nodes.items():
+                subcategories[subcategory_id] = dict(data)
+
+        await self._after_edit(tx, apply)
+
+    @_edit
+    async def update_subcategories(self, category_id: str, changes: Dict[str, Dict[str, Any]]) -> None:
+        """Изменить поля нескольких подкатегорий одной транзакцией (массовое переименование).
+
+        Версии сверяются с копией, как в update_node: при чужой правке - CategoryConflict.
+        """
+        await self._refresh_if_stale()
+        subcategories = self.CATEGORIES.get(category_id, {}).get("subcategories", {})
+        missing = [key for key in changes if key not in subcategories]
+        if missing:
+            raise CategoryConflict(f"не найдены: {', '.join(missing)}")
+        rows = [
+            (node_key(category_id, subcategory_id), {**subcategories[subcategory_id], **fields},
+             self._node_versions.get(node_key(category_id, subcategory_id)))
+            for subcategory_id, fields in changes.items()
+        ]
+
+        def edit(tx: CategoryTransaction) -> None:
+            for key, node, version in rows:
+                tx.update(key, node, version)
+
         try:
-            # Сортируем категории по order перед сохранением
-            sorted_categories = dict(sorted(
-                self.CATEGORIES.items(),
-                key=lambda x: x[1].get('order', 999)
-            ))
+            tx, _ = await self._transaction(edit, f"изменено подкатегорий в {category_id}: {len(changes)}")
+        except CategoryConflict:
+            await self._reload()
+            raise
+
+        def apply():
+            for subcategory_id, fields in changes.items():
+                subcategories[subcategory_id].update(fields)
+
+        await self._after_edit(tx, apply)
+
+    @_edit
+    async def set_order(self, category_id: Optional[str], keys: List[str]) -> List[str]:
+        """Задать порядок категорий (category_id=None) или подкатегорий одним списком ключей.
+
+        Не перечисленные узлы идут следом в прежнем порядке. Одна транзакция,
+        обновляются только строки, чей порядок изменился. Возвращает итоговый порядок.
+        """
+        await self._refresh_if_stale()
+        if category_id is None:
+            parent, nodes, current = "", self.CATEGORIES, self.get_sorted_categories()
+        else:
+            parent = category_id
+            nodes = self.CATEGORIES.get(category_id, {}).get("subcategories", {})
+            current = self.get_sorted_subcategories(category_id)
+
+        unknown = [key for key in keys if key not in nodes]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        listed = list(dict.fromkeys(keys))
+        listed_keys = set(listed)
+        rest = [key for key, _ in current if key not in listed_keys]
+        order = listed + rest
+        orders = [(key, i + 1) for i, key in enumerate(order)]
+
+        tx, _ = await self._transaction(lambda tx: tx.set_orders(parent, orders),
+                                        f"новый порядок {category_id or 'категорий'}")
+
+        def apply():
+            for key, position in orders:
+                nodes[key]['order'] = position
+
+        await self._after_edit(tx, apply)
+        return order
+
+    @_edit
+    async def update_node(self, category_id: str, subcategory_id: Optional[str], fields: Dict[str, Any],
+                    expected_version: Optional[int] = None) -> None:
+        """Изменить поля категории или подкатегории - одна строка в базе.
+
+        expected_version - версия узла на начало правки (category_version); если узел
+        с тех пор изменили, правка отклоняется CategoryConflict. Без нее сверяется версия
+        из копии: поля узла пишутся целиком и не должны затереть чужую правку.
+        """
+        if subcategory_id is None:
+            node = self.CATEGORIES.get(category_id)
+        else:
+            node = self.CATEGORIES.get(category_id, {}).get("subcategories", {}).get(subcategory_id)
+        if node is None:
+            raise CategoryConflict(f"{subcategory_id or category_id} не найден")
+
+        key = node_key(category_id, subcategory_id)
+        if expected_version is None:
+            expected_version = self._node_versions.get(key)
+        updated = {**node, **fields}
+        try:
+            tx, _ = await self._transaction(lambda tx: tx.update(key, updated, expected_version),
+                                            f"изменено {subcategory_id or category_id}: {', '.join(fields)}")
+        except CategoryConflict:
+            # Копия устарела - перечитать, чтобы админ увидел актуальное дерево
+            await self._reload()
+            raise
+        await self._after_edit(tx, lambda: node.update(fields))
+
+    @_edit
+    async def delete_category(self, category_id: str) -> bool:
+        """Удалить категорию с подкатегориями и перенумеровать оставшиеся"""
+        await self._refresh_if_stale()
+        if category_id not in self.CATEGORIES:
+            return False
+        remaining = [key for key, _ in self.get_sorted_categories() if key != category_id]
+        orders = [(key, i + 1) for i, key in enumerate(remaining)]
+
+        def edit(tx: CategoryTransaction) -> None:
+            tx.delete(node_key(category_id))
+            tx.set_orders("", orders)
+
+        tx, _ = await self._transaction(edit, f"удалена категория {category_id}")
+
+        def apply():
+            del self.CATEGORIES[category_id]
+            for key, order in orders:
+                self.CATEGORIES[key]['order'] = order
+
+        await self._after_edit(tx, apply)
+        return True
+
+    @_edit
+    async def delete_subcategory(self, category_id: str, subcategory_id: str) -> bool:
+        """Удалить подкатегорию и перенумеровать оставшиеся"""
+        await self._refresh_if_stale()
+        subcategories = self.CATEGORIES.get(category_id, {}).get("subcategories", {})
+        if subcategory_id not in subcategories:
+            return False
+        remaining = [key for key, _ in self.get_sorted_subcategories(category_id) if key != subcategory_id]
+        orders = [(key, i + 1) for i, key in enumerate(remaining)]
+
+        def edit(tx: CategoryTransaction) -> None:
+            tx.delete(node_key(category_id, subcategory_id))
+            tx.set_orders(category_id, orders)
 
-            # Сохраняем в основной файл
-            with open(self.CATEGORIES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(sorted_categories, f, ensure_ascii=False, indent=2)
+        tx, _ = await self._transaction(edit, f"удалена подкатегория {category_id}/{subcategory_id}")
 
-            # Создаем резервную копию
-            with open(self.CATEGORIES_BACKUP_FILE, 'w', encoding='utf-8') as f:
-                json.dump(sorted_categories, f, ensure_ascii=False, indent=2)
+        def apply():
+            del subcategories[subcategory_id]
+            for key, order in orders:
+                subcategories[key]['order'] = order
 
-            print(f"✅ Категории сохранены в: {self.CATEGORIES_FILE}")
+        await self._after_edit(tx, apply)
+        return True
+
+    @_edit
+    async def delete_subcategories(self, category_id: str) -> bool:
+        """Удалить все подкатегории категории"""
+        await self._refresh_if_stale()
+        if category_id not in self.CATEGORIES:
+            return False
+        tx, _ = await self._transaction(lambda tx: tx.delete_children(category_id),
+                                        f"удалены подкатегории {category_id}")
+        await self._after_edit(tx, lambda: self.CATEGORIES[category_id].__setitem__("subcategories", {}))
+        return True
+
+    @_edit
+    async def save_categories(self, reason: str = "", categories: Optional[Dict[str, Any]] = None) -> bool:
+        """Записать в базу дерево целиком (только отличающиеся узлы) и перечитать копию.
+
+        categories - новое дерево (откат); без него пишется копия CATEGORIES.
+        Обычные правки идут через методы выше. При ошибке копия остается прежней.
+        """
+        tree = self.CATEGORIES if categories is None else categories
+        try:
+            await self._transaction(lambda tx: tx.replace_all(tree), reason)
+            # Порядок и версии узлов проще перечитать, чем переносить в копию
+            await self._reload()
+            self.persistence.schedule(self._sorted_tree())
             return True
         except Exception as e:
-            print(f"❌ Ошибка сохранения категорий: {e}")
+            logger.error("❌ Ошибка сохранения категорий: %s", e)
+            return False
+
+    def categories_history(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние правки категорий из истории в базе"""
+        return self.store.history(limit)
+
+    async def rollback_categories(self, seq: int, state: Optional[Dict[str, Any]] = None) -> bool:
+        """Вернуть дерево категорий к состоянию после правки seq (откат - тоже правка в истории).
+
+        state - уже восстановленное из истории дерево (store.state_at);
+        без него история читается в отдельном потоке.
+        """
+        if state is None:
+            state = await asyncio.to_thread(self.store.state_at, seq)
+        if state is None:
             return False
+        # Копия меняется только после записи в базу - при сбое она не разойдется с базой
+        return await self.save_categories(f"откат к #{seq}", state)
 
     def get_sorted_categories(self) -> List[tuple]:
         """Получить отсортированный список категорий"""
@@ -98,14 +494,13 @@ class Config:
             key=lambda x: x[1].get('order', 999)
         )
 
-    def move_category(self, category_id: str, direction: str) -> bool:
-        """Изменить порядок категории (up/down)"""
-        sorted_cats = self.get_sorted_categories()
-
-        # Находим индекс категории
+    async def _swap_order(self, parent: str, nodes: Dict[str, Dict[str, Any]],
+                    sorted_nodes: List[tuple], node_id: str, direction: str) -> bool:
+        """Поменять местами узел с соседом (up/down) - две строки в базе"""
+        # Находим индекс узла
         index = None
-        for i, (cat_id, _) in enumerate(sorted_cats):
-            if cat_id == category_id:
+        for i, (key, _) in enumerate(sorted_nodes):
+            if key == node_id:
                 index = i
                 break
 
@@ -115,58 +510,41 @@ class Config:
         # Определяем новый индекс
         if direction == 'up' and index > 0:
             new_index = index - 1
-        elif direction == 'down' and index < len(sorted_cats) - 1:
+        elif direction == 'down' and index < len(sorted_nodes) - 1:
             new_index = index + 1
         else:
             return False
 
         # Меняем местами значения order
-        current_order = self.CATEGORIES[category_id].get('order', index + 1)
-        target_id, target_data = sorted_cats[new_index]
+        current_order = nodes[node_id].get('order', index + 1)
+        target_id, target_data = sorted_nodes[new_index]
         target_order = target_data.get('order', new_index + 1)
 
-        self.CATEGORIES[category_id]['order'] = target_order
-        self.CATEGORIES[target_id]['order'] = current_order
-
-        return True
-
-    def move_subcategory(self, category_id: str, subcategory_id: str, direction: str) -> bool:
-        """Изменить порядок подкатегории (up/down)"""
-        category = self.CATEGORIES.get(category_id, {})
-        subcategories = category.get('subcategories', {})
-
-        sorted_subs = sorted(
-            subcategories.items(),
-            key=lambda x: x[1].get('order', 999)
+        tx, _ = await self._transaction(
+            lambda tx: tx.set_orders(parent, [(node_id, target_order), (target_id, current_order)]),
+            f"перемещено {node_id} ({direction})"
         )
 
-        # Находим индекс подкатегории
-        index = None
-        for i, (sub_id, _) in enumerate(sorted_subs):
-            if sub_id == subcategory_id:
-                index = i
-                break
-
-        if index is None:
-            return False
+        def apply():
+            nodes[node_id]['order'] = target_order
+            nodes[target_id]['order'] = current_order
 
-        # Определяем новый индекс
-        if direction == 'up' and index > 0:
-            new_index = index - 1
-        elif direction == 'down' and index < len(sorted_subs) - 1:
-            new_index = index + 1
-        else:
-            return False
-
-        # Меняем местами значения order
-        current_order = subcategories[subcategory_id].get('order', index + 1)
-        target_id, target_data = sorted_subs[new_index]
-        target_order = target_data.get('order', new_index + 1)
+        await self._after_edit(tx, apply)
+        return True
 
-        subcategories[subcategory_id]['order'] = target_order
-        subcategories[target_id]['order'] = current_order
+    @_edit
+    async def move_category(self, category_id: str, direction: str) -> bool:
+        """Изменить порядок категории (up/down)"""
+        await self._refresh_if_stale()
+        return await self._swap_order("", self.CATEGORIES, self.get_sorted_categories(), category_id, direction)
 
-        return True
+    @_edit
+    async def move_subcategory(self, category_id: str, subcategory_id: str, direction: str) -> bool:
+        """Изменить порядок подкатегории (up/down)"""
+        await self._refresh_if_stale()
+        subcategories = self.CATEGORIES.get(category_id, {}).get('subcategories', {})
+        return await self._swap_order(category_id, subcategories, self.get_sorted_subcategories(category_id),
+                                      subcategory_id, direction)
 
     def get_all_sheet_names(self) -> List[str]:
         """Получить все названия листов"""
@@ -1,13 +1,25 @@
 # bot/handlers/admin.py
+import asyncio
+import html
 import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from bot.config.settings import config
 from bot.keyboards.admin_keyboards import get_admin_main_keyboard
+from bot.middlewares import update_profiler
+from bot.utils import format_perf
+from data import cache
+from data.export import export_products
+from monitoring import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +33,7 @@ class AdminStates(StatesGroup):
 async def cmd_admin(message: Message, state: FSMContext):
     """Обработчик команды /admin"""
     user_id = message.from_user.id
-    logger.info(f"Команда /admin от пользователя {user_id}")
+    logger.info("Команда /admin от пользователя %s", user_id)
 
     # Проверка на администратора
     if not config.is_admin(user_id):
@@ -59,4 +71,129 @@ async def admin_exit(callback: CallbackQuery, state: FSMContext):
         "👋 Вы вышли из панели администратора."
     )
     await callback.answer()
-    await state.clear()
\ No newline at end of file
+    await state.clear()
+
+# Бот может отправить в Telegram документ не больше 50 МБ
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Выгрузка каталога: /export [csv|xlsx] [gz]"""
+    user_id = message.from_user.id
+    logger.info("Команда /export от пользователя %s: %s", user_id, command.args)
+
+    if not config.is_admin(user_id):
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+
+    args = (command.args or "").lower().split()
+    fmt = "xlsx" if "xlsx" in args else "csv"
+    # XLSX уже сжат (zip), gzip имеет смысл только для CSV
+    compress = fmt == "csv" and "gz" in args
+    filename = f"catalog_{datetime.now():%Y%m%d_%H%M}.{fmt}" + (".gz" if compress else "")
+
+    status = await message.answer("📤 Выгрузка каталога...")
+    tmp_dir = tempfile.mkdtemp(prefix="export_")
+    try:
+        path = os.path.join(tmp_dir, filename)
+        count = await asyncio.to_thread(export_products, cache.db, path, fmt, compress)
+        size = os.path.getsize(path)
+
+        if size > MAX_DOCUMENT_SIZE:
+            await status.edit_text(
+                f"❌ Файл {size / 1024 / 1024:.0f} МБ больше лимита Telegram (50 МБ). "
+                f"Попробуйте /export csv gz"
+            )
+            return
+
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📦 Товаров: {count} ({size / 1024 / 1024:.1f} МБ)"
+        )
+        await status.delete()
+    except Exception as e:
+        logger.error("❌ Ошибка выгрузки каталога: %s", e)
+        await status.edit_text(f"❌ Ошибка выгрузки: {html.escape(str(e))}")
+    finally:
+        # aiogram читает файл при отправке - удаляем после
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    """Метрики бота: время обработчиков, запросов к БД и API, кэш, event loop, память"""
+    if not config.is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+
+    await message.answer(format_perf(metrics))
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Профилирование обновлений: /profile on|off, без аргумента - состояние"""
+    if not config.is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+
+    action = (command.args or "").strip().lower()
+    if action == "on":
+        update_profiler.enable()
+    elif action == "off":
+        update_profiler.disable()
+    elif action:
+        await message.answer("Использование: /profile on | off")
+        return
+
+    if update_profiler.enabled:
+        await message.answer(
+            f"🔬 Профилирование <b>включено</b>\n"
+            f"Порог: {update_profiler.slow_seconds:g} с, профилей сохранено: {update_profiler.captured}\n"
+            f"Каталог: <code>{update_profiler.directory}</code>"
+        )
+    else:
+        await message.answer("🔬 Профилирование <b>выключено</b>")
+
+@router.message(Command("history"))
+async def cmd_history(message: Message):
+    """Последние правки категорий из истории в базе"""
+    if not config.is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+
+    entries = await asyncio.to_thread(config.categories_history, 15)
+    if not entries:
+        await message.answer("📜 История правок категорий пуста")
+        return
+
+    lines = ["📜 <b>Правки категорий</b> (откат: /rollback номер)\n"]
+    for entry in reversed(entries):
+        when = datetime.fromtimestamp(entry["ts"]).strftime("%d.%m %H:%M:%S")
+        if entry["op"] == "base":
+            what = "полное дерево"
+        else:
+            what = html.escape(", ".join(entry["keys"][:5]) + (" …" if len(entry["keys"]) > 5 else ""))
+        reason = f" - {html.escape(entry['reason'])}" if entry["reason"] else ""
+        lines.append(f"<b>#{entry['seq']}</b> {when}: {what}{reason}")
+    await message.answer("\n".join(lines))
+
+@router.message(Command("rollback"))
+async def cmd_rollback(message: Message, command: CommandObject):
+    """Откат категорий к состоянию после правки: /rollback номер"""
+    if not config.is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Использование: /rollback номер (номера - в /history)")
+        return
+
+    seq = int(command.args.strip())
+    state = await asyncio.to_thread(config.store.state_at, seq)
+    if state is None:
+        await message.answer(f"❌ Правка #{seq} не найдена в истории")
+        return
+    if not await config.rollback_categories(seq, state):
+        await message.answer("❌ Не удалось откатить категории, дерево не изменено")
+        return
+
+    logger.info("Откат категорий к #%d администратором %s", seq, message.from_user.id)
+    await message.answer(f"✅ Категории возвращены к состоянию после правки #{seq}")
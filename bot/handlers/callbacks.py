@@ -6,12 +6,12 @@ from aiogram import F
 from bot.keyboards import (
     get_main_keyboard,
     get_subcategory_keyboard,
-    get_back_keyboard,
-    get_back_to_menu_keyboard
+    get_back_to_menu_keyboard,
+    get_filter_keyboard
 )
-from bot.utils import format_products_list
+from bot.utils import render_product_pages, format_price_band
 from data import cache
-from services import sheets_reader
+from services import sheets_reader, PRIORITY_ADMIN
 from bot.config import config
 
 logger = logging.getLogger(__name__)
@@ -64,10 +64,11 @@ async def show_category_menu(callback: CallbackQuery):
     # Если это прямая категория
     if category_data.get("is_direct"):
         products = cache.get_category(category_key)
-        text = format_products_list(products, category_data["name"])
+        # Длинный прайс - по страницам в этом же сообщении (кнопки ‹ ›)
+        pages = render_product_pages(products, category_key)
         await callback.message.edit_text(
-            text,
-            reply_markup=get_back_to_menu_keyboard()
+            pages[0],
+            reply_markup=get_filter_keyboard(category_key, is_direct=True, pages=len(pages))
         )
     else:
         # Показываем подкатегории
@@ -110,13 +111,85 @@ async def show_product_category(callback: CallbackQuery):
 
     # Получаем данные
     products = cache.get_category(product_key)
-    text = format_products_list(products, product_data["name"])
+    pages = render_product_pages(products, product_key)
 
     await callback.message.edit_text(
-        text,
-        reply_markup=get_back_keyboard()
+        pages[0],
+        reply_markup=get_filter_keyboard(product_key, pages=len(pages))
         )
 
+async def show_filtered_products(callback: CallbackQuery):
+    """Показать товары категории с фильтрами и сортировкой"""
+    await callback.answer()
+
+    # Формат: flt:<key>:<a|d|->:<band|->:<0|1>:<страница> (в старых сообщениях - без страницы)
+    try:
+        parts = callback.data[len("flt:"):].rsplit(":", 4)
+        if len(parts) == 4:
+            parts.append("0")
+        category_key, sort, band, in_stock, page = parts
+        sort = sort if sort in ("a", "d") else None
+        band = None if band == "-" else int(band)
+        in_stock = in_stock == "1"
+        page = int(page)
+    except ValueError:
+        await callback.message.edit_text(
+            "❌ Неверный фильтр",
+            reply_markup=get_main_keyboard(callback.from_user.id)
+        )
+        return
+
+    # Категория с товарами по ключу: прямая или подкатегория (родитель - для кнопки «назад»)
+    meta = config.category_index.get(category_key)
+    is_direct = meta is not None and meta.parent is None
+    if meta and meta.parent:
+        user_last_category[callback.from_user.id] = meta.parent
+
+    if not meta:
+        await callback.message.edit_text(
+            "❌ Товар не найден",
+            reply_markup=get_main_keyboard(callback.from_user.id)
+        )
+        return
+
+    if band is not None and not 0 <= band < len(config.PRICE_BANDS):
+        band = None
+
+    if sort is None and band is None and not in_stock:
+        # Фильтры сброшены - обычный вид
+        products = cache.get_category(category_key)
+        pages = render_product_pages(products, category_key)
+    else:
+        products = cache.get_filtered(
+            category_key,
+            sort={"a": "asc", "d": "desc"}.get(sort),
+            band=band,
+            in_stock=in_stock
+        )
+
+        filters = []
+        if sort == "a":
+            filters.append("сначала дешевле")
+        elif sort == "d":
+            filters.append("сначала дороже")
+        if band is not None:
+            filters.append(format_price_band(*config.PRICE_BANDS[band]))
+        if in_stock:
+            filters.append("в наличии")
+
+        pages = render_product_pages(products, category_key, " · ".join(filters))
+
+    # Страница могла исчезнуть, если список с тех пор стал короче
+    page = min(max(page, 0), len(pages) - 1)
+    try:
+        await callback.message.edit_text(
+            pages[page],
+            reply_markup=get_filter_keyboard(category_key, sort, band, in_stock, is_direct, page, len(pages))
+        )
+    except Exception as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
 async def back_to_categories(callback: CallbackQuery):
     """Вернуться к основным категориям"""
     await callback.answer()
@@ -148,47 +221,27 @@ async def refresh_data_with_progress(callback: CallbackQuery):
 
     await callback.answer("🔄 Подготовка к обновлению...")
 
-    # Проверка подключения к Google Sheets
-    if not sheets_reader or not sheets_reader.is_connected():
-        await callback.message.answer("❌ Ошибка подключения к Google Sheets")
-        return
-
     # Создаем начальное сообщение
     progress_message = await callback.message.answer(
         "🔄 Подготовка списка категорий..."
     )
 
     # СОБИРАЕМ ВСЕ КАТЕГОРИИ (ЭТО ВАЖНО!)
-    all_categories = []
-
-    # Прямые категории
-    for cat_key, category in config.CATEGORIES.items():
-        if category.get("is_direct"):
-            all_categories.append({
-                "key": cat_key,
-                "name": category["name"],
-                "sheet": category["sheet_name"],
-                "emoji": category.get("emoji", "📦"),
-                "type": "direct"
-            })
-
-    # Подкатегории
-    for category in config.CATEGORIES.values():
-        if not category.get("is_direct") and "subcategories" in category:
-            for sub_key, subcategory in category["subcategories"].items():
-                all_categories.append({
-                    "key": sub_key,
-                    "name": subcategory["name"],
-                    "sheet": subcategory["sheet_name"],
-                    "emoji": subcategory.get("emoji", "📌"),
-                    "type": "sub"
-                })
+    all_categories = cache.get_refresh_targets()
 
     # Проверка что категории найдены
     if not all_categories:
         await progress_message.edit_text("❌ Нет категорий для обновления")
         return
 
+    # Без Google Sheets пропускаются только листы - категории из файлов обновляются
+    sheets_available = True
+    if any(not cat_info["file"] for cat_info in all_categories):
+        sheets_available = bool(sheets_reader) and await sheets_reader.ensure_connected()
+        if not sheets_available and all(not cat_info["file"] for cat_info in all_categories):
+            await progress_message.edit_text("❌ Ошибка подключения к Google Sheets")
+            return
+
     total = len(all_categories)
 
     # Создаем прогресс-бар
@@ -200,48 +253,73 @@ async def refresh_data_with_progress(callback: CallbackQuery):
         width=15
     )
 
-    # Обновляем каждую категорию
+    # Размеры листов одним запросом на таблицу - большие листы читаются блоками
+    spreadsheets = [source_id for kind, source_id in cache.group_by_source(all_categories)
+                    if kind == "sheets" and sheets_available]
+    sizes = dict(zip(spreadsheets, await asyncio.gather(*(
+        sheets_reader.get_sheet_sizes(spreadsheet_id, PRIORITY_ADMIN) for spreadsheet_id in spreadsheets
+    ))))
+
+    # Обновляем каждую категорию; сбой одной не прерывает остальные
+    failed = []
+    kept = []
     for i, cat_info in enumerate(all_categories, 1):
-        try:
-            # Получаем данные из Google Sheets
-            data = sheets_reader.get_sheet_data(
-                config.SPREADSHEET_ID,
-                cat_info["sheet"]
+        if not cat_info["file"] and not sheets_available:
+            failed.append(cat_info["name"])
+            await progress.update(
+                current=i,
+                details=f"🔌 <b>{cat_info['name']}</b>: Google Sheets недоступен, прежние данные сохранены",
+                emoji=cat_info['emoji']
             )
+            continue
 
-            # Сохраняем в БД
-            cache.db.save_products(cat_info["key"], cat_info["name"], data)
+        try:
+            # Получаем данные из Google Sheets и сохраняем в БД
+            count = await cache.refresh_category(
+                cat_info, PRIORITY_ADMIN, sizes.get(cat_info["spreadsheet"], {}).get(cat_info["sheet"])
+            )
+            if not count:
+                kept.append(cat_info["name"])
 
             # Формируем детали для отображения
             details = (
                 f"{cat_info['emoji']} <b>{cat_info['name']}</b>\n"
-                f"📦 Товаров: {len(data)}"
-            )
-
-            # Обновляем прогресс-бар
-            await progress.update(
-                current=i,
-                details=details,
-                emoji=cat_info['emoji']
+                f"📦 Товаров: {count}"
             )
+        except Exception as e:
+            logger.error("Ошибка при обновлении %s: %s", cat_info['name'], e)
+            failed.append(cat_info["name"])
+            details = f"⚠️ <b>{cat_info['name']}</b>: прежние данные сохранены"
+
+        # Обновляем прогресс-бар
+        await progress.update(
+            current=i,
+            details=details,
+            emoji=cat_info['emoji']
+        )
 
-            # Небольшая задержка для плавности анимации
-            await asyncio.sleep(0.2)
+        # Небольшая задержка для плавности анимации
+        await asyncio.sleep(0.2)
 
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении {cat_info['name']}: {e}")
-            await progress.error(f"Ошибка в категории {cat_info['name']}")
-            return
+    if len(failed) == total:
+        await progress.error("Не удалось загрузить ни одной категории, данные не изменены")
+        return
 
     # Получаем статистику
     stats = cache.get_stats()
     total_items = sum(stats.values())
 
-    # Завершаем прогресс-бар
-    await progress.finish(
-        summary=f"📦 <b>Всего товаров:</b> {total_items}\n"
-                f"🗂 <b>Категорий:</b> {total}"
+    summary = (
+        f"📦 <b>Всего товаров:</b> {total_items}\n"
+        f"🗂 <b>Категорий:</b> {total}"
     )
+    if failed:
+        summary += f"\n⚠️ <b>Не загружены (прежние данные):</b> {', '.join(failed)}"
+    if kept:
+        summary += f"\n📭 <b>Пустые листы (прежние данные):</b> {', '.join(kept)}"
+
+    # Завершаем прогресс-бар
+    await progress.finish(summary=summary, failed=len(failed))
 
     # Возвращаемся в главное меню
     await callback.message.answer(
@@ -277,7 +355,10 @@ def register_callbacks(dp):
     for callback_data in product_callbacks:
         dp.callback_query.register(show_product_category, F.data == callback_data)
 
+    # Фильтры и сортировка товаров
+    dp.callback_query.register(show_filtered_products, F.data.startswith("flt:"))
+
     # Обновление данных с прогресс-баром
     dp.callback_query.register(refresh_data_with_progress, F.data == "refresh_data")
 
-    logger.info(f"✅ Зарегистрировано {len(category_callbacks)} категорий и {len(product_callbacks)} подкатегорий")
\ No newline at end of file
+    logger.info("✅ Зарегистрировано %d категорий и %d подкатегорий", len(category_callbacks), len(product_callbacks))
\ No newline at end of file
@@ -1,17 +1,32 @@
 # bot/handlers/category_management.py
+import asyncio
+import html
 import logging
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import StateFilter
 
+from bot.config import CategoryConflict
+from bot.config.category_store import make_key
 from bot.config.settings import config
+from bot.utils.progress import ProgressBar
+from data import cache
+from services import RowValidator, open_file_source, sheets_reader, PRIORITY_ADMIN
 from bot.keyboards.admin_keyboards import (
     get_categories_keyboard, get_category_edit_keyboard,
     get_subcategories_keyboard, get_subcategory_edit_keyboard,
     get_confirmation_keyboard, get_back_keyboard,
-    get_admin_main_keyboard, get_reorder_categories_keyboard
+    get_admin_main_keyboard, get_reorder_categories_keyboard,
+    get_sheet_sync_keyboard
 )
 
 logger = logging.getLogger(__name__)
@@ -28,6 +43,10 @@ class CategoryManagementStates(StatesGroup):
     waiting_for_subcategory_emoji = State()
     waiting_for_subcategory_sheet = State()
     waiting_for_subcategory_callback = State()
+    waiting_for_upload_file = State()
+    waiting_for_bulk_order = State()
+    waiting_for_bulk_add = State()
+    waiting_for_bulk_rename = State()
 
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
@@ -90,7 +109,7 @@ async def back_to_category_menu(callback: CallbackQuery):
 
         await callback.message.edit_text(
             info_text,
-            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down),
+            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down, cat_data.get("is_direct", False)),
             parse_mode="Markdown"
         )
         await callback.answer()
@@ -206,16 +225,21 @@ async def process_category_callback(message: Message, state: FSMContext):
     new_order = max_order + 1
 
     # Создаем новую категорию
-    config.CATEGORIES[new_id] = {
-        "name": data['category_name'],
-        "emoji": data['category_emoji'],
-        "callback": callback_data,
-        "order": new_order,
-        "subcategories": {}
-    }
-
-    # Сохраняем изменения
-    config.save_categories()
+    try:
+        await config.add_category(new_id, {
+            "name": data['category_name'],
+            "emoji": data['category_emoji'],
+            "callback": callback_data,
+            "order": new_order
+        })
+    except CategoryConflict:
+        await message.answer(
+            f"❌ Категория с ID `{new_id}` уже существует!\n"
+            f"Попробуйте другой callback_data.",
+            parse_mode="Markdown",
+            reply_markup=get_back_keyboard("admin_back_to_main")
+        )
+        return
 
     await message.answer(
         f"✅ **Категория успешно создана!**\n\n"
@@ -255,7 +279,7 @@ async def edit_category_list(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("edit_cat_"))
 async def edit_category_menu(callback: CallbackQuery):
     """Меню редактирования конкретной категории"""
-    logger.info(f"Открытие меню редактирования категории от {callback.from_user.id}: {callback.data}")
+    logger.debug("Открытие меню редактирования категории от %s: %s", callback.from_user.id, callback.data)
     category_id = callback.data.replace("edit_cat_", "")
 
     cat_id, cat_data = safe_get_category(category_id)
@@ -294,7 +318,7 @@ async def edit_category_menu(callback: CallbackQuery):
 
     await callback.message.edit_text(
         info_text,
-        reply_markup=get_category_edit_keyboard(cat_id, has_up, has_down),
+        reply_markup=get_category_edit_keyboard(cat_id, has_up, has_down, cat_data.get("is_direct", False)),
         parse_mode="Markdown"
     )
     await callback.answer()
@@ -352,16 +376,8 @@ async def delete_category_execute(callback: CallbackQuery):
     """Выполнение удаления категории"""
     category_id = callback.data.split(":")[1]
 
-    if category_id in config.CATEGORIES:
-        del config.CATEGORIES[category_id]
-
-        # Перенумеровываем порядок оставшихся категорий
-        sorted_cats = config.get_sorted_categories()
-        for i, (cat_id, cat_data) in enumerate(sorted_cats):
-            cat_data['order'] = i + 1
-
-        config.save_categories()
-
+    # Удаление и перенумерация оставшихся категорий - одна транзакция
+    if await config.delete_category(category_id):
         await callback.message.edit_text(
             "✅ **Категория успешно удалена!**",
             reply_markup=get_admin_main_keyboard(),
@@ -470,14 +486,7 @@ async def manage_subcategories(callback: CallbackQuery):
             await callback.answer()
             return
 
-        # Если это прямая категория, преобразуем
-        if cat_data.get("is_direct"):
-            cat_data["subcategories"] = {}
-            if "is_direct" in cat_data:
-                del cat_data["is_direct"]
-            if "sheet_name" in cat_data:
-                del cat_data["sheet_name"]
-
+        # Прямая категория становится группой при добавлении первой подкатегории (config.add_subcategories)
         sorted_subs = config.get_sorted_subcategories(category_id)
 
         await callback.message.edit_text(
@@ -619,7 +628,7 @@ async def reorder_category_selected(callback: CallbackQuery):
         f"Категория: {cat_data.get('emoji', '')} {cat_data['name']}\n"
         f"Текущая позиция: {index + 1} из {len(sorted_cats)}\n\n"
         f"Выберите действие:",
-        reply_markup=get_category_edit_keyboard(category_id, has_up, has_down),
+        reply_markup=get_category_edit_keyboard(category_id, has_up, has_down, cat_data.get("is_direct", False)),
         parse_mode="Markdown"
     )
     await callback.answer()
@@ -629,8 +638,7 @@ async def move_category_up(callback: CallbackQuery):
     """Переместить категорию вверх"""
     category_id = callback.data.split(":")[1]
 
-    if config.move_category(category_id, 'up'):
-        config.save_categories()
+    if await config.move_category(category_id, 'up'):
         await callback.answer("✅ Категория перемещена вверх")
 
         # Обновляем отображение
@@ -650,7 +658,7 @@ async def move_category_up(callback: CallbackQuery):
             f"✅ **Категория перемещена вверх**\n\n"
             f"Категория: {cat_data.get('emoji', '')} {cat_data['name']}\n"
             f"Новая позиция: {index + 1} из {len(sorted_cats)}",
-            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down),
+            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down, cat_data.get("is_direct", False)),
             parse_mode="Markdown"
         )
     else:
@@ -661,8 +669,7 @@ async def move_category_down(callback: CallbackQuery):
     """Переместить категорию вниз"""
     category_id = callback.data.split(":")[1]
 
-    if config.move_category(category_id, 'down'):
-        config.save_categories()
+    if await config.move_category(category_id, 'down'):
         await callback.answer("✅ Категория перемещена вниз")
 
         # Обновляем отображение
@@ -682,7 +689,7 @@ async def move_category_down(callback: CallbackQuery):
             f"✅ **Категория перемещена вниз**\n\n"
             f"Категория: {cat_data.get('emoji', '')} {cat_data['name']}\n"
             f"Новая позиция: {index + 1} из {len(sorted_cats)}",
-            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down),
+            reply_markup=get_category_edit_keyboard(category_id, has_up, has_down, cat_data.get("is_direct", False)),
             parse_mode="Markdown"
         )
     else:
@@ -700,8 +707,7 @@ async def move_subcategory_up(callback: CallbackQuery):
 
     category_id, subcategory_id = parts[1], parts[2]
 
-    if config.move_subcategory(category_id, subcategory_id, 'up'):
-        config.save_categories()
+    if await config.move_subcategory(category_id, subcategory_id, 'up'):
         await callback.answer("✅ Подкатегория перемещена вверх")
 
         # Обновляем отображение
@@ -747,8 +753,7 @@ async def move_subcategory_down(callback: CallbackQuery):
 
     category_id, subcategory_id = parts[1], parts[2]
 
-    if config.move_subcategory(category_id, subcategory_id, 'down'):
-        config.save_categories()
+    if await config.move_subcategory(category_id, subcategory_id, 'down'):
         await callback.answer("✅ Подкатегория перемещена вниз")
 
         # Обновляем отображение
@@ -812,7 +817,8 @@ async def edit_subcategory_name_start(callback: CallbackQuery, state: FSMContext
         await state.update_data(
             edit_category_id=category_id,
             edit_subcategory_id=subcategory_id,
-            edit_field="name"
+            edit_field="name",
+            edit_version=config.category_version(category_id, subcategory_id)
         )
 
         await callback.message.edit_text(
@@ -854,7 +860,8 @@ async def edit_subcategory_emoji_start(callback: CallbackQuery, state: FSMContex
         await state.update_data(
             edit_category_id=category_id,
             edit_subcategory_id=subcategory_id,
-            edit_field="emoji"
+            edit_field="emoji",
+            edit_version=config.category_version(category_id, subcategory_id)
         )
 
         await callback.message.edit_text(
@@ -897,7 +904,8 @@ async def edit_subcategory_sheet_start(callback: CallbackQuery, state: FSMContex
         await state.update_data(
             edit_category_id=category_id,
             edit_subcategory_id=subcategory_id,
-            edit_field="sheet_name"
+            edit_field="sheet_name",
+            edit_version=config.category_version(category_id, subcategory_id)
         )
 
         await callback.message.edit_text(
@@ -940,7 +948,8 @@ async def edit_subcategory_callback_start(callback: CallbackQuery, state: FSMCon
         await state.update_data(
             edit_category_id=category_id,
             edit_subcategory_id=subcategory_id,
-            edit_field="callback"
+            edit_field="callback",
+            edit_version=config.category_version(category_id, subcategory_id)
         )
 
         await callback.message.edit_text(
@@ -961,9 +970,9 @@ async def edit_subcategory_callback_start(callback: CallbackQuery, state: FSMCon
 async def process_edit_value(message: Message, state: FSMContext):
     """Обработка измененного значения"""
     try:
-        logger.info(f"Обработка изменения значения от пользователя {message.from_user.id}: {message.text}")
+        logger.debug("Обработка изменения значения от пользователя %s", message.from_user.id)
         data = await state.get_data()
-        logger.info(f"Данные состояния: {data}")
+        logger.debug("Поля состояния: %s", sorted(data))
         category_id = data.get('edit_category_id')
         subcategory_id = data.get('edit_subcategory_id')
         field = data.get('edit_field')
@@ -992,16 +1001,23 @@ async def process_edit_value(message: Message, state: FSMContext):
         if subcategory_id is None:
             # Изменение категории
             old_value = cat_data.get(field, 'не указано')
-            cat_data[field] = new_value
-            reply_markup = get_category_edit_keyboard(category_id)
+            reply_markup = get_category_edit_keyboard(category_id, is_direct=cat_data.get("is_direct", False))
         else:
             # Изменение подкатегории
             old_value = subcategories[subcategory_id].get(field, 'не указано')
-            subcategories[subcategory_id][field] = new_value
             reply_markup = get_subcategory_edit_keyboard(category_id, subcategory_id)
 
-        # Сохраняем изменения
-        config.save_categories()
+        # Сохраняем изменения (одна строка в базе); если узел успели изменить - не затираем
+        try:
+            await config.update_node(category_id, subcategory_id, {field: new_value}, data.get('edit_version'))
+        except CategoryConflict:
+            await message.answer(
+                "⚠️ Пока вы вводили значение, это поле изменил другой администратор.\n"
+                "Откройте категорию заново и повторите правку.",
+                reply_markup=reply_markup
+            )
+            await state.clear()
+            return
 
         # Показываем результат
         field_names = {
@@ -1094,16 +1110,8 @@ async def delete_subcategory_execute(callback: CallbackQuery):
             await callback.answer()
             return
 
-        if "subcategories" in cat_data and subcategory_id in cat_data["subcategories"]:
-            del cat_data["subcategories"][subcategory_id]
-
-            # Перенумеровываем порядок оставшихся подкатегорий
-            sorted_subs = config.get_sorted_subcategories(category_id)
-            for i, (sub_id, sub_data) in enumerate(sorted_subs):
-                sub_data['order'] = i + 1
-
-            config.save_categories()
-
+        # Удаление и перенумерация оставшихся подкатегорий - одна транзакция
+        if await config.delete_subcategory(category_id, subcategory_id):
             await callback.message.edit_text(
                 "✅ **Подкатегория успешно удалена!**",
                 reply_markup=get_subcategories_keyboard(category_id, config.get_sorted_subcategories(category_id)),
@@ -1174,8 +1182,7 @@ async def delete_all_subcategories_execute(callback: CallbackQuery):
             await callback.answer()
             return
 
-        cat_data["subcategories"] = {}
-        config.save_categories()
+        await config.delete_subcategories(category_id)
 
         await callback.message.edit_text(
             "✅ **Все подкатегории успешно удалены!**",
@@ -1292,12 +1299,8 @@ async def process_subcategory_callback(message: Message, state: FSMContext):
     # Генерируем ID для новой подкатегории
     new_id = callback_data.replace("show_", "").lower()
 
-    # Убеждаемся, что есть словарь подкатегорий
-    if "subcategories" not in cat_data:
-        cat_data["subcategories"] = {}
-
     # Проверяем, не существует ли уже такая подкатегория
-    if new_id in cat_data["subcategories"]:
+    if new_id in cat_data.get("subcategories", {}):
         await message.answer(
             f"❌ Подкатегория с ID `{new_id}` уже существует!\n"
             f"Попробуйте другой callback_data.",
@@ -1309,22 +1312,28 @@ async def process_subcategory_callback(message: Message, state: FSMContext):
 
     # Определяем порядковый номер для новой подкатегории
     max_order = 0
-    for sub_data in cat_data["subcategories"].values():
+    for sub_data in cat_data.get("subcategories", {}).values():
         if sub_data.get('order', 0) > max_order:
             max_order = sub_data.get('order', 0)
     new_order = max_order + 1
 
     # Создаем новую подкатегорию
-    cat_data["subcategories"][new_id] = {
-        "name": data['sub_name'],
-        "emoji": data['sub_emoji'],
-        "sheet_name": data['sheet_name'],
-        "callback": callback_data,
-        "order": new_order
-    }
-
-    # Сохраняем изменения
-    config.save_categories()
+    try:
+        await config.add_subcategory(parent_category, new_id, {
+            "name": data['sub_name'],
+            "emoji": data['sub_emoji'],
+            "sheet_name": data['sheet_name'],
+            "callback": callback_data,
+            "order": new_order
+        })
+    except CategoryConflict:
+        await message.answer(
+            f"❌ Подкатегория с ID `{new_id}` уже существует!\n"
+            f"Попробуйте другой callback_data.",
+            parse_mode="Markdown",
+            reply_markup=get_back_keyboard(f"manage_subcats:{parent_category}")
+        )
+        return
 
     await message.answer(
         f"✅ **Подкатегория успешно создана!**\n\n"
@@ -1345,7 +1354,7 @@ async def process_subcategory_callback(message: Message, state: FSMContext):
 async def edit_category_name_start(callback: CallbackQuery, state: FSMContext):
     """Начало изменения названия категории"""
     try:
-        logger.info(f"Начало изменения названия категории от {callback.from_user.id}: {callback.data}")
+        logger.debug("Начало изменения названия категории от %s: %s", callback.from_user.id, callback.data)
         category_id = callback.data.split(":")[1]
 
         cat_data = config.CATEGORIES.get(category_id)
@@ -1355,7 +1364,8 @@ async def edit_category_name_start(callback: CallbackQuery, state: FSMContext):
 
         await state.update_data(
             edit_category_id=category_id,
-            edit_field="name"
+            edit_field="name",
+            edit_version=config.category_version(category_id)
         )
 
         await callback.message.edit_text(
@@ -1366,7 +1376,7 @@ async def edit_category_name_start(callback: CallbackQuery, state: FSMContext):
             reply_markup=get_back_keyboard(f"edit_cat_menu:{category_id}")
         )
         await state.set_state(CategoryManagementStates.waiting_for_edit_value)
-        logger.info(f"Состояние установлено для пользователя {callback.from_user.id}")
+        logger.debug("Состояние установлено для пользователя %s", callback.from_user.id)
         await callback.answer()
 
     except Exception as e:
@@ -1385,7 +1395,8 @@ async def edit_category_emoji_start(callback: CallbackQuery, state: FSMContext):
 
         await state.update_data(
             edit_category_id=category_id,
-            edit_field="emoji"
+            edit_field="emoji",
+            edit_version=config.category_version(category_id)
         )
 
         await callback.message.edit_text(
@@ -1415,7 +1426,8 @@ async def edit_category_callback_start(callback: CallbackQuery, state: FSMContex
 
         await state.update_data(
             edit_category_id=category_id,
-            edit_field="callback"
+            edit_field="callback",
+            edit_version=config.category_version(category_id)
         )
 
         await callback.message.edit_text(
@@ -1432,13 +1444,324 @@ async def edit_category_callback_start(callback: CallbackQuery, state: FSMContex
     except Exception as e:
         await callback.answer(f"❌ Ошибка: {str(e)}")
 
+# ==================== МАССОВЫЕ ОПЕРАЦИИ ====================
+# Каждая операция - одно сообщение админа, одна транзакция, одна запись и одна перерисовка клавиатуры
+
+def parse_key_list(text: str, current: List[str]) -> List[str]:
+    """Ключи через пробел, запятую или с новой строки; число - текущая позиция (1 - первый)"""
+    current_keys = set(current)
+    keys = []
+    for token in re.split(r"[\s,;]+", text.strip()):
+        if not token:
+            continue
+        if token not in current_keys and token.isdigit() and 1 <= int(token) <= len(current):
+            keys.append(current[int(token) - 1])
+        else:
+            keys.append(token)
+    return keys
+
+def parse_pairs(text: str) -> List[Tuple[str, str]]:
+    """Строки "слева = справа"; строка без "=" дает пару (строка, строка)"""
+    pairs = []
+    for line in text.splitlines():
+        left, separator, right = line.partition("=")
+        left, right = left.strip(), right.strip()
+        if left:
+            pairs.append((left, right if separator else left))
+    return pairs
+
+def build_subcategory_nodes(category_id: str, items: List[Tuple[str, str]]) -> Tuple[Dict[str, dict], List[str]]:
+    """Новые подкатегории из пар (название, лист): ключ из названия, порядок - в конец списка.
+
+    Листы, уже подключенные к категории, пропускаются; возвращает (узлы, пропущенные листы).
+    """
+    cat_data = config.CATEGORIES.get(category_id, {})
+    subcategories = cat_data.get("subcategories", {})
+    known_sheets = {sub.get("sheet_name", "").strip().lower() for sub in subcategories.values()}
+    # Ключ узла уникален во всем дереве: товары и строки categories в базе - по ключу
+    taken = set(config.CATEGORIES).union(*(cat.get("subcategories", {}) for cat in config.CATEGORIES.values()))
+    next_order = max((sub.get("order", 0) for sub in subcategories.values()), default=0) + 1
+
+    nodes, skipped = {}, []
+    for name, sheet_name in items:
+        if sheet_name.lower() in known_sheets:
+            skipped.append(sheet_name)
+            continue
+        key = make_key(name, taken)
+        taken.add(key)
+        known_sheets.add(sheet_name.lower())
+        nodes[key] = {
+            "name": name,
+            "emoji": "📄",
+            "sheet_name": sheet_name,
+            "callback": f"show_{key}",
+            "order": next_order,
+        }
+        next_order += 1
+    return nodes, skipped
+
+def bulk_target(category_id: str) -> Tuple[List[tuple], str]:
+    """Узлы, которые упорядочиваются списком: категории (пустой ключ) или подкатегории, и куда вернуться"""
+    if category_id:
+        return config.get_sorted_subcategories(category_id), f"manage_subcats:{category_id}"
+    return config.get_sorted_categories(), "admin_reorder_categories"
+
+def bulk_keyboard(category_id: str):
+    if category_id:
+        return get_subcategories_keyboard(category_id, config.get_sorted_subcategories(category_id))
+    return get_reorder_categories_keyboard(config.get_sorted_categories())
+
+@router.callback_query(F.data.startswith("bulk_order:"))
+async def bulk_order_start(callback: CallbackQuery, state: FSMContext):
+    """Порядок категорий или подкатегорий одним сообщением"""
+    category_id = callback.data.split(":", 1)[1]
+    if category_id and category_id not in config.CATEGORIES:
+        await callback.answer("❌ Категория не найдена")
+        return
+
+    nodes, back = bulk_target(category_id)
+    current = "\n".join(f"{i}. {key} - {node.get('name', key)}" for i, (key, node) in enumerate(nodes, 1))
+    await state.update_data(bulk_category_id=category_id)
+    await callback.message.edit_text(
+        "🔢 <b>Порядок списком</b>\n\n"
+        "Отправьте ключи (или текущие номера) в нужном порядке - через пробел, запятую "
+        "или с новой строки. Не перечисленные останутся следом в прежнем порядке.\n\n"
+        f"<pre>{html.escape(current)}</pre>",
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard(back)
+    )
+    await state.set_state(CategoryManagementStates.waiting_for_bulk_order)
+    await callback.answer()
+
+@router.message(StateFilter(CategoryManagementStates.waiting_for_bulk_order))
+async def process_bulk_order(message: Message, state: FSMContext):
+    """Применить порядок из сообщения"""
+    category_id = (await state.get_data()).get("bulk_category_id", "")
+    nodes, back = bulk_target(category_id)
+    keys = parse_key_list(message.text or "", [key for key, _ in nodes])
+    try:
+        order = await config.set_order(category_id or None, keys)
+    except KeyError as e:
+        await message.answer(
+            f"❌ Неизвестные ключи: {html.escape(str(e.args[0]))}\nИсправьте список и отправьте снова.",
+            parse_mode="HTML",
+            reply_markup=get_back_keyboard(back)
+        )
+        return
+
+    await state.clear()
+    await message.answer(f"✅ Порядок сохранен ({len(order)} шт.)", reply_markup=bulk_keyboard(category_id))
+
+@router.callback_query(F.data.startswith("bulk_add:"))
+async def bulk_add_start(callback: CallbackQuery, state: FSMContext):
+    """Добавить подкатегории списком листов"""
+    category_id = callback.data.split(":", 1)[1]
+    cat_data = config.CATEGORIES.get(category_id)
+    if not cat_data:
+        await callback.answer("❌ Категория не найдена")
+        return
+
+    await state.update_data(bulk_category_id=category_id)
+    await callback.message.edit_text(
+        f"📋 <b>Добавление подкатегорий списком</b>\n"
+        f"Категория: {html.escape(cat_data['name'])}\n\n"
+        "Вставьте названия листов Google Sheets, по одному в строке. Чтобы название кнопки "
+        "отличалось от листа, пишите <code>Название = лист</code>.\n"
+        "Листы, уже подключенные к категории, пропускаются.",
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard(f"manage_subcats:{category_id}")
+    )
+    await state.set_state(CategoryManagementStates.waiting_for_bulk_add)
+    await callback.answer()
+
+@router.message(StateFilter(CategoryManagementStates.waiting_for_bulk_add))
+async def process_bulk_add(message: Message, state: FSMContext):
+    """Создать подкатегории из списка одной транзакцией"""
+    category_id = (await state.get_data()).get("bulk_category_id")
+    if category_id not in config.CATEGORIES:
+        await message.answer("❌ Категория не найдена. Начните заново.", reply_markup=get_admin_main_keyboard())
+        await state.clear()
+        return
+
+    nodes, skipped = build_subcategory_nodes(category_id, parse_pairs(message.text or ""))
+    if nodes:
+        try:
+            await config.add_subcategories(category_id, nodes)
+        except CategoryConflict as e:
+            await message.answer(
+                f"⚠️ Категорию успели изменить ({html.escape(str(e))}). Отправьте список еще раз.",
+                reply_markup=get_back_keyboard(f"manage_subcats:{category_id}")
+            )
+            return
+
+    await state.clear()
+    lines = [f"✅ Добавлено подкатегорий: {len(nodes)}"]
+    lines += [f"• {html.escape(node['name'])} → <code>{html.escape(node['sheet_name'])}</code>" for node in nodes.values()]
+    if skipped:
+        lines.append(f"\nУже подключены, пропущены: {html.escape(', '.join(skipped))}")
+    await message.answer("\n".join(lines), parse_mode="HTML", reply_markup=bulk_keyboard(category_id))
+
+@router.callback_query(F.data.startswith("bulk_rename:"))
+async def bulk_rename_start(callback: CallbackQuery, state: FSMContext):
+    """Переименовать подкатегории списком"""
+    category_id = callback.data.split(":", 1)[1]
+    if category_id not in config.CATEGORIES:
+        await callback.answer("❌ Категория не найдена")
+        return
+
+    current = "\n".join(f"{key} = {sub['name']}" for key, sub in config.get_sorted_subcategories(category_id))
+    await state.update_data(bulk_category_id=category_id)
+    await callback.message.edit_text(
+        "✏️ <b>Переименование списком</b>\n\n"
+        "Скопируйте список, исправьте названия справа от <code>=</code> и отправьте. "
+        "Строки можно удалять - остальные подкатегории не изменятся.\n\n"
+        f"<pre>{html.escape(current)}</pre>",
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard(f"manage_subcats:{category_id}")
+    )
+    await state.set_state(CategoryManagementStates.waiting_for_bulk_rename)
+    await callback.answer()
+
+@router.message(StateFilter(CategoryManagementStates.waiting_for_bulk_rename))
+async def process_bulk_rename(message: Message, state: FSMContext):
+    """Применить новые названия одной транзакцией"""
+    category_id = (await state.get_data()).get("bulk_category_id")
+    subcategories = config.CATEGORIES.get(category_id, {}).get("subcategories", {})
+    back = get_back_keyboard(f"manage_subcats:{category_id}")
+
+    pairs = parse_pairs(message.text or "")
+    unknown = [key for key, _ in pairs if key not in subcategories]
+    if unknown:
+        await message.answer(
+            f"❌ Неизвестные ключи: {html.escape(', '.join(unknown))}\nИсправьте список и отправьте снова.",
+            parse_mode="HTML",
+            reply_markup=back
+        )
+        return
+
+    changes = {key: {"name": name} for key, name in pairs if name and subcategories[key].get("name") != name}
+    if changes:
+        try:
+            await config.update_subcategories(category_id, changes)
+        except CategoryConflict as e:
+            await message.answer(
+                f"⚠️ Подкатегории успели изменить ({html.escape(str(e))}). Откройте список заново.",
+                reply_markup=back
+            )
+            await state.clear()
+            return
+
+    await state.clear()
+    await message.answer(f"✅ Переименовано подкатегорий: {len(changes)}", reply_markup=bulk_keyboard(category_id))
+
+# ==================== СВЕРКА С ЛИСТАМИ ТАБЛИЦЫ ====================
+
+# Сколько строк каждого списка показывать в отчете сверки
+SYNC_REPORT_LIMIT = 40
+
+def compare_with_sheets(category_id: str, tabs: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Сверка категории с листами ее таблицы.
+
+    Возвращает листы, не подключенные ни к одной категории этой таблицы, и узлы
+    категории (ключ, лист), чьих листов в таблице нет. Названия сравниваются без учета регистра.
+    """
+    spreadsheet = config.CATEGORIES[category_id].get("spreadsheet_id") or config.SPREADSHEET_ID
+    targets = [target for target in cache.get_refresh_targets()
+               if not target["file"] and target["sheet"] and target["spreadsheet"] == spreadsheet]
+    used = {target["sheet"].strip().lower() for target in targets}
+    missing = [tab for tab in tabs if tab.strip().lower() not in used]
+
+    tab_names = {tab.strip().lower() for tab in tabs}
+    cat_data = config.CATEGORIES[category_id]
+    own_keys = {category_id} if cat_data.get("is_direct") else set(cat_data.get("subcategories", {}))
+    orphans = [(target["key"], target["sheet"]) for target in targets
+               if target["key"] in own_keys and target["sheet"].strip().lower() not in tab_names]
+    return missing, orphans
+
+def format_limited(lines: List[str]) -> str:
+    text = "\n".join(lines[:SYNC_REPORT_LIMIT])
+    if len(lines) > SYNC_REPORT_LIMIT:
+        text += f"\n… и еще {len(lines) - SYNC_REPORT_LIMIT}"
+    return text
+
+@router.callback_query(F.data.startswith("sync_sheets:"))
+async def sync_sheets(callback: CallbackQuery, state: FSMContext):
+    """Сверить подкатегории с листами таблицы (один запрос метаданных)"""
+    category_id = callback.data.split(":", 1)[1]
+    cat_data = config.CATEGORIES.get(category_id)
+    if not cat_data:
+        await callback.answer("❌ Категория не найдена")
+        return
+
+    if not sheets_reader or not await sheets_reader.ensure_connected():
+        await callback.answer("❌ Нет подключения к Google Sheets", show_alert=True)
+        return
+
+    await callback.answer("🔍 Читаю список листов...")
+    spreadsheet = cat_data.get("spreadsheet_id") or config.SPREADSHEET_ID
+    tabs = await sheets_reader.get_sheet_info(spreadsheet, PRIORITY_ADMIN)
+    if not tabs:
+        await callback.message.edit_text(
+            "❌ Не удалось получить список листов таблицы",
+            reply_markup=get_back_keyboard(f"manage_subcats:{category_id}")
+        )
+        return
+
+    missing, orphans = compare_with_sheets(category_id, tabs)
+    # Создание по кнопке берет список отсюда - без повторного запроса к таблице
+    await state.update_data(sync_category_id=category_id, sync_missing=missing)
+
+    lines = [f"🔍 <b>Сверка с таблицей</b>\nКатегория: {html.escape(cat_data['name'])}\n"
+             f"Листов в таблице: {len(tabs)}"]
+    if missing:
+        lines.append(f"\n➕ <b>Не подключены ни к одной категории ({len(missing)}):</b>")
+        lines.append(f"<pre>{html.escape(format_limited(missing))}</pre>")
+        lines.append("Создать все - кнопкой ниже; часть - скопируйте строки в «📋 Добавить списком листов».")
+    else:
+        lines.append("\n✅ Все листы таблицы подключены")
+    if orphans:
+        lines.append(f"\n⚠️ <b>Листов нет в таблице ({len(orphans)}):</b>")
+        lines.append(html.escape(format_limited([f"{key} → {sheet}" for key, sheet in orphans])))
+
+    await callback.message.edit_text(
+        "\n".join(lines),
+        parse_mode="HTML",
+        reply_markup=get_sheet_sync_keyboard(category_id, len(missing))
+    )
+
+@router.callback_query(F.data.startswith("sync_sheets_add:"))
+async def sync_sheets_add(callback: CallbackQuery, state: FSMContext):
+    """Создать подкатегории для всех неподключенных листов одной транзакцией"""
+    category_id = callback.data.split(":", 1)[1]
+    data = await state.get_data()
+    if data.get("sync_category_id") != category_id or category_id not in config.CATEGORIES:
+        await callback.answer("❌ Сверка устарела, запустите ее снова", show_alert=True)
+        return
+
+    nodes, skipped = build_subcategory_nodes(category_id, [(tab, tab) for tab in data.get("sync_missing", [])])
+    if nodes:
+        try:
+            await config.add_subcategories(category_id, nodes, f"добавлено из листов таблицы в {category_id}: {len(nodes)}")
+        except CategoryConflict as e:
+            await callback.answer(f"⚠️ Категорию успели изменить ({e}), запустите сверку снова", show_alert=True)
+            return
+
+    await state.update_data(sync_category_id=None, sync_missing=[])
+    await callback.message.edit_text(
+        f"✅ Создано подкатегорий: {len(nodes)}"
+        + (f"\nУже подключены, пропущены: {len(skipped)}" if skipped else ""),
+        reply_markup=get_subcategories_keyboard(category_id, config.get_sorted_subcategories(category_id))
+    )
+    await callback.answer()
+
 # ==================== СОХРАНЕНИЕ И ЗАГРУЗКА ====================
 
 @router.callback_query(F.data == "admin_save_changes")
 async def save_changes(callback: CallbackQuery):
     """Сохранить изменения в файл"""
     try:
-        config.save_categories()
+        # Правки уже в базе; кнопка обещает и categories.json на диске - не ждем debounce
+        await config.persistence.flush()
         await callback.message.edit_text(
             "✅ **Изменения успешно сохранены в файл!**",
             reply_markup=get_admin_main_keyboard(),
@@ -1456,7 +1779,8 @@ async def save_changes(callback: CallbackQuery):
 async def load_changes(callback: CallbackQuery):
     """Загрузить изменения из файла"""
     try:
-        config.load_categories()
+        # Правленный вручную categories.json переносится в базу (только отличающиеся узлы)
+        await config.reimport_categories_file()
         await callback.message.edit_text(
             "✅ **Категории успешно загружены из файла!**",
             reply_markup=get_admin_main_keyboard(),
@@ -1468,4 +1792,161 @@ async def load_changes(callback: CallbackQuery):
             reply_markup=get_admin_main_keyboard(),
             parse_mode="Markdown"
         )
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
+
+# ==================== ЗАГРУЗКА ПРАЙСА ИЗ ФАЙЛА ====================
+
+# Бот может скачать из Telegram файл не больше 20 МБ
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+UPLOAD_EXTENSIONS = ('.csv', '.txt', '.xlsx')
+
+def get_upload_target(category_id: str, subcategory_id: Optional[str]) -> Optional[dict]:
+    """Категория (прямая) или подкатегория, в которую загружается прайс"""
+    cat_data = config.CATEGORIES.get(category_id)
+    if not cat_data:
+        return None
+    if subcategory_id is None:
+        return cat_data if cat_data.get("is_direct") else None
+    return cat_data.get("subcategories", {}).get(subcategory_id)
+
+async def import_price_file(path: str, key: str, name: str,
+                            on_progress: Optional[Callable[[int], Awaitable[None]]] = None) -> Tuple[int, RowValidator]:
+    """Потоковый импорт файла в категорию через общий конвейер записи (cache.ingest).
+
+    Возвращает число сохраненных товаров (0 - данные категории не изменены) и итоги проверки строк.
+    """
+    source = open_file_source(path)
+    validator = RowValidator()
+    count = await cache.ingest(key, name, validator.wrap(source.iter_products()), on_progress)
+    return count, validator
+
+@router.callback_query(F.data.startswith("upload:"))
+async def upload_price_start(callback: CallbackQuery, state: FSMContext):
+    """Начало загрузки прайса из файла в категорию"""
+    if not config.is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав", show_alert=True)
+        return
+
+    # Формат: "upload:category_id" (прямая категория) или "upload:category_id:subcategory_id"
+    parts = callback.data.split(":")
+    if len(parts) not in (2, 3):
+        await callback.answer("❌ Неверный формат данных")
+        return
+
+    category_id = parts[1]
+    subcategory_id = parts[2] if len(parts) == 3 else None
+    target = get_upload_target(category_id, subcategory_id)
+    if not target:
+        await callback.answer("❌ Категория не найдена")
+        return
+
+    back = f"edit_sub:{category_id}:{subcategory_id}" if subcategory_id else f"edit_cat_menu:{category_id}"
+    await state.update_data(upload_category_id=category_id, upload_subcategory_id=subcategory_id)
+
+    await callback.message.edit_text(
+        f"📥 <b>Загрузка прайса</b>\n\n"
+        f"Категория: {target.get('emoji', '📄')} {html.escape(target['name'])}\n\n"
+        f"Отправьте файл CSV или XLSX (до 20 МБ): первый столбец - модель, второй - цена, "
+        f"первая строка - заголовок.\n"
+        f"Текущие товары категории будут заменены.",
+        parse_mode="HTML",
+        reply_markup=get_back_keyboard(back)
+    )
+    await state.set_state(CategoryManagementStates.waiting_for_upload_file)
+    await callback.answer()
+
+@router.message(StateFilter(CategoryManagementStates.waiting_for_upload_file), F.document)
+async def process_upload_file(message: Message, state: FSMContext):
+    """Скачивание, проверка и запись прайса в категорию"""
+    data = await state.get_data()
+    category_id = data.get('upload_category_id')
+    subcategory_id = data.get('upload_subcategory_id')
+    back = f"edit_sub:{category_id}:{subcategory_id}" if subcategory_id else f"edit_cat_menu:{category_id}"
+
+    target = get_upload_target(category_id, subcategory_id)
+    if not target:
+        await message.answer("❌ Категория не найдена", reply_markup=get_admin_main_keyboard())
+        await state.clear()
+        return
+
+    document = message.document
+    suffix = Path(document.file_name or "").suffix.lower()
+    if suffix not in UPLOAD_EXTENSIONS:
+        await message.answer("❌ Поддерживаются файлы CSV и XLSX", reply_markup=get_back_keyboard(back))
+        return
+    if document.file_size and document.file_size > MAX_UPLOAD_SIZE:
+        await message.answer("❌ Файл больше 20 МБ", reply_markup=get_back_keyboard(back))
+        return
+
+    await state.clear()
+    key = subcategory_id or category_id
+    name = target['name']
+    progress_message = await message.answer("📥 Загрузка файла...")
+    started = time.perf_counter()
+    tmp_dir = tempfile.mkdtemp(prefix="upload_")
+
+    try:
+        path = str(Path(tmp_dir) / f"upload{suffix}")
+        await message.bot.download(document, destination=path)
+
+        rows = await asyncio.to_thread(open_file_source(path).estimate_rows)
+        if rows:
+            progress = ProgressBar(
+                total=max(1, rows - 1),
+                message=progress_message,
+                emoji="📥",
+                width=15,
+                title=f"Импорт: {html.escape(name)}"
+            )
+
+            async def on_progress(count: int) -> None:
+                await progress.update(current=count)
+        else:
+            # Размер неизвестен (XLSX без записанных размеров листа) - только счетчик строк
+            async def on_progress(count: int) -> None:
+                await progress_message.edit_text(f"📥 Импорт: {html.escape(name)}\n📊 Записано строк: {count}")
+
+        count, validator = await import_price_file(path, key, name, on_progress)
+    except Exception as e:
+        logger.error("❌ Ошибка импорта файла %s в %s: %s", document.file_name, key, e)
+        await progress_message.edit_text(
+            f"❌ <b>Ошибка импорта</b>\n⚠️ {html.escape(str(e))}\n\nДанные категории не изменены",
+            reply_markup=get_back_keyboard(back)
+        )
+        return
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if not count:
+        await progress_message.edit_text(
+            "❌ <b>В файле нет строк «модель - цена»</b>\nДанные категории не изменены",
+            reply_markup=get_back_keyboard(back)
+        )
+        return
+
+    report = (
+        f"✅ <b>Прайс загружен</b>\n"
+        f"{target.get('emoji', '📄')} <b>{html.escape(name)}</b>\n"
+        f"📦 <b>Товаров:</b> {count}\n"
+        f"⏱ <b>Время:</b> {time.perf_counter() - started:.1f} с\n"
+    )
+    if validator.without_price:
+        report += f"💬 Без числовой цены (заголовки разделов): {validator.without_price}\n"
+    if validator.rejected:
+        report += (
+            f"⚠️ Отклонено слишком длинных строк: {validator.rejected} "
+            f"({html.escape(', '.join(validator.examples))})\n"
+        )
+    if target.get("sheet_name") and not target.get("file"):
+        report += (
+            f"\nℹ️ При обновлении из Google Sheets товары снова будут взяты "
+            f"с листа «{html.escape(target['sheet_name'])}»"
+        )
+
+    logger.info("📥 Импорт %s в %s: %d товаров", document.file_name, key, count)
+    await progress_message.edit_text(report, reply_markup=get_back_keyboard(back))
+
+@router.message(StateFilter(CategoryManagementStates.waiting_for_upload_file))
+async def process_upload_not_file(message: Message):
+    """В состоянии загрузки ожидается документ"""
+    await message.answer("📎 Отправьте прайс файлом (CSV или XLSX) или нажмите «Назад»")
@@ -5,14 +5,14 @@ from aiogram.filters import Command
 
 from bot.keyboards import get_main_keyboard  # Это теперь работает
 from data import cache
-from bot.utils import format_stats
+from bot.utils import format_stats, format_changes
 from bot.config import config
 
 logger = logging.getLogger(__name__)
 
 async def cmd_start(message: types.Message):
     """Обработчик команды /start"""
-    logger.info(f"Пользователь {message.from_user.id} запустил бота")
+    logger.info("Пользователь %s запустил бота", message.from_user.id)
 
     is_admin = config.is_admin(message.from_user.id)
 
@@ -31,7 +31,7 @@ async def cmd_menu(message: types.Message):
 
 async def cmd_stats(message: types.Message):
     """Статистика"""
-    stats = cache.get_stats()
+    stats = cache.get_category_stats()
     text = format_stats(stats)
     is_admin = config.is_admin(message.from_user.id)
     if is_admin:
@@ -42,8 +42,17 @@ async def cmd_stats(message: types.Message):
             reply_markup=get_main_keyboard(message.from_user.id)
         )
 
+async def cmd_changes(message: types.Message):
+    """Снижения цен и новые поступления с последнего визита"""
+    since, changes = cache.get_changes(message.from_user.id)
+    await message.answer(
+        format_changes(changes, since),
+        reply_markup=get_main_keyboard(message.from_user.id)
+    )
+
 def register_commands(dp):
     dp.message.register(cmd_start, Command("start"))
     dp.message.register(cmd_menu, Command("menu"))
     dp.message.register(cmd_stats, Command("stats"))
-    dp.message.register(cmd_stats, Command("stats"))
\ No newline at end of file
+    dp.message.register(cmd_stats, Command("stats"))
+    dp.message.register(cmd_changes, Command("changes"))
\ No newline at end of file
@@ -3,12 +3,14 @@ from .main import (
     get_main_keyboard, 
     get_back_to_menu_keyboard,
     get_subcategory_keyboard,
-    get_back_keyboard
+    get_back_keyboard,
+    get_filter_keyboard
 )
 
 __all__ = [
     'get_main_keyboard',
     'get_back_to_menu_keyboard',
     'get_subcategory_keyboard',
-    'get_back_keyboard'
+    'get_back_keyboard',
+    'get_filter_keyboard'
 ]
\ No newline at end of file
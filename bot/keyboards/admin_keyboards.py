@@ -39,7 +39,8 @@ def get_categories_keyboard(categories: List[tuple], action: str = "edit") -> In
     builder.adjust(1)
     return builder.as_markup()
 
-def get_category_edit_keyboard(category_id: str, has_up: bool = True, has_down: bool = True) -> InlineKeyboardMarkup:
+def get_category_edit_keyboard(category_id: str, has_up: bool = True, has_down: bool = True,
+                               is_direct: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура для редактирования категории с кнопками изменения порядка"""
     builder = InlineKeyboardBuilder()
 
@@ -66,6 +67,9 @@ def get_category_edit_keyboard(category_id: str, has_up: bool = True, has_down:
         ("🏠 Главное меню", "admin_back_to_main")
     ]
 
+    if is_direct:
+        edit_buttons.insert(3, ("📥 Загрузить прайс (CSV/XLSX)", f"upload:{category_id}"))
+
     for text, callback in edit_buttons:
         builder.add(InlineKeyboardButton(text=text, callback_data=callback))
 
@@ -88,11 +92,27 @@ def get_subcategories_keyboard(category_id: str, subcategories: List[tuple]) ->
             text="❌ Удалить все подкатегории",
             callback_data=f"delete_all_subs:{category_id}"
         ))
+        builder.add(InlineKeyboardButton(
+            text="🔢 Порядок списком",
+            callback_data=f"bulk_order:{category_id}"
+        ))
+        builder.add(InlineKeyboardButton(
+            text="✏️ Переименовать списком",
+            callback_data=f"bulk_rename:{category_id}"
+        ))
 
     builder.add(InlineKeyboardButton(
         text="➕ Добавить подкатегорию",
         callback_data=f"add_sub:{category_id}"
     ))
+    builder.add(InlineKeyboardButton(
+        text="📋 Добавить списком листов",
+        callback_data=f"bulk_add:{category_id}"
+    ))
+    builder.add(InlineKeyboardButton(
+        text="🔍 Сверить с листами таблицы",
+        callback_data=f"sync_sheets:{category_id}"
+    ))
     builder.add(InlineKeyboardButton(
         text="🔙 Назад к категории",
         callback_data=f"edit_cat_menu:{category_id}"
@@ -129,6 +149,7 @@ def get_subcategory_edit_keyboard(category_id: str, subcategory_id: str,
         ("😊 Изменить эмодзи", f"edit_sub_emoji:{category_id}:{subcategory_id}"),
         ("📄 Изменить sheet_name", f"edit_sub_sheet:{category_id}:{subcategory_id}"),
         ("🔄 Изменить callback", f"edit_sub_callback:{category_id}:{subcategory_id}"),
+        ("📥 Загрузить прайс (CSV/XLSX)", f"upload:{category_id}:{subcategory_id}"),
         ("❌ Удалить подкатегорию", f"del_sub:{category_id}:{subcategory_id}"),
         ("🔙 Назад к подкатегориям", f"manage_subcats:{category_id}"),
         ("🏠 Главное меню", "admin_back_to_main")
@@ -150,6 +171,8 @@ def get_reorder_categories_keyboard(categories: List[tuple]) -> InlineKeyboardMa
         callback = f"reorder_select:{cat_id}"
         builder.add(InlineKeyboardButton(text=button_text, callback_data=callback))
 
+    # Пустой ключ - порядок категорий верхнего уровня
+    builder.add(InlineKeyboardButton(text="🔢 Порядок списком", callback_data="bulk_order:"))
     builder.add(InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back_to_main"))
     builder.adjust(1)
     return builder.as_markup()
@@ -172,6 +195,20 @@ def get_confirmation_keyboard(action: str, item_type: str, item_id: str,
     builder.adjust(2)
     return builder.as_markup()
 
+def get_sheet_sync_keyboard(category_id: str, missing_count: int) -> InlineKeyboardMarkup:
+    """Клавиатура сверки подкатегорий с листами таблицы"""
+    builder = InlineKeyboardBuilder()
+
+    if missing_count:
+        builder.add(InlineKeyboardButton(
+            text=f"➕ Создать все ({missing_count})",
+            callback_data=f"sync_sheets_add:{category_id}"
+        ))
+    builder.add(InlineKeyboardButton(text="🔙 Назад к подкатегориям", callback_data=f"manage_subcats:{category_id}"))
+
+    builder.adjust(1)
+    return builder.as_markup()
+
 def get_back_keyboard(callback: str = "admin_back_to_main") -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой назад"""
     builder = InlineKeyboardBuilder()
@@ -1,5 +1,6 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from bot.config import config
+from bot.utils.formatters import format_price_band
 
 def get_main_keyboard(user_id: int = None) -> InlineKeyboardMarkup:
     """Главное меню"""
@@ -63,6 +64,74 @@ def get_subcategory_keyboard(category_key: str, user_id: int = None) -> InlineKe
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_filter_keyboard(category_key: str, sort: str = None, band: int = None,
+                        in_stock: bool = False, is_direct: bool = False,
+                        page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
+    """Клавиатура фильтров и сортировки товаров категории (и листания, если страниц больше одной)"""
+
+    def filter_callback(new_sort, new_band, new_stock, new_page: int = 0) -> str:
+        # Формат: flt:<key>:<a|d|->:<band|->:<0|1>:<страница>; смена фильтра - с первой страницы
+        return (
+            f"flt:{category_key}:{new_sort or '-'}:"
+            f"{'-' if new_band is None else new_band}:{int(new_stock)}:{new_page}"
+        )
+
+    def mark(text: str, active: bool) -> str:
+        return f"• {text}" if active else text
+
+    buttons = [
+        [
+            InlineKeyboardButton(
+                text=mark("⬆️ Дешевле", sort == "a"),
+                callback_data=filter_callback(None if sort == "a" else "a", band, in_stock)
+            ),
+            InlineKeyboardButton(
+                text=mark("⬇️ Дороже", sort == "d"),
+                callback_data=filter_callback(None if sort == "d" else "d", band, in_stock)
+            ),
+        ]
+    ]
+
+    band_row = []
+    for i, (low, high) in enumerate(config.PRICE_BANDS):
+        band_row.append(InlineKeyboardButton(
+            text=mark(format_price_band(low, high), band == i),
+            callback_data=filter_callback(sort, None if band == i else i, in_stock)
+        ))
+    if band_row:
+        buttons.append(band_row)
+
+    buttons.append([
+        InlineKeyboardButton(
+            text=mark("✅ В наличии", in_stock),
+            callback_data=filter_callback(sort, band, not in_stock)
+        ),
+        InlineKeyboardButton(text="♻️ Сбросить", callback_data=filter_callback(None, None, False)),
+    ])
+
+    if pages > 1:
+        # Страницы листаются в том же сообщении
+        buttons.append([
+            InlineKeyboardButton(
+                text="‹",
+                callback_data=filter_callback(sort, band, in_stock, (page - 1) % pages)
+            ),
+            InlineKeyboardButton(
+                text=f"{page + 1}/{pages}",
+                callback_data=filter_callback(sort, band, in_stock, page)
+            ),
+            InlineKeyboardButton(
+                text="›",
+                callback_data=filter_callback(sort, band, in_stock, (page + 1) % pages)
+            ),
+        ])
+
+    # Кнопки навигации
+    navigation = get_back_to_menu_keyboard() if is_direct else get_back_keyboard()
+    buttons.extend(navigation.inline_keyboard)
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 def get_back_to_menu_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой в главное меню"""
     buttons = [
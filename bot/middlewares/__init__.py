@@ -0,0 +1,5 @@
+# bot/middlewares/__init__.py
+from .metrics import HandlerMetricsMiddleware, describe_running_handlers
+from .profiler import UpdateProfiler, update_profiler
+
+__all__ = ['HandlerMetricsMiddleware', 'describe_running_handlers', 'UpdateProfiler', 'update_profiler']
@@ -0,0 +1,56 @@
+# bot/middlewares/metrics.py
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from monitoring import metrics
+from .profiler import current_update
+
+logger = logging.getLogger(__name__)
+
+# Обработчики, которые выполняются прямо сейчас: id -> (имя, тип события, начало)
+running_handlers: Dict[int, Tuple[str, str, float]] = {}
+
+def describe_running_handlers() -> List[str]:
+    """«имя (тип, N с)» для сторожа event loop - вызывается из другого потока"""
+    now = time.perf_counter()
+    return [
+        f"{name} ({event}, {now - started:.1f} с)"
+        for name, event, started in list(running_handlers.values())
+    ]
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время каждого обработчика в гистограмму handler_seconds.
+
+    Внутренний middleware: к моменту вызова фильтры уже выбрали обработчик,
+    поэтому метка - имя его функции (show_category_menu, show_filtered_products...),
+    а не callback_data с ключами категорий.
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+        tags = current_update.get()
+        if tags is not None:
+            tags["handler"] = name
+        started = time.perf_counter()
+        running_handlers[id(data)] = (name, self.event, started)
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("handler_errors_total", event=self.event, handler=name)
+            raise
+        finally:
+            running_handlers.pop(id(data), None)
+            metrics.observe("handler_seconds", time.perf_counter() - started, event=self.event, handler=name)
@@ -0,0 +1,189 @@
+# bot/middlewares/profiler.py
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import re
+import time
+import tracemalloc
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import TelegramObject, Update
+
+from bot.config import config
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Теги обновления, которое сейчас обрабатывается в этой задаче (handler дописывает HandlerMetricsMiddleware)
+current_update: ContextVar[Optional[Dict[str, str]]] = ContextVar("current_update", default=None)
+
+def callback_pattern(data: str) -> str:
+    """callback_data без ключей и чисел: flt:phones:a:1 -> flt:*, page_12 -> page_{n}"""
+    prefix, separator, _ = data.partition(":")
+    if separator:
+        return f"{prefix}:*"
+    return re.sub(r"\d+", "{n}", data)[:64]
+
+def registered_commands(router: Router) -> Set[str]:
+    """Команды, на которые есть обработчики (Command) в роутере и вложенных роутерах"""
+    commands = set()
+    for item in router.chain_tail:
+        for handler in item.message.handlers:
+            for handler_filter in handler.filters or ():
+                if isinstance(handler_filter.callback, Command):
+                    commands.update(f"/{command}" for command in handler_filter.callback.commands
+                                    if isinstance(command, str))
+    return commands
+
+def update_tags(update: Update, commands: Optional[Set[str]] = None) -> Dict[str, str]:
+    """Тип обновления и шаблон: callback_data, команда или вид сообщения.
+
+    Шаблон - метка метрик: неизвестная команда (commands - известные) становится "command",
+    иначе любой /случайный_текст заводил бы новую серию гистограммы.
+    """
+    if update.callback_query:
+        return {"type": "callback_query", "pattern": callback_pattern(update.callback_query.data or "")}
+    if update.message:
+        message = update.message
+        if message.text and message.text.startswith("/"):
+            pattern = message.text.split()[0].split("@")[0].lower()
+            if commands is None or pattern not in commands:
+                pattern = "command"
+        elif message.document:
+            pattern = "document"
+        else:
+            pattern = "text" if message.text else message.content_type
+        return {"type": "message", "pattern": pattern}
+    return {"type": update.event_type, "pattern": "-"}
+
+class UpdateProfiler(BaseMiddleware):
+    """Внешний middleware диспетчера: полное время обработки каждого обновления.
+
+    Обновления дольше PROFILE_SLOW_SECONDS пишутся в лог, а для доли PROFILE_SAMPLE_RATE
+    из них на диск сохраняется профиль cProfile и крупнейшие выделения памяти (tracemalloc).
+    Включается и выключается на ходу (/profile): выключенный профилировщик снимается
+    с диспетчера и не добавляет к обработке ни одного вызова.
+    """
+
+    def __init__(self):
+        self.dp: Optional[Dispatcher] = None
+        self.enabled = False
+        self.slow_seconds = config.PROFILE_SLOW_SECONDS
+        self.sample_rate = config.PROFILE_SAMPLE_RATE
+        self.directory = Path(config.PROFILE_DIR)
+        self.captured = 0
+        # cProfile профилирует поток целиком: одновременно - только одно обновление
+        self._profiling = False
+        self._tasks = set()
+        # Известные команды - собираются при первом обновлении, когда все обработчики уже зарегистрированы
+        self._commands: Optional[Set[str]] = None
+
+    def attach(self, dp: Dispatcher, enabled: bool = False) -> None:
+        self.dp = dp
+        if enabled:
+            self.enable()
+
+    def enable(self) -> None:
+        if self.enabled or self.dp is None:
+            return
+        self.dp.update.outer_middleware.register(self)
+        if self.sample_rate > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+        logger.info("🔬 Профилирование обновлений включено (порог %g с)", self.slow_seconds)
+
+    def disable(self) -> None:
+        if not self.enabled or self.dp is None:
+            return
+        self.dp.update.outer_middleware.unregister(self)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = False
+        logger.info("🔬 Профилирование обновлений выключено")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self._commands is None:
+            self._commands = registered_commands(self.dp)
+        tags = update_tags(event, self._commands)
+        token = current_update.set(tags)
+
+        profiler = None
+        if not self._profiling and random.random() < self.sample_rate:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            profiler.enable()
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler:
+                profiler.disable()
+                self._profiling = False
+            current_update.reset(token)
+
+            handler_name = tags.get("handler", "unhandled")
+            metrics.observe("update_seconds", elapsed, type=tags["type"],
+                            handler=handler_name, pattern=tags["pattern"])
+            if elapsed >= self.slow_seconds:
+                logger.warning(
+                    "🐢 Медленное обновление %s: %s (%s) %.2f с",
+                    event.update_id, handler_name, tags['pattern'], elapsed
+                )
+                if profiler:
+                    peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+                    snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+                    task = asyncio.create_task(asyncio.to_thread(
+                        self._save, profiler, snapshot, peak, event.update_id, handler_name, tags, elapsed
+                    ))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+    def _save(self, profiler: cProfile.Profile, snapshot: Optional[tracemalloc.Snapshot],
+              peak: Optional[int], update_id: int, handler_name: str, tags: Dict[str, str],
+              elapsed: float) -> None:
+        """Профиль (.prof для snakeviz/pstats) и текстовая сводка рядом с ним"""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            base = self.directory / f"{datetime.now():%Y%m%d_%H%M%S}_{update_id}_{handler_name}"
+            profiler.dump_stats(f"{base}.prof")
+
+            report = io.StringIO()
+            report.write(f"update {update_id}: {handler_name} {tags['type']} {tags['pattern']} {elapsed:.3f} s\n\n")
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(30)
+            if snapshot is not None:
+                report.write(f"\ntracemalloc: peak {peak / 1024 / 1024:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:20]:
+                    report.write(f"{stat}\n")
+            Path(f"{base}.txt").write_text(report.getvalue(), encoding="utf-8")
+
+            self.captured += 1
+            self._rotate()
+            logger.info("🔬 Профиль сохранен: %s.prof", base)
+        except Exception as e:
+            logger.error("❌ Ошибка сохранения профиля: %s", e)
+
+    def _rotate(self) -> None:
+        """Оставить только PROFILE_MAX_FILES последних профилей"""
+        profiles = sorted(self.directory.glob("*.prof"))
+        for path in profiles[:max(0, len(profiles) - config.PROFILE_MAX_FILES)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".txt").unlink(missing_ok=True)
+
+update_profiler = UpdateProfiler()
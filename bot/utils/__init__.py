@@ -1,9 +1,22 @@
 # bot/utils/__init__.py
-from .formatters import format_products_list, format_stats
+from .formatters import (
+    format_products_list,
+    format_filtered_products_list,
+    format_price_band,
+    format_changes,
+    format_stats,
+    format_perf
+)
+from .renderer import render_product_pages
 
 __all__ = [
     'format_products_list',
+    'format_filtered_products_list',
+    'format_price_band',
+    'format_changes',
     'format_stats',
+    'format_perf',
+    'render_product_pages',
     'paginate_items',
     'format_paginated_text',
     'split_into_pages'
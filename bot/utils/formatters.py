@@ -1,71 +1,71 @@
 # bot/utils/formatters.py
-from typing import List, Tuple, Dict
+from datetime import datetime
+from typing import List, Tuple, Optional
 from bot.config import config
+from monitoring import MetricsRegistry
+from .renderer import escape, format_price, render_product_pages
+
+def format_products_list(products: List[Tuple[str, str]], category_key: str) -> str:
+    """Форматирование списка товаров для вывода (одним текстом; по страницам - render_product_pages)"""
+    return render_product_pages(products, category_key, limit=None)[0]
+
+def format_filtered_products_list(products: List[Tuple[str, str]], category_key: str, filter_text: str) -> str:
+    """Форматирование отфильтрованного списка товаров (без заголовков разделов)"""
+    return render_product_pages(products, category_key, filter_text, limit=None)[0]
+
+def format_price_band(low, high) -> str:
+    """Подпись ценового диапазона: 30к–60к"""
+    def short(value):
+        return f"{value // 1000}к" if value >= 1000 else str(value)
+
+    if high is None:
+        return f"от {short(low)}"
+    if not low:
+        return f"до {short(high)}"
+    return f"{short(low)}–{short(high)}"
+
+def format_changes(changes: List[Tuple[str, str, Optional[float], float]], since: int) -> str:
+    """Форматирование снижений цен и новых поступлений"""
+    since_text = datetime.fromtimestamp(since).strftime("%d.%m.%Y %H:%M")
+
+    drops = [change for change in changes if change[2] is not None and change[3] < change[2]]
+    arrivals = [change for change in changes if change[2] is None]
+
+    if not drops and not arrivals:
+        return f"🆕 <b>Что нового</b>\n\nС {since_text} изменений нет"
+
+    # Сначала самые большие снижения
+    drops.sort(key=lambda change: change[3] - change[2])
+
+    text = f"🆕 <b>Что нового с {since_text}</b>\n"
+    text += "═" * 20 + "\n\n"
+
+    def category_label(key: str) -> str:
+        meta = config.category_index.get(key)
+        return escape(meta.label if meta else key)
+
+    if drops:
+        text += f"📉 <b>Снижение цен ({len(drops)}):</b>\n"
+        for category_key, model, old_price, new_price in drops[:config.CHANGES_LIMIT]:
+            text += (
+                f"<code>{escape(model)}</code>\n"
+                f"   {category_label(category_key)}: "
+                f"<s>{format_price(str(old_price))}</s> → <b>{format_price(str(new_price))}</b>\n"
+            )
+        text += "\n"
+
+    if arrivals:
+        text += f"✨ <b>Новые поступления ({len(arrivals)}):</b>\n"
+        for category_key, model, _, new_price in arrivals[:config.CHANGES_LIMIT]:
+            text += (
+                f"<code>{escape(model)}</code>\n"
+                f"   {category_label(category_key)}: <b>{format_price(str(new_price))}</b>\n"
+            )
 
-def format_products_list(products: List[Tuple[str, str]], category: str) -> str:
-    """Форматирование списка товаров для вывода"""
-    count=1
-
-    if not products:
-        return f"❌ Нет данных по категории {category}"
-
-    # Находим эмодзи для категории
-    emoji = "📦"
-
-    # Ищем в основных категориях
-    for cat_key, category_data in config.CATEGORIES.items():
-        if category_data.get("is_direct") and category_data["name"] == category:
-            emoji = category_data["emoji"]
-            break
-        # Ищем в подкатегориях
-        elif not category_data.get("is_direct") and "subcategories" in category_data:
-            for sub_key, subcategory in category_data["subcategories"].items():
-                if subcategory["name"] == category:
-                    emoji = subcategory["emoji"]
-                    break
-
-    text = f"<b>{emoji} {category}</b>\n"
-    text += "_" * 35 + "\n"
-    text += "<i>Вы можете скопировать нужную позицию простым нажатием на текст, а затем отправить её в личные сообщения</i> \n"
-    text += "_" * 35 + "\n\n"
-
-    for i, (model, price) in enumerate(products, 1):
-        # Форматируем цену
-        if price != 'FALSE':
-            formatted_price = format_price(price)
-            if len(model) > 17:
-                if price != "0":
-                    text += f"<code><i>{count}. {model}</i>\n   💰 <b>{formatted_price}</b></code>\n\n"
-                    count += 1
-            else:
-                text += f"<b>_______  {model}  _______</b>\n"
-                count = 1
     return text
 
-def format_price(price: str) -> str:
-    """Форматирование цены"""
-    try:
-        # Убираем все пробелы и символы валют
-        price_clean = price.replace(' ', '').replace('₽', '').replace('$', '').strip()
-
-        # Пробуем преобразовать в число
-        if '.' in price_clean:
-            price_float = float(price_clean)
-            if price_float.is_integer():
-                price_int = int(price_float)
-                formatted = f"{price_int:,}".replace(',', ' ')
-            else:
-                formatted = f"{price_float:,.2f}".replace(',', ' ')
-        else:
-            price_int = int(price_clean)
-            formatted = f"{price_int:,}".replace(',', ' ')
-
-        return f"{formatted} ₽"
-    except (ValueError, TypeError):
-        return price
-
-def format_stats(stats: Dict[str, int]) -> str:
-    """Форматирование статистики"""
+def format_stats(stats: List[Tuple[str, str, Optional[str], int, Optional[float], Optional[float], str]]) -> str:
+    """Форматирование статистики по сводке категорий из БД (cache.get_category_stats)"""
     if not stats:
         return "📊 Нет данных для статистики"
 
@@ -74,31 +74,75 @@ def format_stats(stats: Dict[str, int]) -> str:
 
     total_items = 0
 
-    # Собираем все названия категорий для отображения
-    category_names = {}
-
-    # Основные категории
-    for cat_key, category in config.CATEGORIES.items():
-        if category.get("is_direct"):
-            category_names[cat_key] = {
-                "name": category["name"],
-                "emoji": category["emoji"]
-            }
-        else:
-            # Подкатегории
-            for sub_key, subcategory in category["subcategories"].items():
-                category_names[sub_key] = {
-                    "name": subcategory["name"],
-                    "emoji": subcategory["emoji"]
-                }
-
     # Выводим статистику
-    for key, count in stats.items():
-        if key in category_names:
-            text += f"{category_names[key]['emoji']} <b>{category_names[key]['name']}:</b> {count}\n"
-            total_items += count
+    for key, name, emoji, count, min_price, max_price, updated_at in stats:
+        # Название из индекса - свежее справочника в БД сразу после правки админом
+        meta = config.category_index.get(key)
+        if meta:
+            name, emoji = meta.name, meta.emoji
+        text += f"{emoji or '📦'} <b>{escape(name)}:</b> {count}"
+        if min_price is not None:
+            text += f" ({format_price(str(min_price))} – {format_price(str(max_price))})"
+        text += "\n"
+        total_items += count
 
     text += "\n" + "─" * 20 + "\n"
     text += f"📦 <b>Всего товаров:</b> {total_items}"
 
-    return text
\ No newline at end of file
+    return text
+
+def _format_timings(registry: MetricsRegistry, name: str, label: str, limit: int = 10) -> str:
+    """Строки «метка: p50 / p95 / max (вызовов)» по гистограмме, самые медленные сверху"""
+    series = sorted(
+        registry.histograms(name).items(),
+        key=lambda item: item[1].quantile(0.95),
+        reverse=True
+    )
+    lines = []
+    for key, histogram in series[:limit]:
+        title = dict(key).get(label, "-")
+        lines.append(
+            f"<code>{title}</code>: {histogram.quantile(0.5) * 1000:.0f} / "
+            f"{histogram.quantile(0.95) * 1000:.0f} / {histogram.max * 1000:.0f} мс ({histogram.count})"
+        )
+    return "\n".join(lines) if lines else "нет данных"
+
+def format_perf(registry: MetricsRegistry) -> str:
+    """Сводка метрик процесса для /perf"""
+    gauges = registry.gauges()
+
+    text = "📈 <b>Производительность</b>\n"
+    text += "═" * 20 + "\n"
+    text += "<i>p50 / p95 / max, в скобках - число вызовов</i>\n\n"
+
+    text += "⏱ <b>Обработчики:</b>\n" + _format_timings(registry, "handler_seconds", "handler") + "\n\n"
+    if registry.histograms("update_seconds"):
+        text += "🔬 <b>Обновления целиком (/profile):</b>\n" + _format_timings(registry, "update_seconds", "pattern") + "\n\n"
+    text += "🗄 <b>SQLite:</b>\n" + _format_timings(registry, "db_query_seconds", "query") + "\n\n"
+    text += "🌐 <b>Google API:</b>\n" + _format_timings(registry, "sheets_request_seconds", "api") + "\n\n"
+
+    text += "🎯 <b>Кэш:</b>\n"
+    for cache_name, title in (("filters", "фильтры"), ("revision", "ревизии источников")):
+        rate = registry.hit_rate("cache_requests_total", cache=cache_name)
+        text += f"{title}: {f'{rate:.0%}' if rate is not None else 'нет данных'}\n"
+
+    lag = registry.histograms("event_loop_lag_seconds").get(())
+    text += "\n🔁 <b>Event loop:</b> "
+    if lag:
+        text += (
+            f"задержка {gauges.get('event_loop_lag_last_seconds', 0) * 1000:.0f} мс, "
+            f"p95 {lag.quantile(0.95) * 1000:.0f} мс, max {lag.max * 1000:.0f} мс\n"
+        )
+    else:
+        text += "нет данных\n"
+    stalls = registry.histograms("event_loop_stall_seconds").get(())
+    if stalls:
+        text += f"🐕 <b>Блокировки loop:</b> {stalls.count}, самая долгая {stalls.max:.2f} с (стек - в логе)\n"
+
+    uptime = int(gauges.get("process_uptime_seconds", 0))
+    text += (
+        f"💾 <b>Память:</b> {gauges.get('process_resident_memory_bytes', 0) / 1024 / 1024:.1f} МБ, "
+        f"потоков {gauges.get('process_threads', 0):.0f}\n"
+        f"🕒 <b>Работает:</b> {uptime // 3600} ч {uptime % 3600 // 60} мин"
+    )
+    return text
@@ -1,12 +1,17 @@
 import asyncio
+import logging
 from aiogram.types import Message
 import time
 
+logger = logging.getLogger(__name__)
+
 class ProgressBar:
     """Класс для управления анимированным прогресс-баром"""
 
-    def __init__(self, total: int, message: Message, emoji: str = "🔄", width: int = 20):
+    def __init__(self, total: int, message: Message, emoji: str = "🔄", width: int = 20,
+                 title: str = "Обновление данных"):
         self.total = total
+        self.title = title
         self.message = message
         self.emoji = emoji
         self.width = width
@@ -33,12 +38,12 @@ class ProgressBar:
     async def update(self, current: int, details: str = "", emoji: str = "📌"):
         """Обновить прогресс-бар с проверкой на изменения"""
         self.current = current
-        percent = (self.current * 100) // self.total
+        percent = min(100, (self.current * 100) // self.total)
 
         # Расчет времени
         elapsed = time.time() - self.start_time
         if self.current > 0:
-            estimated = (elapsed / self.current) * (self.total - self.current)
+            estimated = (elapsed / self.current) * max(0, self.total - self.current)
         else:
             estimated = 0
 
@@ -51,7 +56,7 @@ class ProgressBar:
 
         # Формируем текст
         message_text = (
-            f"{self.emoji} {anim} <b>Обновление данных</b>\n"
+            f"{self.emoji} {anim} <b>{self.title}</b>\n"
             f"┃{bar}┃ {percent}%\n"
             f"📊 <b>Прогресс:</b> {self.current}/{self.total}\n"
         )
@@ -72,17 +77,24 @@ class ProgressBar:
                     raise e
         else:
             # Если текст не изменился, просто логируем
-            print(f"ℹ️ Пропуск обновления - текст не изменился ({percent}%)")
+            logger.debug("ℹ️ Пропуск обновления - текст не изменился (%s%%)", percent)
 
-    async def finish(self, summary: str = ""):
-        """Завершить прогресс"""
+    async def finish(self, summary: str = "", failed: int = 0):
+        """Завершить прогресс (failed - число категорий, которые не удалось обновить)"""
         elapsed = time.time() - self.start_time
 
-        message_text = (
-            f"✅ <b>Обновление завершено!</b>\n"
-            f"✨ <b>Все категории обновлены</b>\n"
-            f"⏱ <b>Время:</b> {self._format_time(elapsed)}\n"
-        )
+        if failed:
+            message_text = (
+                f"⚠️ <b>Обновление завершено частично</b>\n"
+                f"✨ <b>Обновлено:</b> {self.total - failed} из {self.total}\n"
+                f"⏱ <b>Время:</b> {self._format_time(elapsed)}\n"
+            )
+        else:
+            message_text = (
+                f"✅ <b>Обновление завершено!</b>\n"
+                f"✨ <b>Все категории обновлены</b>\n"
+                f"⏱ <b>Время:</b> {self._format_time(elapsed)}\n"
+            )
 
         if summary:
             message_text += f"\n📊 {summary}"
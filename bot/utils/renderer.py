@@ -0,0 +1,108 @@
+# bot/utils/renderer.py
+import html
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from bot.config import config
+
+# Предел длины сообщения Telegram; считаем с разметкой - с запасом
+MESSAGE_LIMIT = 4096
+SEPARATOR = "_" * 35
+# Строки прайса не длиннее этого - заголовки разделов («iPhone 15»), а не товары
+SECTION_HEADER_MAX_LEN = 17
+
+@lru_cache(maxsize=8192)
+def format_price(price: str) -> str:
+    """Форматирование цены (кэшируется: в прайсах цены повторяются)"""
+    try:
+        # Убираем все пробелы и символы валют
+        price_clean = price.replace(' ', '').replace('₽', '').replace('$', '').strip()
+
+        # Пробуем преобразовать в число
+        if '.' in price_clean:
+            price_float = float(price_clean)
+            if price_float.is_integer():
+                price_int = int(price_float)
+                formatted = f"{price_int:,}".replace(',', ' ')
+            else:
+                formatted = f"{price_float:,.2f}".replace(',', ' ')
+        else:
+            price_int = int(price_clean)
+            formatted = f"{price_int:,}".replace(',', ' ')
+
+        return f"{formatted} ₽"
+    except (ValueError, TypeError):
+        return escape(price)
+
+def escape(text: str) -> str:
+    """Экранирование для parse_mode=HTML: модели с < и & иначе ломают сообщение"""
+    return html.escape(text, quote=False)
+
+def category_label(category_key: str) -> str:
+    """«эмодзи название» категории с товарами по ключу (индекс config.category_index)"""
+    meta = config.category_index.get(category_key)
+    return escape(meta.label) if meta else f"📦 {escape(category_key)}"
+
+def paginate(parts: Iterable[str], limit: Optional[int] = MESSAGE_LIMIT) -> List[str]:
+    """Склеить куски в страницы не длиннее limit; кусок (строка товара) не разрывается"""
+    if limit is None:
+        return ["".join(parts)]
+
+    pages = []
+    page: List[str] = []
+    size = 0
+    for part in parts:
+        if size + len(part) > limit and page:
+            pages.append("".join(page))
+            page = []
+            size = 0
+        page.append(part)
+        size += len(part)
+    if page:
+        pages.append("".join(page))
+    return pages
+
+def render_product_pages(products: List[Tuple[str, str]], category_key: str,
+                         filter_text: Optional[str] = None,
+                         limit: Optional[int] = MESSAGE_LIMIT) -> List[str]:
+    """Список товаров категории в HTML, сразу разбитый на страницы (каждая помещается в одно сообщение).
+
+    Без filter_text - обычный вид прайса с заголовками разделов; с ним - отфильтрованный
+    список: только строки с ценой, без заголовков разделов (сортировка их рвет). Строки копятся
+    в списке и склеиваются один раз на страницу; цены форматируются через кэш format_price.
+    limit=None - одна страница без ограничения.
+    """
+    if not products and filter_text is None:
+        meta = config.category_index.get(category_key)
+        return [f"❌ Нет данных по категории {escape(meta.name if meta else category_key)}"]
+
+    label = category_label(category_key)
+    if filter_text is None:
+        parts = [
+            f"<b>{label}</b>\n{SEPARATOR}\n"
+            "<i>Вы можете скопировать нужную позицию простым нажатием на текст, "
+            f"а затем отправить её в личные сообщения</i> \n{SEPARATOR}\n\n"
+        ]
+    else:
+        parts = [f"<b>{label}</b>\n🔎 <i>{escape(filter_text)}</i>\n{SEPARATOR}\n\n"]
+    header_only = len(parts)
+
+    append = parts.append
+    count = 1
+    for model, price in products:
+        if filter_text is not None:
+            # get_filtered отдает только строки с ценой - выводятся все, и с коротким названием
+            append(f"<code><i>{count}. {escape(model)}</i>\n   💰 <b>{format_price(price)}</b></code>\n\n")
+            count += 1
+        elif len(model) > SECTION_HEADER_MAX_LEN:
+            if price != "0" and price != "FALSE":
+                append(f"<code><i>{count}. {escape(model)}</i>\n   💰 <b>{format_price(price)}</b></code>\n\n")
+                count += 1
+        elif price != "FALSE":
+            # Новый раздел - нумерация заново
+            append(f"<b>_______  {escape(model)}  _______</b>\n")
+            count = 1
+
+    if filter_text is not None and len(parts) == header_only:
+        append("❌ Нет товаров, подходящих под фильтр")
+    return paginate(parts, limit)
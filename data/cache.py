@@ -1,8 +1,14 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, List, Tuple
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Tuple, Optional
 from .database import Database
-from services import sheets_reader
+from services import sheets_reader, PRIORITY_BACKGROUND, ProductSource, SheetsSource, open_file_source
 from bot.config import config
+from monitoring import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -11,41 +17,285 @@ class DataCache:
     
     def __init__(self):
         self.db = Database()
+        # Дерево категорий хранится в той же базе: config подключается к ней после создания схемы
+        config.open_store(self.db.db_path)
+        # LRU кэш результатов фильтров: (key, sort, band, in_stock) -> товары
+        self._filter_cache: "OrderedDict[tuple, List[Tuple[str, str]]]" = OrderedDict()
+        # Загрузка листов идет параллельно, запись в SQLite - по одной (см. _write_lock)
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def _write_lock(self) -> asyncio.Lock:
+        """Блокировка записи - создается в работающем event loop.
+
+        Кэш - синглтон модуля, а бенчмарки и тесты запускают несколько asyncio.run подряд:
+        блокировка, созданная при импорте, была бы привязана к первому loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
     
     def get_category(self, key: str) -> List[Tuple[str, str]]:
         """Получить данные категории из БД"""
         return self.db.get_products(key)
-    
-    async def update_all(self) -> None:
-        """Обновление всех данных (вызывается по кнопке)"""
-        if not sheets_reader or not sheets_reader.is_connected():
-            logger.error("❌ Google Sheets не доступен")
-            return
-        
-        logger.info("🔄 Начало обновления всех категорий...")
-        
-        # Обновляем прямые категории
+
+    def get_filtered(self, key: str, sort: Optional[str] = None,
+                     band: Optional[int] = None, in_stock: bool = False) -> List[Tuple[str, str]]:
+        """Получить товары категории с фильтрами (результаты кэшируются)"""
+        cache_key = (key, sort, band, in_stock)
+        products = self._filter_cache.get(cache_key)
+        if products is not None:
+            self._filter_cache.move_to_end(cache_key)
+            metrics.inc("cache_requests_total", cache="filters", result="hit")
+            return products
+        metrics.inc("cache_requests_total", cache="filters", result="miss")
+
+        min_price = max_price = None
+        if band is not None and 0 <= band < len(config.PRICE_BANDS):
+            min_price, max_price = config.PRICE_BANDS[band]
+
+        products = self.db.get_products_filtered(key, sort, min_price, max_price, in_stock)
+
+        self._filter_cache[cache_key] = products
+        if len(self._filter_cache) > config.FILTER_CACHE_SIZE:
+            self._filter_cache.popitem(last=False)
+        return products
+
+    def _invalidate(self, key: str) -> None:
+        """Сбросить кэш фильтров категории"""
+        for cache_key in [k for k in self._filter_cache if k[0] == key]:
+            del self._filter_cache[cache_key]
+
+    async def save_category(self, key: str, name: str, products: List[Tuple[str, str]]) -> bool:
+        """Сохранить товары категории (вне event loop) и сбросить кэш её фильтров.
+
+        Пустой список не сохраняется - в категории остаются последние полученные данные.
+        """
+        if not products:
+            logger.warning("⚠️ %s: получен пустой список, оставлены прежние данные", name)
+            return False
+
+        async with self._write_lock:
+            await asyncio.to_thread(self.db.save_products, key, name, products)
+        self._invalidate(key)
+        return True
+
+    async def ingest(self, key: str, name: str,
+                     chunks: AsyncIterator[Iterable[Tuple[str, str]]],
+                     on_progress: Optional[Callable[[int], Awaitable[None]]] = None) -> int:
+        """Потоковая загрузка категории: блоки пишутся по мере получения,
+        данные категории заменяются одной транзакцией в конце.
+
+        on_progress получает число записанных строк после каждого блока.
+        Возвращает число сохраненных товаров (0 - данных нет, прежние сохранены).
+        При ошибке источника категория не меняется.
+        """
+        writer = self.db.open_writer(key, name)
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(writer.write, chunk)
+                if on_progress:
+                    await on_progress(writer.count)
+            async with self._write_lock:
+                count = await asyncio.to_thread(writer.commit)
+        finally:
+            writer.close()
+
+        if not count:
+            logger.warning("⚠️ %s: получен пустой список, оставлены прежние данные", name)
+            return 0
+        self._invalidate(key)
+        return count
+
+    def get_refresh_targets(self) -> List[Dict[str, str]]:
+        """Все категории с источниками: сначала прямые, затем подкатегории.
+
+        В categories.json категория или подкатегория может указать свою таблицу
+        ("spreadsheet_id", подкатегории наследуют его от категории), столбцы
+        модели и цены ("range" в нотации A1, по умолчанию "A:B") или локальный файл вместо
+        листа ("file": CSV/XLSX/JSON; "sheet_name" тогда - лист книги XLSX).
+        """
+        targets = []
+
+        # Прямые категории
         for cat_key, category in config.CATEGORIES.items():
             if category.get("is_direct"):
-                sheet_name = category["sheet_name"]
-                data = sheets_reader.get_sheet_data(config.SPREADSHEET_ID, sheet_name)
-                self.db.save_products(cat_key, category["name"], data)
-                logger.info(f"✅ {category['name']}: {len(data)} товаров")
-        
-        # Обновляем подкатегории
+                targets.append({
+                    "key": cat_key,
+                    "name": category["name"],
+                    "sheet": category.get("sheet_name"),
+                    "file": category.get("file"),
+                    "spreadsheet": category.get("spreadsheet_id") or config.SPREADSHEET_ID,
+                    "range": category.get("range", "A:B"),
+                    "emoji": category.get("emoji", "📦"),
+                    "type": "direct"
+                })
+
+        # Подкатегории
         for category in config.CATEGORIES.values():
             if not category.get("is_direct") and "subcategories" in category:
                 for sub_key, subcategory in category["subcategories"].items():
-                    sheet_name = subcategory["sheet_name"]
-                    data = sheets_reader.get_sheet_data(config.SPREADSHEET_ID, sheet_name)
-                    self.db.save_products(sub_key, subcategory["name"], data)
-                    logger.info(f"✅ {subcategory['name']}: {len(data)} товаров")
-        
-        logger.info("✅ Обновление всех категорий завершено")
-    
+                    targets.append({
+                        "key": sub_key,
+                        "name": subcategory["name"],
+                        "sheet": subcategory.get("sheet_name"),
+                        "file": subcategory.get("file"),
+                        "spreadsheet": (subcategory.get("spreadsheet_id") or category.get("spreadsheet_id")
+                                        or config.SPREADSHEET_ID),
+                        "range": subcategory.get("range", "A:B"),
+                        "emoji": subcategory.get("emoji", "📌"),
+                        "type": "sub"
+                    })
+
+        return targets
+
+    @staticmethod
+    def group_by_source(targets: List[Dict[str, str]]) -> Dict[Tuple[str, str], List[Dict[str, str]]]:
+        """Категории по источникам ("sheets", id таблицы) или ("file", путь):
+        ревизия и размеры листов запрашиваются один раз на источник"""
+        groups: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
+        for target in targets:
+            source = ("file", target["file"]) if target["file"] else ("sheets", target["spreadsheet"])
+            groups.setdefault(source, []).append(target)
+        return groups
+
+    @staticmethod
+    def make_source(target: Dict[str, str], priority: int = PRIORITY_BACKGROUND,
+                    row_count: Optional[int] = None) -> ProductSource:
+        """Адаптер источника категории"""
+        if target["file"]:
+            return open_file_source(target["file"], sheet=target["sheet"], columns=target["range"])
+        return SheetsSource(target["spreadsheet"], target["sheet"], target["range"], priority, row_count)
+
+    async def refresh_category(self, target: Dict[str, str], priority: int = PRIORITY_BACKGROUND,
+                               row_count: Optional[int] = None) -> int:
+        """Обновить одну категорию из ее источника (лист Google Sheets или файл).
+
+        row_count - число строк листа (get_sheet_sizes): большой лист читается блоками.
+        Возвращает число сохраненных товаров (0 - источник пуст, прежние данные сохранены).
+        Ошибка загрузки пробрасывается, данные в БД при этом не меняются.
+        """
+        source = self.make_source(target, priority, row_count)
+        with metrics.timer("category_refresh_seconds", source="file" if target.get("file") else "sheets"):
+            return await self.ingest(target["key"], target["name"], source.iter_products())
+
+    def _revision_key(self, targets: List[Dict[str, str]], revision: str) -> str:
+        """Ревизия источника вместе с набором категорий: новая подкатегория тоже требует загрузки"""
+        sheets = json.dumps(sorted((t["key"], t["sheet"] or "", t["range"]) for t in targets), ensure_ascii=False)
+        return f"{revision}:{hashlib.md5(sheets.encode('utf-8')).hexdigest()}"
+
+    async def _update_source(self, source: Tuple[str, str], targets: List[Dict[str, str]],
+                             summary: Dict[str, Any], semaphore: asyncio.Semaphore,
+                             force: bool) -> None:
+        """Обновить категории одного источника (итоги добавляются в summary)"""
+        kind, source_id = source
+        metadata_key = f"revision_{source_id}" if kind == "sheets" else f"revision_file_{source_id}"
+        try:
+            revision = await self.make_source(targets[0]).revision()
+        except Exception as e:
+            logger.warning("⚠️ Не удалось получить ревизию %s: %s", source_id, e)
+            revision = None
+        revision_key = self._revision_key(targets, revision) if revision else None
+        if not force and revision_key and revision_key == self.db.get_metadata(metadata_key):
+            metrics.inc("cache_requests_total", cache="revision", result="hit")
+            summary["skipped"] += len(targets)
+            logger.info("⏭ Источник %s не изменился (ревизия %s), обновление не требуется", source_id, revision)
+            return
+
+        metrics.inc("cache_requests_total", cache="revision", result="miss")
+
+        # Размеры всех листов таблицы одним запросом - чтобы большие читать блоками
+        sizes = await sheets_reader.get_sheet_sizes(source_id) if kind == "sheets" else {}
+        failed = []
+
+        async def refresh(target: Dict[str, str]) -> None:
+            async with semaphore:
+                try:
+                    count = await self.refresh_category(target, row_count=sizes.get(target["sheet"]))
+                except Exception as e:
+                    logger.error("❌ %s: %s", target['name'], e)
+                    failed.append(target["name"])
+                    return
+
+            if count:
+                summary["updated"] += 1
+                logger.info("✅ %s: %d товаров", target['name'], count)
+            else:
+                summary["kept"].append(target["name"])
+
+        await asyncio.gather(*(refresh(target) for target in targets))
+        summary["failed"].extend(failed)
+
+        # Ревизию запоминаем только после полной загрузки: иначе пропуск скрыл бы сбойные листы.
+        # Правки, сделанные во время загрузки, дадут новую ревизию и подхватятся в следующий раз
+        if revision_key and not failed:
+            await asyncio.to_thread(self.db.set_metadata, metadata_key, revision_key)
+
+    async def update_all(self, force: bool = False) -> Dict[str, Any]:
+        """Обновление всех данных (при запуске и по расписанию).
+
+        Источники (таблицы и файлы) обновляются параллельно. Если источник не менялся
+        с последнего успешного обновления (ревизия Drive, время изменения файла),
+        он не загружается вовсе (skipped - сколько категорий пропущено);
+        force=True - загрузить в любом случае.
+        Сбой одного листа не прерывает обновление: итог - сколько категорий обновлено,
+        какие оставлены с прежними данными и какие не загрузились.
+        """
+        summary = {"total": 0, "updated": 0, "kept": [], "failed": [], "skipped": 0}
+
+        groups = self.group_by_source(self.get_refresh_targets())
+        if any(kind == "sheets" for kind, _ in groups):
+            if not sheets_reader or not await sheets_reader.ensure_connected():
+                logger.error("❌ Google Sheets не доступен")
+                groups = {source: group for source, group in groups.items() if source[0] != "sheets"}
+        if not groups:
+            return summary
+
+        summary["total"] = sum(len(group) for group in groups.values())
+        logger.info("🔄 Начало обновления всех категорий (%d источн.)...", len(groups))
+
+        # Темп задает планировщик квоты, число одновременных запросов - пул соединений
+        semaphore = asyncio.Semaphore(config.SHEETS_MAX_CONNECTIONS)
+        await asyncio.gather(*(
+            self._update_source(source, group, summary, semaphore, force)
+            for source, group in groups.items()
+        ))
+
+        if summary["failed"]:
+            logger.warning(
+                "⚠️ Обновлено %d из %d категорий, ошибки: %s",
+                summary['updated'], summary['total'], ', '.join(summary['failed'])
+            )
+        elif summary["skipped"] < summary["total"]:
+            logger.info("✅ Обновление всех категорий завершено")
+
+        # Без сервисного аккаунта sheets_reader нет - каталог только из файлов
+        if sheets_reader and any(kind == "sheets" for kind, _ in groups):
+            quota = sheets_reader.quota.stats()
+            logger.info(
+                "📈 Квота Sheets: %d/%d за минуту, ожиданий %d, ошибок 429: %d",
+                quota['used_last_minute'], quota['quota_per_minute'],
+                quota['throttled_total'], quota['quota_errors_total']
+            )
+        return summary
+
+    def get_changes(self, user_id: int) -> Tuple[int, List[Tuple[str, str, Optional[float], float]]]:
+        """Изменения цен с последнего визита пользователя (момент визита, изменения)"""
+        now = int(time.time())
+        since = self.db.get_last_visit(user_id) or now - config.CHANGES_DEFAULT_PERIOD
+        changes = self.db.get_price_changes(since)
+        self.db.set_last_visit(user_id, now)
+        return since, changes
+
     def get_stats(self) -> Dict[str, int]:
         """Получить статистику из БД"""
         return self.db.get_stats()
+
+    def get_category_stats(self) -> List[Tuple[str, str, Optional[str], int, Optional[float], Optional[float], str]]:
+        """Сводка по категориям для /stats: чтение строки на категорию, названия - из дерева в той же базе"""
+        return self.db.get_category_stats()
     
     # Удаляем методы auto_update - они больше не нужны!
 
@@ -1,95 +1,327 @@
 import sqlite3
 import logging
-from typing import Dict, List, Tuple, Optional
+import time
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 from datetime import datetime
 
+from monitoring import metrics
+
 logger = logging.getLogger(__name__)
 
-class Database:
-    """Класс для работы с SQLite"""
+def parse_price(price: str) -> Optional[float]:
+    """Числовое значение цены или None, если цена не распознана"""
+    try:
+        price_clean = price.replace(' ', '').replace('\xa0', '').replace('₽', '').replace('$', '').strip()
+        return float(price_clean)
+    except (ValueError, TypeError, AttributeError):
+        return None
 
-    def __init__(self, db_path='data/bot_database.db'):
-        self.db_path = db_path
-        self.init_db()
+def _migrate_v1(cursor: sqlite3.Cursor) -> None:
+    """v1: товары с ключом и названием категории в каждой строке, метаданные, история цен, визиты"""
+    # Таблица для товаров
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_key TEXT NOT NULL,
+            category_name TEXT NOT NULL,
+            model TEXT NOT NULL,
+            price TEXT NOT NULL,
+            price_value REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
-    def init_db(self):
-        """Инициализация таблиц"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+    # Старые базы создавались без числовой цены
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(products)')]
+    if 'price_value' not in columns:
+        cursor.execute('ALTER TABLE products ADD COLUMN price_value REAL')
+        rows = cursor.execute('SELECT id, price FROM products').fetchall()
+        cursor.executemany(
+            'UPDATE products SET price_value = ? WHERE id = ?',
+            [(parse_price(price), row_id) for row_id, price in rows]
+        )
 
-            # Таблица для товаров
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category_key TEXT NOT NULL,
-                    category_name TEXT NOT NULL,
-                    model TEXT NOT NULL,
-                    price TEXT NOT NULL,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+    # Индекс для быстрого поиска
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_category
+        ON products(category_key)
+    ''')
 
-            # Индекс для быстрого поиска
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_category
-                ON products(category_key)
-            ''')
+    # Покрывающий индекс для фильтров по цене (сортировка без временных B-tree)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_category_price
+        ON products(category_key, price_value, model, price)
+        WHERE price_value IS NOT NULL
+    ''')
 
-            # Таблица для метаданных (время последнего обновления)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS metadata (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+    # Таблица для метаданных (время последнего обновления)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
-            conn.commit()
+    # История цен: только изменения (old_price NULL - новое поступление)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY,
+            changed_at INTEGER NOT NULL,
+            category_key TEXT NOT NULL,
+            model TEXT NOT NULL,
+            old_price REAL,
+            new_price REAL NOT NULL
+        )
+    ''')
 
-        logger.info("✅ База данных инициализирована")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_time
+        ON price_history(changed_at)
+    ''')
 
-    def save_products(self, category_key: str, category_name: str, products: List[Tuple[str, str]]):
-        """Сохранить товары категории"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+    # Время последнего просмотра /changes пользователем
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_visits (
+            user_id INTEGER PRIMARY KEY,
+            last_seen INTEGER NOT NULL
+        )
+    ''')
 
-            # Удаляем старые записи
-            cursor.execute('DELETE FROM products WHERE category_key = ?', (category_key,))
+def _migrate_v2(cursor: sqlite3.Cursor) -> None:
+    """v2: справочник категорий, товары ссылаются на него по целому id.
 
-            # Добавляем новые
-            for model, price in products:
-                cursor.execute('''
-                    INSERT INTO products (category_key, category_name, model, price)
-                    VALUES (?, ?, ?, ?)
-                ''', (category_key, category_name, model, price))
+    products - WITHOUT ROWID с ключом (category_id, position): товары категории
+    лежат подряд в порядке листа, и основной запрос читает их одним диапазоном
+    без отдельного индекса. Фильтры по цене - покрывающий частичный индекс.
+    """
+    cursor.execute('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            emoji TEXT,
+            sort_order INTEGER NOT NULL DEFAULT 0,
+            parent_id INTEGER REFERENCES categories(id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO categories (key, name)
+        SELECT category_key, MAX(category_name) FROM products
+        GROUP BY category_key
+    ''')
 
-            # Обновляем время последнего обновления
-            cursor.execute('''
-                INSERT OR REPLACE INTO metadata (key, value)
-                VALUES (?, ?)
-            ''', (f'last_update_{category_key}', datetime.now().isoformat()))
+    cursor.execute('ALTER TABLE products RENAME TO products_v1')
+    cursor.execute('''
+        CREATE TABLE products (
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            position INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            price TEXT NOT NULL,
+            price_value REAL,
+            PRIMARY KEY (category_id, position)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT INTO products (category_id, position, model, price, price_value)
+        SELECT c.id, p.id, p.model, p.price, p.price_value
+        FROM products_v1 p JOIN categories c ON c.key = p.category_key
+    ''')
+    cursor.execute('DROP TABLE products_v1')
 
-            conn.commit()
+    # Покрывающий индекс для фильтров по цене (ключ таблицы входит в него сам)
+    cursor.execute('''
+        CREATE INDEX idx_products_price
+        ON products(category_id, price_value, model, price)
+        WHERE price_value IS NOT NULL
+    ''')
+
+def _migrate_v3(cursor: sqlite3.Cursor) -> None:
+    """v3: сводка по категориям (число товаров, мин./макс. цена, время обновления).
+
+    Пишется в той же транзакции, что и товары, - /stats читает одну строку на
+    категорию вместо подсчета по всей таблице товаров. active - категория есть
+    в categories.json (удаленные остаются в БД, но в статистику не попадают).
+    """
+    cursor.execute('ALTER TABLE categories ADD COLUMN active INTEGER NOT NULL DEFAULT 1')
+    cursor.execute('''
+        CREATE TABLE category_stats (
+            category_id INTEGER PRIMARY KEY REFERENCES categories(id),
+            products INTEGER NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # Цены 0 - «нет в наличии», в диапазон цен не входят
+    cursor.execute('''
+        INSERT INTO category_stats (category_id, products, min_price, max_price, updated_at)
+        SELECT p.category_id, COUNT(*),
+               MIN(CASE WHEN p.price_value > 0 THEN p.price_value END),
+               MAX(CASE WHEN p.price_value > 0 THEN p.price_value END),
+               COALESCE(m.value, datetime('now'))
+        FROM products p
+        JOIN categories c ON c.id = p.category_id
+        LEFT JOIN metadata m ON m.key = 'last_update_' || c.key
+        GROUP BY p.category_id
+    ''')
+    cursor.execute("DELETE FROM metadata WHERE key GLOB 'last_update_*'")
 
-        logger.info(f"💾 Сохранено {len(products)} товаров в {category_key}")
+def _migrate_v4(cursor: sqlite3.Cursor) -> None:
+    """v4: дерево категорий целиком в categories - отдельная база categories.db не нужна.
 
+    fields - остальные поля узла из categories.json (JSON), version - версия узла для
+    правок админов (bot/config/category_store.py). Строка без fields - не узел дерева:
+    категория удалена или известна только по товарам; это заменяет active из v3.
+    Порядок у узла может быть не задан. category_tree - версия всего дерева,
+    category_history - правки для /history и /rollback (пишутся в той же транзакции).
+    Существующие строки остаются без полей: дерево переносится из categories.json
+    при первом запуске (Config.load_categories).
+    """
+    # Ограничения столбцов меняются только пересозданием таблицы;
+    # id сохраняются - на них ссылаются товары и сводка
+    cursor.execute('''
+        CREATE TABLE categories_v4 (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            emoji TEXT,
+            sort_order INTEGER,
+            parent_id INTEGER REFERENCES categories(id),
+            fields TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO categories_v4 (id, key, name, emoji, sort_order, parent_id)
+        SELECT id, key, name, emoji, sort_order, parent_id FROM categories
+    ''')
+    cursor.execute('DROP TABLE categories')
+    cursor.execute('ALTER TABLE categories_v4 RENAME TO categories')
+
+    cursor.execute('''
+        CREATE TABLE category_tree (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO category_tree (id, version) VALUES (1, 0)')
+
+    # op: base - дерево целиком, patch - измененные категории целиком и удаленные ключи
+    cursor.execute('''
+        CREATE TABLE category_history (
+            version INTEGER PRIMARY KEY,
+            changed_at REAL NOT NULL,
+            op TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            changes TEXT NOT NULL
+        )
+    ''')
+
+# Миграции по порядку: MIGRATIONS[i] переводит базу на версию i + 1 (PRAGMA user_version)
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+class Database:
+    """Класс для работы с SQLite"""
+
+    def __init__(self, db_path='data/bot_database.db'):
+        self.db_path = db_path
+        self.init_db()
+
+    def init_db(self):
+        """Инициализация и обновление схемы до SCHEMA_VERSION"""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            # WAL: чтение не ждет записи, а большая замена категории не копирует
+            # старые страницы в журнал (режим сохраняется в файле базы)
+            conn.execute('PRAGMA journal_mode=WAL')
+
+            for version, migrate in enumerate(MIGRATIONS, 1):
+                # Каждая миграция - отдельная транзакция; версию перечитываем под блокировкой,
+                # чтобы два процесса не выполнили одну миграцию дважды
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    current = conn.execute('PRAGMA user_version').fetchone()[0]
+                    if current < version:
+                        migrate(conn.cursor())
+                        conn.execute(f'PRAGMA user_version = {version}')
+                        if current:
+                            logger.info("🔧 Схема базы обновлена до версии %d", version)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+        logger.info("✅ База данных инициализирована")
+
+    def open_writer(self, category_key: str, category_name: str) -> 'ProductWriter':
+        """Потоковая запись товаров категории (см. ProductWriter)"""
+        return ProductWriter(self.db_path, category_key, category_name)
+
+    def save_products(self, category_key: str, category_name: str,
+                      products: Iterable[Tuple[str, str]]) -> int:
+        """Сохранить товары категории (пустой набор не меняет прежние данные)"""
+        writer = self.open_writer(category_key, category_name)
+        try:
+            writer.write(products)
+            return writer.commit()
+        finally:
+            writer.close()
+
+    @metrics.timed("db_query_seconds", query="get_products")
     def get_products(self, category_key: str) -> List[Tuple[str, str]]:
         """Получить товары категории"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT model, price FROM products
-                WHERE category_key = ?
-                ORDER BY id
+                WHERE category_id = (SELECT id FROM categories WHERE key = ?)
+                ORDER BY position
             ''', (category_key,))
 
             return cursor.fetchall()
 
+    @metrics.timed("db_query_seconds", query="get_products_filtered")
+    def get_products_filtered(self, category_key: str, sort: Optional[str] = None,
+                              min_price: Optional[float] = None, max_price: Optional[float] = None,
+                              in_stock: bool = False) -> List[Tuple[str, str]]:
+        """Получить товары категории с фильтром по цене (sort: 'asc' / 'desc' / None)"""
+        query = '''
+            SELECT model, price FROM products INDEXED BY idx_products_price
+            WHERE category_id = (SELECT id FROM categories WHERE key = ?) AND price_value IS NOT NULL
+        '''
+        params = [category_key]
+
+        if min_price is not None:
+            query += ' AND price_value >= ?'
+            params.append(min_price)
+        if max_price is not None:
+            query += ' AND price_value < ?'
+            params.append(max_price)
+        if in_stock:
+            query += ' AND price_value > 0'
+
+        if sort == 'asc':
+            query += ' ORDER BY price_value ASC'
+        elif sort == 'desc':
+            query += ' ORDER BY price_value DESC'
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    @metrics.timed("db_query_seconds", query="get_all_products")
     def get_all_products(self) -> Dict[str, List[Tuple[str, str]]]:
         """Получить все товары"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT category_key, model, price FROM products ORDER BY category_key, id')
+            cursor.execute('''
+                SELECT c.key, p.model, p.price
+                FROM categories c JOIN products p ON p.category_id = c.id
+                ORDER BY c.key, p.position
+            ''')
 
             result = {}
             for category_key, model, price in cursor.fetchall():
@@ -99,39 +331,243 @@ class Database:
 
             return result
 
+    def iter_all_products(self, batch_size: int = 5000) -> Iterator[List[Tuple[str, str, str, str, Optional[float]]]]:
+        """Все товары блоками по batch_size строк (курсор читает БД по мере выборки, без fetchall)"""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            cursor = conn.execute('''
+                SELECT c.key, c.name, p.model, p.price, p.price_value
+                FROM categories c JOIN products p ON p.category_id = c.id
+                ORDER BY c.key, p.position
+            ''')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
     def get_stats(self) -> Dict[str, int]:
-        """Получить статистику"""
+        """Получить статистику: число товаров по ключу категории"""
+        return {row[0]: row[3] for row in self.get_category_stats()}
+
+    @metrics.timed("db_query_seconds", query="get_category_stats")
+    def get_category_stats(self) -> List[Tuple[str, str, Optional[str], int, Optional[float], Optional[float], str]]:
+        """Сводка по категориям дерева с товарами в порядке меню:
+        (ключ, название, эмодзи, товаров, мин. цена, макс. цена, время обновления)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT category_key, category_name, COUNT(*)
-                FROM products
-                GROUP BY category_key, category_name
+                SELECT c.key, c.name, c.emoji, s.products, s.min_price, s.max_price, s.updated_at
+                FROM category_stats s
+                JOIN categories c ON c.id = s.category_id
+                LEFT JOIN categories parent ON parent.id = c.parent_id
+                WHERE c.fields IS NOT NULL
+                ORDER BY COALESCE(CASE WHEN parent.id IS NULL THEN c.sort_order ELSE parent.sort_order END, 999),
+                         COALESCE(parent.key, c.key), c.parent_id IS NOT NULL, COALESCE(c.sort_order, 999)
             ''')
-
-            stats = {}
-            for category_key, category_name, count in cursor.fetchall():
-                stats[category_key] = count
-
-            return stats
+            return cursor.fetchall()
 
     def get_last_update(self, category_key: str) -> Optional[str]:
         """Время последнего обновления категории"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.updated_at FROM category_stats s
+                JOIN categories c ON c.id = s.category_id
+                WHERE c.key = ?
+            ''', (category_key,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    @metrics.timed("db_query_seconds", query="get_metadata")
+    def get_metadata(self, key: str) -> Optional[str]:
+        """Значение из таблицы metadata"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT value FROM metadata
                 WHERE key = ?
-            ''', (f'last_update_{category_key}',))
+            ''', (key,))
 
             result = cursor.fetchone()
             return result[0] if result else None
 
+    def set_metadata(self, key: str, value: str) -> None:
+        """Записать значение в таблицу metadata"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO metadata (key, value)
+                VALUES (?, ?)
+            ''', (key, value))
+            conn.commit()
+
+    @metrics.timed("db_query_seconds", query="get_price_changes")
+    def get_price_changes(self, since: int) -> List[Tuple[str, str, Optional[float], float]]:
+        """Изменения цен после момента since: (category_key, model, old_price, new_price).
+
+        Если товар менялся несколько раз, берется первая старая и последняя новая цена.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT category_key, model, old_price, new_price FROM price_history
+                WHERE changed_at > ?
+                ORDER BY changed_at, id
+            ''', (since,))
+
+            changes = {}
+            for category_key, model, old_price, new_price in cursor:
+                key = (category_key, model)
+                if key in changes:
+                    old_price = changes[key][2]
+                changes[key] = (category_key, model, old_price, new_price)
+
+            return list(changes.values())
+
+    def get_last_visit(self, user_id: int) -> Optional[int]:
+        """Время последнего просмотра изменений пользователем"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_seen FROM user_visits WHERE user_id = ?', (user_id,))
+
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def set_last_visit(self, user_id: int, timestamp: int) -> None:
+        """Запомнить время просмотра изменений пользователем"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO user_visits (user_id, last_seen)
+                VALUES (?, ?)
+            ''', (user_id, timestamp))
+            conn.commit()
+
     def clear_all(self):
         """Очистить все данные (для отладки)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM products')
+            cursor.execute('DELETE FROM category_stats')
             cursor.execute('DELETE FROM metadata')
+            cursor.execute('DELETE FROM price_history')
             conn.commit()
-        logger.info("🗑 База данных очищена")
\ No newline at end of file
+        logger.info("🗑 База данных очищена")
+
+class ProductWriter:
+    """Запись категории блоками без накопления всех строк в памяти.
+
+    write() складывает блоки во временную таблицу соединения - основная база
+    при этом не блокируется, сколько бы ни шла загрузка. commit() одной короткой
+    транзакцией заменяет товары категории и пишет историю изменений цен.
+    Методы можно вызывать из разных потоков, но не одновременно.
+    """
+
+    def __init__(self, db_path: str, category_key: str, category_name: str):
+        self.category_key = category_key
+        self.category_name = category_name
+        self.count = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # В режиме WAL без fsync на каждую транзакцию целостность сохраняется
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Кэш страниц побольше: замена крупной категории перестраивает индексы
+        self.conn.execute('PRAGMA cache_size=-65536')
+        self.conn.execute('''
+            CREATE TEMP TABLE staging (
+                model TEXT NOT NULL,
+                price TEXT NOT NULL,
+                price_value REAL
+            )
+        ''')
+
+    @metrics.timed("db_query_seconds", query="writer_write")
+    def write(self, products: Iterable[Tuple[str, str]]) -> int:
+        """Добавить блок товаров, возвращает размер блока"""
+        before = self.conn.total_changes
+        self.conn.executemany(
+            'INSERT INTO temp.staging (model, price, price_value) VALUES (?, ?, ?)',
+            ((model, price, parse_price(price)) for model, price in products)
+        )
+        self.conn.commit()
+        written = self.conn.total_changes - before
+        self.count += written
+        return written
+
+    @metrics.timed("db_query_seconds", query="writer_commit")
+    def commit(self) -> int:
+        """Заменить товары категории накопленными, возвращает их число.
+
+        Если ничего не записано, прежние данные категории остаются.
+        """
+        if not self.count:
+            return 0
+
+        cursor = self.conn.cursor()
+        key = self.category_key
+
+        # Блокировку записи берем сразу: в режиме WAL транзакция, начатая чтением,
+        # не может стать пишущей, если другой процесс успел записать (SQLITE_BUSY)
+        cursor.execute('BEGIN IMMEDIATE')
+
+        # Категория в справочнике; название узла дерева задает админ, загрузка его не меняет
+        cursor.execute('''
+            INSERT INTO categories (key, name) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET name = excluded.name
+            WHERE categories.fields IS NULL
+        ''', (key, self.category_name))
+        category_id = cursor.execute('SELECT id FROM categories WHERE key = ?', (key,)).fetchone()[0]
+
+        # Предыдущий снимок цен для истории изменений (при повторах модели - последняя цена)
+        cursor.execute('''
+            CREATE TEMP TABLE previous (
+                model TEXT PRIMARY KEY,
+                price_value REAL
+            )
+        ''')
+        cursor.execute('''
+            INSERT OR REPLACE INTO temp.previous (model, price_value)
+            SELECT model, price_value FROM products
+            WHERE category_id = ? AND price_value IS NOT NULL
+            ORDER BY position
+        ''', (category_id,))
+
+        # Первая загрузка не считается изменением
+        if cursor.rowcount:
+            cursor.execute('''
+                INSERT INTO price_history (changed_at, category_key, model, old_price, new_price)
+                SELECT ?, ?, s.model, p.price_value, s.price_value
+                FROM temp.staging s
+                LEFT JOIN temp.previous p ON p.model = s.model
+                WHERE s.rowid IN (
+                    SELECT MAX(rowid) FROM temp.staging
+                    WHERE price_value IS NOT NULL
+                    GROUP BY model
+                )
+                AND (p.price_value IS NULL OR p.price_value != s.price_value)
+            ''', (int(time.time()), key))
+
+        # Удаляем старые записи
+        cursor.execute('DELETE FROM products WHERE category_id = ?', (category_id,))
+
+        # Добавляем новые (позиция - порядок строк в источнике)
+        cursor.execute('''
+            INSERT INTO products (category_id, position, model, price, price_value)
+            SELECT ?, rowid, model, price, price_value FROM temp.staging
+            ORDER BY rowid
+        ''', (category_id,))
+
+        # Сводка категории - по временной таблице, без повторного чтения товаров
+        cursor.execute('''
+            INSERT OR REPLACE INTO category_stats (category_id, products, min_price, max_price, updated_at)
+            SELECT ?, COUNT(*),
+                   MIN(CASE WHEN price_value > 0 THEN price_value END),
+                   MAX(CASE WHEN price_value > 0 THEN price_value END),
+                   ?
+            FROM temp.staging
+        ''', (category_id, datetime.now().isoformat()))
+
+        self.conn.commit()
+        logger.info("💾 Сохранено %d товаров в %s", self.count, key)
+        return self.count
+
+    def close(self) -> None:
+        """Закрыть соединение (временные таблицы удаляются вместе с ним)"""
+        self.conn.close()
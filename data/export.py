@@ -0,0 +1,72 @@
+# data/export.py
+import csv
+import gzip
+import logging
+from typing import Optional
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+EXPORT_HEADER = ["Ключ категории", "Категория", "Модель", "Цена", "Цена (число)"]
+EXPORT_FORMATS = ("csv", "xlsx")
+
+def export_products(db: Database, path: str, fmt: str = "csv", compress: bool = False,
+                    batch_size: int = 5000) -> int:
+    """Выгрузить все товары в файл (CSV, CSV.GZ или XLSX), возвращает число строк.
+
+    Строки читаются из БД и пишутся в файл блоками - память не растет с размером каталога.
+    Функция блокирующая: из event loop вызывать через asyncio.to_thread.
+    """
+    if fmt == "xlsx":
+        return _export_xlsx(db, path, batch_size)
+    if fmt != "csv":
+        raise ValueError(f"Неподдерживаемый формат выгрузки: {fmt}")
+
+    # utf-8-sig - чтобы Excel открыл кириллицу без выбора кодировки
+    if compress:
+        f = gzip.open(path, 'wt', encoding='utf-8-sig', newline='')
+    else:
+        f = open(path, 'w', encoding='utf-8-sig', newline='')
+
+    count = 0
+    with f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(EXPORT_HEADER)
+        for rows in db.iter_all_products(batch_size):
+            writer.writerows(_row(row) for row in rows)
+            count += len(rows)
+
+    logger.info("📤 Выгружено %d товаров в %s", count, path)
+    return count
+
+def _export_xlsx(db: Database, path: str, batch_size: int) -> int:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Для XLSX установите openpyxl: pip install openpyxl")
+
+    # write_only: строки сразу уходят во временный файл, а не держатся в памяти
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Товары")
+    worksheet.append(EXPORT_HEADER)
+
+    count = 0
+    for rows in db.iter_all_products(batch_size):
+        for category_key, category_name, model, price, price_value in rows:
+            worksheet.append([category_key, category_name, model, price, price_value])
+        count += len(rows)
+
+    workbook.save(path)
+    logger.info("📤 Выгружено %d товаров в %s", count, path)
+    return count
+
+def _row(row: tuple) -> list:
+    category_key, category_name, model, price, price_value = row
+    return [category_key, category_name, model, price, _number(price_value)]
+
+def _number(value: Optional[float]) -> str:
+    """12500.0 -> "12500", без цены - пустая ячейка"""
+    if value is None:
+        return ""
+    return str(int(value)) if value.is_integer() else str(value)
@@ -0,0 +1,18 @@
+from .metrics import MetricsRegistry, Histogram, metrics, monitor_loop_lag
+from .exporter import MetricsExporter
+from .watchdog import LoopWatchdog
+from .logs import JsonFormatter, SamplingFilter, setup_logging, stop_logging, parse_sampling
+
+__all__ = [
+    'MetricsRegistry',
+    'Histogram',
+    'metrics',
+    'monitor_loop_lag',
+    'MetricsExporter',
+    'LoopWatchdog',
+    'JsonFormatter',
+    'SamplingFilter',
+    'setup_logging',
+    'stop_logging',
+    'parse_sampling'
+]
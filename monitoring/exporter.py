@@ -0,0 +1,40 @@
+# monitoring/exporter.py
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+class MetricsExporter:
+    """HTTP-сервер с метриками в формате Prometheus (GET /metrics).
+
+    По умолчанию слушает только 127.0.0.1 - наружу метрики отдает прокси или агент сбора.
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("📈 Метрики Prometheus: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,160 @@
+# monitoring/logs.py
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Атрибуты LogRecord; остальное в record.__dict__ - поля из extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON: время, уровень, модуль, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Пропускает каждую N-ю запись частых модулей (rates: {"services.google_sheets": 0.1}).
+
+    Правило модуля действует и на вложенные логгеры; WARNING и выше не отбрасываются никогда.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.dropped = 0
+        self.set_rates(rates or {})
+
+    def set_rates(self, rates: Dict[str, float]) -> None:
+        # Доля 0.1 - каждая 10-я запись; счетчик вместо random - выборка воспроизводима
+        self.rates = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+
+    def _every(self, name: str) -> Optional[int]:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        every = self._every(record.name)
+        if every is None:
+            return True
+        count = self.counters.get(record.name, 0)
+        self.counters[record.name] = count + 1
+        if every and count % every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный prepare() подставляет аргументы и форматирует исключение сразу -
+    то есть в event loop. Здесь запись уходит в очередь как есть, а строку собирает
+    поток QueueListener. Аргументы логирования не должны меняться после вызова.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[LazyQueueHandler] = None
+_sampling = SamplingFilter()
+
+def setup_logging(level: str = "INFO", fmt: str = "text",
+                  sampling: Optional[Dict[str, float]] = None) -> QueueListener:
+    """Логирование через очередь: вызывающий код только кладет запись в очередь,
+    вывод (stdout) и форматирование - в отдельном потоке.
+
+    fmt: text (как раньше) или json. Повторный вызов меняет уровень, формат
+    и выборку без пересоздания очереди.
+    """
+    global _listener, _queue_handler
+
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    _sampling.set_rates(sampling or {})
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    if _listener is None:
+        log_queue = queue.SimpleQueue()
+        _queue_handler = LazyQueueHandler(log_queue)
+        # Отброшенная выборкой запись не попадает даже в очередь
+        _queue_handler.addFilter(_sampling)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        # Дописать очередь при выходе, в том числе после необработанного исключения
+        atexit.register(stop_logging)
+
+    for handler in _listener.handlers:
+        handler.setFormatter(formatter)
+    return _listener
+
+def stop_logging() -> None:
+    """Дождаться вывода всех записей из очереди и остановить поток.
+
+    Дальнейшие записи выводятся напрямую, без очереди.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.addFilter(_sampling)
+        root.addHandler(handler)
+    _listener = None
+    _queue_handler = None
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """"services.google_sheets=0.1,data.database=0.5" -> {модуль: доля}
+
+    Неверная запись (не число или доля вне 0..1) пропускается с предупреждением -
+    опечатка в LOG_SAMPLING не должна останавливать бота.
+    """
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if not item.strip():
+            continue
+        try:
+            share = float(rate)
+        except ValueError:
+            share = None
+        if not name.strip() or share is None or not 0 <= share <= 1:
+            logging.getLogger(__name__).warning(
+                "⚠️ LOG_SAMPLING: запись %r пропущена (нужно модуль=доля от 0 до 1)", item.strip()
+            )
+            continue
+        rates[name.strip()] = share
+    return rates
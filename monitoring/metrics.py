@@ -0,0 +1,259 @@
+# monitoring/metrics.py
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+_PROCESS = psutil.Process()
+
+# Границы корзин гистограмм, секунды (как у клиентов Prometheus по умолчанию)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    """Значение метки для текстового формата Prometheus"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Распределение значений по фиксированным корзинам: число, сумма, максимум"""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя корзина - все, что больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам (верхняя граница корзины, в которую он попал)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+class MetricsRegistry:
+    """Метрики процесса в памяти: счетчики, значения (gauge) и гистограммы с метками.
+
+    Запись - несколько операций со словарем под блокировкой (метрики пишутся
+    и из потоков asyncio.to_thread), поэтому ее можно оставлять включенной всегда.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        # Значения, которые вычисляются в момент чтения (память процесса)
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, text: str) -> None:
+        """Описание метрики для экспорта (# HELP)"""
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Время блока кода в гистограмму name (работает и внутри корутин)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels) -> Callable:
+        """Декоратор: время каждого вызова функции (обычной или async) в гистограмму name"""
+        def decorator(func: Callable) -> Callable:
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - started, **labels)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def add_collector(self, collector: Callable[[], Dict[str, float]]) -> None:
+        """Функция, возвращающая {имя: значение} в момент чтения метрик"""
+        self._collectors.append(collector)
+
+    def counter(self, name: str) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def histograms(self, name: str) -> Dict[LabelKey, Histogram]:
+        with self._lock:
+            return dict(self._histograms.get(name, {}))
+
+    def gauges(self) -> Dict[str, float]:
+        """Текущие значения без меток, включая вычисляемые"""
+        with self._lock:
+            values = {name: series.get((), 0.0) for name, series in self._gauges.items()}
+        for collector in self._collectors:
+            try:
+                values.update(collector())
+            except Exception as e:
+                logger.warning("⚠️ Ошибка сбора метрик: %s", e)
+        return values
+
+    def hit_rate(self, name: str, **labels) -> Optional[float]:
+        """Доля result=hit в счетчике name (None - обращений не было)"""
+        wanted = set(_label_key(labels))
+        hits = total = 0.0
+        for key, value in self.counter(name).items():
+            if not wanted <= set(key):
+                continue
+            total += value
+            if ("result", "hit") in key:
+                hits += value
+        return hits / total if total else None
+
+    def render_prometheus(self) -> str:
+        """Все метрики в текстовом формате Prometheus (exposition format 0.0.4)"""
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def fmt(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in series.items():
+                lines.append(f"{name}{fmt(key)} {value:g}")
+
+        for collector in self._collectors:
+            try:
+                for name, value in collector().items():
+                    gauges.setdefault(name, {})[()] = value
+            except Exception as e:
+                logger.warning("⚠️ Ошибка сбора метрик: %s", e)
+        for name, series in sorted(gauges.items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{fmt(key)} {value:g}")
+
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt(key, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{fmt(key, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{fmt(key)} {histogram.sum:g}")
+                lines.append(f"{name}_count{fmt(key)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+def process_stats() -> Dict[str, float]:
+    """Память и CPU процесса (psutil)"""
+    process = _PROCESS
+    memory = process.memory_info()
+    cpu = process.cpu_times()
+    return {
+        "process_resident_memory_bytes": memory.rss,
+        "process_virtual_memory_bytes": memory.vms,
+        "process_cpu_seconds_total": cpu.user + cpu.system,
+        "process_threads": process.num_threads(),
+        "process_uptime_seconds": time.time() - process.create_time(),
+    }
+
+async def monitor_loop_lag(registry: "MetricsRegistry", interval: float = 1.0) -> None:
+    """Задержка event loop: насколько позже запланированного просыпается sleep(interval).
+
+    Если обработчик выполняет блокирующий вызов, задержка растет для всех пользователей.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        registry.set_gauge("event_loop_lag_last_seconds", lag)
+        registry.observe("event_loop_lag_seconds", lag)
+
+metrics = MetricsRegistry()
+metrics.add_collector(process_stats)
+metrics.describe("handler_seconds", "Время обработчиков aiogram")
+metrics.describe("db_query_seconds", "Время запросов к SQLite")
+metrics.describe("sheets_request_seconds", "Время запросов к Google Sheets/Drive API")
+metrics.describe("sheets_requests_total", "Ответы Google Sheets/Drive API по статусу")
+metrics.describe("category_refresh_seconds", "Полная загрузка категории из источника (чтение и запись)")
+metrics.describe("cache_requests_total", "Обращения к кэшам (result=hit|miss)")
+metrics.describe("event_loop_lag_seconds", "Задержка event loop")
+metrics.describe("event_loop_stall_seconds", "Длительность блокировок event loop дольше порога сторожа")
+metrics.describe("event_loop_stalls_total", "Число блокировок event loop дольше порога сторожа")
+metrics.describe("event_loop_lag_last_seconds", "Последняя измеренная задержка event loop")
@@ -0,0 +1,91 @@
+# monitoring/watchdog.py
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, List, Optional
+
+from .metrics import MetricsRegistry, metrics
+
+logger = logging.getLogger(__name__)
+
+class LoopWatchdog:
+    """Сторож event loop: ловит блокирующие вызовы и показывает, где они.
+
+    Корутина heartbeat() отмечается каждые interval секунд. Отдельный поток
+    проверяет отметку; если loop не отмечался дольше threshold, поток снимает
+    стек потока loop (sys._current_frames) и пишет его в лог вместе с
+    обработчиками, которые сейчас выполняются, - это и есть виновник зависания.
+    """
+
+    # Сколько последних кадров стека выводить
+    STACK_LIMIT = 25
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.1,
+                 describe_running: Optional[Callable[[], List[str]]] = None,
+                 registry: MetricsRegistry = metrics):
+        self.threshold = threshold
+        self.interval = interval
+        self.describe_running = describe_running
+        self.registry = registry
+        self.stalls = 0
+        self.last_report: Optional[str] = None
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    async def run(self) -> None:
+        """Запускать задачей в том loop, за которым нужно следить"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("🐕 Сторож event loop запущен (порог %g с)", self.threshold)
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        stalled_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            silence = time.monotonic() - beat
+
+            if stalled_beat is not None and beat != stalled_beat:
+                # Loop снова отметился: длительность зависания - до этой отметки
+                duration = beat - stalled_beat - self.interval
+                self.registry.observe("event_loop_stall_seconds", duration)
+                logger.warning("🐕 Event loop был заблокирован %.2f с", duration)
+                stalled_beat = None
+
+            if stalled_beat is None and silence >= self.threshold:
+                stalled_beat = beat
+                self.stalls += 1
+                self.registry.inc("event_loop_stalls_total")
+                self._report(silence)
+
+    def _report(self, silence: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=self.STACK_LIMIT)) if frame else "стек недоступен\n"
+
+        running = []
+        if self.describe_running:
+            try:
+                running = self.describe_running()
+            except Exception as e:
+                running = [f"ошибка: {e}"]
+        handlers = ", ".join(running) if running else "нет (фоновая задача)"
+
+        self.last_report = (
+            f"Event loop не отвечает {silence:.2f} с\n"
+            f"Обработчики: {handlers}\n"
+            f"Стек потока loop:\n{stack}"
+        )
+        logger.warning("🐕 %s", self.last_report)
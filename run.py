@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
+import time
+
+# Отсчет времени до первого ответа - с самого начала процесса
+STARTED_AT = time.perf_counter()
+
 import asyncio
 import logging
+import os
 import sys
 
+from monitoring.logs import parse_sampling, setup_logging
+
+# Логирование - до импорта модулей бота, чтобы записи при загрузке настроек не потерялись
+# (.env еще не прочитан: здесь - только переменные окружения, после импорта - настройки config)
+setup_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'text'),
+              parse_sampling(os.getenv('LOG_SAMPLING', '')))
+
 from aiogram import Bot, Dispatcher, F, Router
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
@@ -12,25 +25,60 @@ from bot.config import config
 from bot.handlers.commands import register_commands
 from bot.handlers.callbacks import register_callbacks
 from bot.handlers import admin, category_management
+from bot.middlewares import HandlerMetricsMiddleware, describe_running_handlers, update_profiler
 from data import cache
+from monitoring import LoopWatchdog, MetricsExporter, metrics, monitor_loop_lag
 from services import sheets_reader
 
 # Роутер для неизвестных сообщений
 unknown_router = Router()
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования (вывод и форматирование - в отдельном потоке)
+setup_logging(config.LOG_LEVEL, config.LOG_FORMAT, config.LOG_SAMPLING)
 logger = logging.getLogger(__name__)
 
 # Создаем глобальные переменные
 bot = None
 dp = None
+refresh_task = None
+periodic_task = None
+lag_task = None
+watchdog_task = None
+
+async def startup_refresh():
+    """Обновление данных при запуске"""
+    started = time.perf_counter()
+    if sheets_reader and await sheets_reader.ensure_connected():
+        logger.info("✅ Google Sheets API подключен")
+    else:
+        # Категории из локальных файлов обновляются и без Google Sheets
+        logger.error("❌ Google Sheets API не подключен")
+
+    try:
+        summary = await cache.update_all()
+        if summary["skipped"] < summary["total"]:
+            logger.info(
+                "✅ Данные загружены за %.1f с: %d из %d категорий",
+                time.perf_counter() - started, summary['updated'], summary['total']
+            )
+    except Exception as e:
+        logger.error("❌ Ошибка загрузки данных: %s", e)
+
+async def periodic_refresh():
+    """Фоновое обновление раз в CACHE_UPDATE_INTERVAL секунд (листы грузятся, только если таблица изменилась)"""
+    while True:
+        await asyncio.sleep(config.CACHE_UPDATE_INTERVAL)
+        if refresh_task and not refresh_task.done():
+            # Загрузка при запуске еще идет
+            continue
+        await startup_refresh()
+
+async def on_startup():
+    """Бот готов принимать обновления"""
+    logger.info("⏱ Время до первого ответа: %.2f с", time.perf_counter() - STARTED_AT)
 
 async def main():
-    global bot, dp
+    global bot, dp, refresh_task, periodic_task, lag_task, watchdog_task
 
     logger.info("=" * 50)
     logger.info("🚀 Бот запускается...")
@@ -39,9 +87,9 @@ async def main():
     try:
         config.validate()
         logger.info("✅ Конфигурация загружена")
-        logger.info(f"👑 Администраторы: {config.ADMIN_IDS}")
+        logger.info("👑 Администраторы: %s", config.ADMIN_IDS)
     except Exception as e:
-        logger.error(f"❌ Ошибка конфигурации: {e}")
+        logger.error("❌ Ошибка конфигурации: %s", e)
         return
 
     # Инициализация бота
@@ -54,33 +102,53 @@ async def main():
     dp.include_router(admin.router)
     dp.include_router(category_management.router)
     dp.include_router(unknown_router)
+    # Время обработчиков (middleware диспетчера действуют и во вложенных роутерах)
+    dp.message.middleware(HandlerMetricsMiddleware("message"))
+    dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
+    # Полное время обновлений и профили медленных - внешний middleware, включается /profile
+    update_profiler.attach(dp, enabled=config.PROFILE_UPDATES)
     # Проверка подключения к Telegram
     try:
         me = await bot.get_me()
-        logger.info(f"✅ Бот @{me.username} успешно подключен")
+        logger.info("✅ Бот @%s успешно подключен", me.username)
     except Exception as e:
-        logger.error(f"❌ Ошибка подключения к Telegram: {e}")
+        logger.error("❌ Ошибка подключения к Telegram: %s", e)
         await bot.session.close()
         return
 
-    # Проверка Google Sheets
-    if sheets_reader and sheets_reader.is_connected():
-        logger.info("✅ Google Sheets API подключен")
-        try:
-            await cache.update_all()
-            logger.info("✅ Данные загружены")
-        except Exception as e:
-            logger.error(f"❌ Ошибка загрузки данных: {e}")
+    # Обновление данных: в фоне (бот сразу отвечает из SQLite), с ожиданием или без
+    if config.STARTUP_REFRESH == "wait":
+        await startup_refresh()
+    elif config.STARTUP_REFRESH == "background":
+        logger.info("📦 Ответы из сохраненных данных, обновление идет в фоне")
+        refresh_task = asyncio.create_task(startup_refresh())
     else:
-        logger.error("❌ Google Sheets API не подключен")
+        logger.info("⏭ Обновление при запуске отключено")
+
+    if config.CACHE_UPDATE_INTERVAL > 0:
+        periodic_task = asyncio.create_task(periodic_refresh())
+
+    lag_task = asyncio.create_task(monitor_loop_lag(metrics, config.LOOP_LAG_INTERVAL))
+    if config.LOOP_STALL_THRESHOLD > 0:
+        watchdog = LoopWatchdog(config.LOOP_STALL_THRESHOLD, describe_running=describe_running_handlers)
+        watchdog_task = asyncio.create_task(watchdog.run())
+    exporter = None
+    if config.METRICS_PORT:
+        exporter = MetricsExporter(metrics, config.METRICS_HOST, config.METRICS_PORT)
+        try:
+            await exporter.start()
+        except OSError as e:
+            logger.error("❌ Экспорт метрик не запущен: %s", e)
+            exporter = None
 
     register_commands(dp)
     register_callbacks(dp)
+    dp.startup.register(on_startup)
 
     # Обработчик неизвестных текстовых сообщений (в роутере с низким приоритетом)
     @unknown_router.message(F.text, ~F.text.startswith('/'))
     async def handle_unknown(message: Message):
-        logger.info(f"Неизвестное сообщение от {message.from_user.id}: {message.text}")
+        logger.info("Неизвестное сообщение от %s: %s", message.from_user.id, message.text)
         await message.answer("❌ Неизвестная команда. Используйте /start")
 
     # Настройка команд
@@ -88,6 +156,7 @@ async def main():
         BotCommand(command="start", description="Запустить бота"),
         BotCommand(command="menu", description="Главное меню"),
         BotCommand(command="stats", description="Статистика"),
+        BotCommand(command="changes", description="Что нового"),
         BotCommand(command="admin", description="Панель администратора"),
     ]
     await bot.set_my_commands(commands)
@@ -97,8 +166,17 @@ async def main():
     try:
         await dp.start_polling(bot)
     except Exception as e:
-        logger.error(f"❌ Ошибка: {e}")
+        logger.error("❌ Ошибка: %s", e)
     finally:
+        for task in (refresh_task, periodic_task, lag_task, watchdog_task):
+            if task and not task.done():
+                task.cancel()
+        if exporter:
+            await exporter.stop()
+        # Отложенные правки категорий - на диск до выхода
+        await config.persistence.flush()
+        if sheets_reader:
+            await sheets_reader.close()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -1,3 +1,39 @@
-from .google_sheets import GoogleSheetsReader, sheets_reader
+from .google_sheets import (
+    GoogleSheetsReader,
+    QuotaManager,
+    sheets_reader,
+    PRIORITY_ADMIN,
+    PRIORITY_BACKGROUND
+)
+from .sheets_client import AsyncSheetsClient, SheetsAPIError
+from .resilience import CircuitBreaker, CircuitOpenError
+from .sources import (
+    ProductSource,
+    SheetsSource,
+    FileSource,
+    CSVSource,
+    XLSXSource,
+    JSONSource,
+    RowValidator,
+    open_file_source
+)
 
-__all__ = ['GoogleSheetsReader', 'sheets_reader']
\ No newline at end of file
+__all__ = [
+    'GoogleSheetsReader',
+    'sheets_reader',
+    'QuotaManager',
+    'PRIORITY_ADMIN',
+    'PRIORITY_BACKGROUND',
+    'AsyncSheetsClient',
+    'SheetsAPIError',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'ProductSource',
+    'SheetsSource',
+    'FileSource',
+    'CSVSource',
+    'XLSXSource',
+    'JSONSource',
+    'RowValidator',
+    'open_file_source'
+]
\ No newline at end of file
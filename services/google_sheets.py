@@ -1,94 +1,348 @@
 # services/google_sheets.py
+import asyncio
+import heapq
+import itertools
 import logging
-from typing import List, Tuple, Dict
-
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import re
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Tuple, Dict, Optional
 
 from bot.config import config
+from .resilience import CircuitBreaker, call_with_retries
+from .sheets_client import AsyncSheetsClient, SheetsAPIError
 
 logger = logging.getLogger(__name__)
 
+# Приоритеты запросов: меньше - раньше
+PRIORITY_ADMIN = 0
+PRIORITY_BACKGROUND = 10
+
+# Диапазон в нотации A1 без имени листа: "A:B", "A2:B", "C3:D500"
+A1_RANGE = re.compile(r"([A-Z]{1,3})([1-9][0-9]*)?:([A-Z]{1,3})([1-9][0-9]*)?")
+
+def parse_a1_range(range_name: str) -> Tuple[str, int, str, Optional[int]]:
+    """Диапазон A1 -> (первый столбец, первая строка, последний столбец, последняя строка или None).
+
+    "A:B" -> ("A", 1, "B", None), "C3:D500" -> ("C", 3, "D", 500).
+    Неверный диапазон - ValueError с его текстом.
+    """
+    match = A1_RANGE.fullmatch(range_name.strip().upper())
+    if not match:
+        raise ValueError(f"Неверный диапазон {range_name!r}: нужен вид A:B, A2:B или C3:D500")
+    first_column, first_row, last_column, last_row = match.groups()
+    first_row = int(first_row) if first_row else 1
+    last_row = int(last_row) if last_row else None
+    if last_row is not None and last_row < first_row:
+        raise ValueError(f"Неверный диапазон {range_name!r}: последняя строка раньше первой")
+    return first_column, first_row, last_column, last_row
+
+def normalize_rows(rows: Iterable[List[str]]) -> Iterator[Tuple[str, str]]:
+    """Строки листа -> пары (модель, цена); строки без модели или цены пропускаются"""
+    for row in rows:
+        if len(row) >= 2:
+            model, price = row[0].strip(), row[1].strip()
+            if model and price:
+                yield model, price
+
+class QuotaManager:
+    """Планировщик запросов под квоту чтения Sheets API (token bucket).
+
+    Корзина вмещает burst запросов и пополняется со скоростью (quota - burst) / 60 в секунду,
+    поэтому в любом минутном окне запросов не больше quota. Ожидающие запросы
+    обслуживаются по приоритету, внутри приоритета - по очереди.
+    """
+
+    def __init__(self, per_minute: int, burst: int = 10):
+        self.per_minute = per_minute
+        self.burst = max(1, min(burst, per_minute - 1))
+        self.rate = max(1, per_minute - self.burst) / 60
+        self.tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters: List[tuple] = []
+        self._counter = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Метрики
+        self._recent = deque()  # время выданных разрешений за последнюю минуту
+        self.requests_total = 0
+        self.throttled_total = 0
+        self.wait_seconds_total = 0.0
+        self.quota_errors_total = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _grant(self) -> None:
+        self.tokens -= 1
+        self.requests_total += 1
+        self._recent.append(time.monotonic())
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND) -> None:
+        """Дождаться разрешения на один запрос"""
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self._grant()
+            return
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        await future
+        self.throttled_total += 1
+        self.wait_seconds_total += time.monotonic() - started
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._grant()
+            future.set_result(None)
+
+    def throttle(self) -> None:
+        """Получен 429 - опустошить корзину, чтобы следующие запросы подождали"""
+        self.quota_errors_total += 1
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики квоты: использование за последнюю минуту и запас"""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        self._refill()
+        return {
+            "quota_per_minute": self.per_minute,
+            "used_last_minute": len(self._recent),
+            "headroom": max(0, self.per_minute - len(self._recent)),
+            "tokens": round(self.tokens, 2),
+            "queued": len(self._waiters),
+            "requests_total": self.requests_total,
+            "throttled_total": self.throttled_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 2),
+            "quota_errors_total": self.quota_errors_total,
+        }
+
 class GoogleSheetsReader:
-    """Класс для работы с Google Sheets"""
+    """Класс для работы с Google Sheets.
 
-    def __init__(self, credentials_file: str):
+    Клиент (aiohttp) создается лениво при первом ensure_connected(), а не при импорте.
+    """
+
+    def __init__(self, credentials_file: str, api_endpoint: Optional[str] = None):
         self.credentials_file = credentials_file
-        self.service = None
-        self.connect()
+        self.api_endpoint = api_endpoint
+        self.client: Optional[AsyncSheetsClient] = None
+        # Размыкатель на каждую таблицу: сбой одной не блокирует остальные
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.quota = QuotaManager(config.SHEETS_READ_QUOTA, config.SHEETS_QUOTA_BURST)
+
+    async def ensure_connected(self) -> bool:
+        """Подключиться при первом обращении"""
+        if self.client is None:
+            self.connect()
+        return self.client is not None
 
     def connect(self) -> None:
         """Подключение к Google Sheets API"""
         try:
-            credentials = service_account.Credentials.from_service_account_file(
+            if not self.credentials_file and not self.api_endpoint:
+                raise ValueError("SERVICE_ACCOUNT_FILE не указан")
+
+            self.client = AsyncSheetsClient(
                 self.credentials_file,
-                scopes=['https://www.googleapis.com/auth/spreadsheets.readonly']
+                self.api_endpoint,
+                max_connections=config.SHEETS_MAX_CONNECTIONS
             )
-            self.service = build('sheets', 'v4', credentials=credentials)
-            logger.info("✅ Подключение к Google Sheets API успешно")
+            logger.info("✅ Подключение к Google Sheets API успешно (%s)", self.client.api_endpoint)
         except Exception as e:
-            logger.error(f"❌ Ошибка подключения к Google Sheets: {e}")
-            self.service = None
+            logger.error("❌ Ошибка подключения к Google Sheets: %s", e)
+            self.client = None
 
-    def get_sheet_data(self, spreadsheet_id: str, sheet_name: str) -> List[Tuple[str, str]]:
-        """Получение данных с указанного листа"""
-        if not self.service:
-            logger.error("❌ Сервис Google Sheets не инициализирован")
-            return []
+    def _get_breaker(self, spreadsheet_id: str) -> CircuitBreaker:
+        breaker = self.breakers.get(spreadsheet_id)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                f"Таблица {spreadsheet_id}",
+                threshold=config.SHEETS_BREAKER_THRESHOLD,
+                reset_timeout=config.SHEETS_BREAKER_RESET
+            )
+            self.breakers[spreadsheet_id] = breaker
+        return breaker
+
+    async def _call(self, spreadsheet_id: str, func, priority: int = PRIORITY_BACKGROUND):
+        """Запрос с повторами и размыкателем таблицы; каждая попытка расходует квоту"""
+        async def attempt():
+            await self.quota.acquire(priority)
+            try:
+                return await func()
+            except SheetsAPIError as e:
+                if e.status == 429:
+                    self.quota.throttle()
+                raise
+
+        return await call_with_retries(
+            attempt,
+            attempts=config.SHEETS_RETRY_ATTEMPTS,
+            base_delay=config.SHEETS_RETRY_BASE_DELAY,
+            breaker=self._get_breaker(spreadsheet_id)
+        )
+
+    async def get_sheet_sizes(self, spreadsheet_id: str,
+                              priority: int = PRIORITY_BACKGROUND) -> Dict[str, int]:
+        """Число строк каждого листа - один запрос на всю таблицу ({} при ошибке)"""
+        if not self.client:
+            return {}
 
         try:
-            range_name = f"{sheet_name}!A:B"
+            result = await self._call(
+                spreadsheet_id,
+                lambda: self.client.get_spreadsheet(
+                    spreadsheet_id, fields='sheets.properties(title,gridProperties.rowCount)'
+                ),
+                priority
+            )
+        except Exception as e:
+            logger.warning("⚠️ Не удалось получить размеры листов: %s", e)
+            return {}
 
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
+        return {
+            sheet['properties']['title']: sheet['properties'].get('gridProperties', {}).get('rowCount', 0)
+            for sheet in result.get('sheets', [])
+        }
 
-            rows = result.get('values', [])
+    async def iter_sheet_products(self, spreadsheet_id: str, sheet_name: str,
+                                  priority: int = PRIORITY_BACKGROUND,
+                                  row_count: Optional[int] = None,
+                                  columns: str = "A:B") -> AsyncIterator[Iterator[Tuple[str, str]]]:
+        """Товары листа блоками по SHEETS_CHUNK_ROWS строк (A1:B5000, A5001:B10000, ...).
 
-            if not rows:
-                logger.warning(f"⚠️ Лист {sheet_name} пуст")
-                return []
+        columns - диапазон модели и цены в нотации A1 ("A:B", "A2:B", "C3:D500");
+        первая строка диапазона - заголовок.
+        Каждый блок - генератор пар (модель, цена) поверх одного ответа API,
+        так что в памяти одновременно находится не больше одного блока.
+        Без row_count (размер листа неизвестен) и без последней строки в диапазоне
+        лист читается одним запросом. Ошибка после всех повторов - исключение.
+        """
+        if not self.client:
+            raise RuntimeError("Сервис Google Sheets не инициализирован")
 
-            products = []
-            for row in rows[1:]:  # пропускаем заголовок
-                if len(row) >= 2 and row[0].strip() and row[1].strip():
-                    products.append((row[0].strip(), row[1].strip()))
+        first_column, first_row, last_column, last_row = parse_a1_range(columns)
+        if row_count is not None:
+            last_row = row_count if last_row is None else min(last_row, row_count)
+        chunk_rows = config.SHEETS_CHUNK_ROWS
+        if last_row is None or last_row - first_row < chunk_rows:
+            ranges = [f"{sheet_name}!{columns}"]
+        else:
+            ranges = [
+                f"{sheet_name}!{first_column}{start}:{last_column}{min(start + chunk_rows - 1, last_row)}"
+                for start in range(first_row, last_row + 1, chunk_rows)
+            ]
 
-            logger.info(f"📊 Загружено {len(products)} записей из листа {sheet_name}")
-            return products
+        for index, range_name in enumerate(ranges):
+            try:
+                result = await self._call(
+                    spreadsheet_id,
+                    lambda: self.client.get_values(spreadsheet_id, range_name),
+                    priority
+                )
+            except Exception as e:
+                logger.error("❌ Ошибка получения данных из листа %s (%s): %s", sheet_name, range_name, e)
+                raise
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка получения данных из листа {sheet_name}: {e}")
-            return []
+            rows = result.get('values', [])
+            if index == 0:
+                rows = rows[1:]  # пропускаем заголовок
+            yield normalize_rows(rows)
+
+    async def get_sheet_data(self, spreadsheet_id: str, sheet_name: str,
+                             priority: int = PRIORITY_BACKGROUND) -> List[Tuple[str, str]]:
+        """Получение данных с указанного листа целиком.
+
+        Пустой лист - пустой список; ошибка после всех повторов - исключение,
+        чтобы вызывающий код сохранил прежние данные.
+        """
+        products = []
+        async for chunk in self.iter_sheet_products(spreadsheet_id, sheet_name, priority):
+            products.extend(chunk)
+
+        if products:
+            logger.debug("📊 Загружено %d записей из листа %s", len(products), sheet_name)
+        else:
+            logger.warning("⚠️ Лист %s пуст", sheet_name)
+        return products
 
-    def get_all_sheets_data(self, spreadsheet_id: str) -> Dict[str, List[Tuple[str, str]]]:
+    async def get_all_sheets_data(self, spreadsheet_id: str) -> Dict[str, List[Tuple[str, str]]]:
         """Получение данных со всех листов"""
         result = {}
         for key, sheet_config in config.SHEETS_CONFIG.items():
             sheet_name = sheet_config["sheet_name"]
-            result[key] = self.get_sheet_data(spreadsheet_id, sheet_name)
+            result[key] = await self.get_sheet_data(spreadsheet_id, sheet_name)
         return result
 
-    def get_sheet_info(self, spreadsheet_id: str) -> List[str]:
+    async def get_sheet_info(self, spreadsheet_id: str, priority: int = PRIORITY_ADMIN) -> List[str]:
         """Получить список всех листов в таблице"""
+        if not self.client:
+            logger.error("❌ Сервис Google Sheets не инициализирован")
+            return []
+
         try:
-            result = self.service.spreadsheets().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
+            result = await self._call(
+                spreadsheet_id,
+                lambda: self.client.get_spreadsheet(spreadsheet_id, fields='sheets.properties.title'),
+                priority
+            )
             sheets = result.get('sheets', [])
             return [sheet['properties']['title'] for sheet in sheets]
         except Exception as e:
-            logger.error(f"❌ Ошибка получения списка листов: {e}")
+            logger.error("❌ Ошибка получения списка листов: %s", e)
             return []
 
+    async def get_revision(self, spreadsheet_id: str) -> Optional[str]:
+        """Ревизия таблицы по метаданным Drive (version, иначе modifiedTime).
+
+        Один легкий запрос без квоты Sheets; None - ревизию узнать не удалось.
+        Размыкатель таблицы здесь не участвует: сбой Drive не должен закрывать чтение
+        листов, а без ревизии таблица просто загружается целиком.
+        """
+        if not self.client:
+            return None
+
+        try:
+            metadata = await call_with_retries(
+                lambda: self.client.get_file_metadata(spreadsheet_id),
+                attempts=config.SHEETS_RETRY_ATTEMPTS,
+                base_delay=config.SHEETS_RETRY_BASE_DELAY
+            )
+        except Exception as e:
+            logger.warning("⚠️ Не удалось получить ревизию таблицы %s: %s", spreadsheet_id, e)
+            return None
+
+        return metadata.get('version') or metadata.get('modifiedTime')
+
     def is_connected(self) -> bool:
         """Проверка подключения"""
-        return self.service is not None
+        return self.client is not None
+
+    async def close(self) -> None:
+        """Закрыть HTTP-сессию"""
+        if self.client:
+            await self.client.close()
 
 # Инициализация Google Sheets
 try:
-    sheets_reader = GoogleSheetsReader(config.SERVICE_ACCOUNT_FILE)
+    sheets_reader = GoogleSheetsReader(config.SERVICE_ACCOUNT_FILE, config.SHEETS_API_ENDPOINT)
 except Exception as e:
-    logger.error(f"❌ Ошибка инициализации Google Sheets: {e}")
+    logger.error("❌ Ошибка инициализации Google Sheets: %s", e)
     sheets_reader = None
\ No newline at end of file
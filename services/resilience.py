@@ -0,0 +1,115 @@
+# services/resilience.py
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from .sheets_client import SheetsAPIError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Статусы, при которых повтор имеет смысл (квота, сбои на стороне Google)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Запросы к источнику временно отключены после серии сбоев"""
+
+def is_transient(error: Exception) -> bool:
+    """Временная ошибка (сеть, таймаут, 429/5xx), а не ошибка в запросе"""
+    if isinstance(error, SheetsAPIError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+class CircuitBreaker:
+    """Размыкатель цепи: после threshold сбоев подряд запросы не выполняются reset_timeout секунд,
+    затем пропускается одна пробная попытка (half-open), остальные получают CircuitOpenError до ее итога"""
+
+    def __init__(self, name: str, threshold: int = 5, reset_timeout: float = 60):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # В half-open пробная попытка уже выполняется - остальные ждут ее итога
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Проверить, можно ли выполнить запрос; True - это пробная попытка half-open"""
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(f"{self.name}: источник недоступен, повтор через "
+                                   f"{self.reset_timeout - (time.monotonic() - self.opened_at):.0f} с")
+        if state == "half-open":
+            if self._probing:
+                raise CircuitOpenError(f"{self.name}: источник недоступен, идет пробный запрос")
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self) -> None:
+        """Пробная попытка завершилась без итога для размыкателя (ошибка в запросе, отмена)"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("🔌 %s: соединение восстановлено", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning("🔌 %s: %d сбоев подряд, запросы приостановлены на %.0f с",
+                               self.name, self.failures, self.reset_timeout)
+            self.opened_at = time.monotonic()
+
+async def call_with_retries(func: Callable[[], Awaitable[T]], attempts: int = 4,
+                            base_delay: float = 0.5, max_delay: float = 16,
+                            breaker: Optional[CircuitBreaker] = None) -> T:
+    """Выполнить запрос с экспоненциальной задержкой между повторами (с джиттером).
+
+    Повторяются только временные ошибки; размыкатель учитывает итог всей серии попыток.
+    """
+    # Пробная попытка half-open освобождается при любом исходе, в том числе при отмене
+    probe = breaker.before_call() if breaker else False
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                result = await func()
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if attempt == attempts:
+                    if breaker:
+                        breaker.record_failure()
+                    raise
+
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after:
+                    delay = max(delay, retry_after)
+                logger.warning("🔁 Попытка %d/%d не удалась (%s), повтор через %.1f с", attempt, attempts, e, delay)
+                await asyncio.sleep(delay)
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+    finally:
+        if probe:
+            breaker.end_probe()
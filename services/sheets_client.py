@@ -0,0 +1,178 @@
+# services/sheets_client.py
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import aiohttp
+
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+SHEETS_SCOPE = 'https://www.googleapis.com/auth/spreadsheets.readonly'
+# Метаданные файла (modifiedTime/version) для проверки изменений таблицы
+DRIVE_METADATA_SCOPE = 'https://www.googleapis.com/auth/drive.metadata.readonly'
+DEFAULT_ENDPOINT = 'https://sheets.googleapis.com/'
+DEFAULT_DRIVE_ENDPOINT = 'https://www.googleapis.com/'
+
+class SheetsAPIError(Exception):
+    """Ошибка ответа Sheets API"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+class ServiceAccountToken:
+    """OAuth-токен сервисного аккаунта с кэшированием до истечения срока"""
+
+    # Обновляем заранее, чтобы токен не истек посреди запроса
+    REFRESH_MARGIN = 60
+
+    def __init__(self, credentials_file: str, scopes: str = f"{SHEETS_SCOPE} {DRIVE_METADATA_SCOPE}"):
+        from google.auth import crypt
+
+        with open(credentials_file, 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+
+        self.scopes = scopes
+        self.signer = crypt.RSASigner.from_service_account_info(self.info)
+        self.token_uri = self.info.get('token_uri', 'https://oauth2.googleapis.com/token')
+
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _make_assertion(self) -> str:
+        """Подписанный JWT для обмена на токен"""
+        from google.auth import jwt
+
+        now = int(time.time())
+        payload = {
+            'iss': self.info['client_email'],
+            'scope': self.scopes,
+            'aud': self.token_uri,
+            'iat': now,
+            'exp': now + 3600,
+        }
+        return jwt.encode(self.signer, payload).decode('utf-8')
+
+    async def get(self, session: aiohttp.ClientSession) -> str:
+        """Действующий токен (запрашивается только при истечении)"""
+        if self._token and time.time() < self._expires_at - self.REFRESH_MARGIN:
+            return self._token
+
+        async with self._lock:
+            if self._token and time.time() < self._expires_at - self.REFRESH_MARGIN:
+                return self._token
+
+            data = {
+                'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+                'assertion': self._make_assertion(),
+            }
+            async with session.post(self.token_uri, data=data) as response:
+                body = await response.json(content_type=None)
+                if response.status != 200:
+                    raise SheetsAPIError(response.status, body.get('error_description', str(body)))
+
+            self._token = body['access_token']
+            self._expires_at = time.time() + int(body.get('expires_in', 3600))
+            logger.info("🔑 Токен Google обновлен")
+            return self._token
+
+class AsyncSheetsClient:
+    """Асинхронный клиент Sheets API v4 поверх aiohttp.
+
+    Одна сессия с пулом keep-alive соединений, ответы сжимаются gzip.
+    Без файла ключей (api_endpoint для локального сервера) запросы идут без авторизации.
+    """
+
+    def __init__(self, credentials_file: Optional[str] = None, api_endpoint: Optional[str] = None,
+                 max_connections: int = 10, timeout: float = 30):
+        self.api_endpoint = (api_endpoint or DEFAULT_ENDPOINT).rstrip('/') + '/'
+        # Локальный сервер отвечает и за Drive
+        self.drive_endpoint = (api_endpoint or DEFAULT_DRIVE_ENDPOINT).rstrip('/') + '/'
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.token = ServiceAccountToken(credentials_file) if credentials_file and not api_endpoint else None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                # Google отдает gzip, только если он упомянут и в User-Agent
+                headers={'Accept-Encoding': 'gzip', 'User-Agent': 'bot_jenia (gzip)'}
+            )
+        return self._session
+
+    async def request(self, path: str, params: Optional[Dict[str, Any]] = None,
+                      endpoint: Optional[str] = None) -> Dict[str, Any]:
+        """GET-запрос к API, возвращает разобранный JSON"""
+        session = self._get_session()
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f"Bearer {await self.token.get(session)}"
+
+        url = (endpoint or self.api_endpoint) + path
+        # Метка без идентификаторов таблиц и листов
+        api = "drive.files" if path.startswith("drive/") else "values" if "/values/" in path else "spreadsheets"
+        started = time.perf_counter()
+        try:
+            return await self._send(session, url, params, headers, api)
+        finally:
+            metrics.observe("sheets_request_seconds", time.perf_counter() - started, api=api)
+
+    async def _send(self, session: aiohttp.ClientSession, url: str, params: Optional[Dict[str, Any]],
+                    headers: Dict[str, str], api: str) -> Dict[str, Any]:
+        async with session.get(url, params=params, headers=headers) as response:
+            metrics.inc("sheets_requests_total", api=api, status=response.status)
+            if response.status != 200:
+                # Прокси и балансировщики Google могут ответить HTML, а не JSON
+                text = await response.text()
+                try:
+                    message = json.loads(text).get('error', {}).get('message', '')
+                except (ValueError, AttributeError):
+                    message = text[:200]
+                retry_after = response.headers.get('Retry-After')
+                raise SheetsAPIError(
+                    response.status,
+                    message,
+                    float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+            return await response.json(content_type=None)
+
+    async def get_values(self, spreadsheet_id: str, range_name: str) -> Dict[str, Any]:
+        """spreadsheets.values.get"""
+        return await self.request(
+            f"v4/spreadsheets/{quote(spreadsheet_id, safe='')}/values/{quote(range_name, safe='')}",
+            {'majorDimension': 'ROWS'}
+        )
+
+    async def get_spreadsheet(self, spreadsheet_id: str, fields: Optional[str] = None) -> Dict[str, Any]:
+        """spreadsheets.get (без данных ячеек)"""
+        params = {'fields': fields} if fields else None
+        return await self.request(f"v4/spreadsheets/{quote(spreadsheet_id, safe='')}", params)
+
+    async def get_file_metadata(self, file_id: str, fields: str = 'modifiedTime,version') -> Dict[str, Any]:
+        """Drive files.get - только метаданные, без содержимого"""
+        return await self.request(
+            f"drive/v3/files/{quote(file_id, safe='')}",
+            {'fields': fields},
+            endpoint=self.drive_endpoint
+        )
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
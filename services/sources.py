@@ -0,0 +1,337 @@
+# services/sources.py
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from bot.config import config
+from data.database import parse_price
+from .google_sheets import PRIORITY_BACKGROUND, normalize_rows, parse_a1_range, sheets_reader
+
+logger = logging.getLogger(__name__)
+
+def column_index(column: str) -> int:
+    """Номер столбца по букве: A -> 0, C -> 2, AA -> 26"""
+    index = 0
+    for char in column.strip().upper():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+def cell_text(value: Any) -> str:
+    """Значение ячейки как в Google Sheets: 12500.0 -> "12500", None -> "" """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+_WHITESPACE = re.compile(r"\s*")
+_ITEM_END = re.compile(r"\s*[,\]]")
+
+def iter_json_array(f, block_size: int = 1 << 16) -> Iterator[Any]:
+    """Элементы JSON-массива из файла по одному: файл читается блоками, в памяти -
+    текущий блок и разбираемый элемент, а не весь массив"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        block = f.read(block_size)
+        eof = not block
+        buffer, pos = buffer[pos:] + block, 0
+        return not eof
+
+    def next_char() -> str:
+        """Следующий значащий символ (пробелы пропускаются); "" - конец файла"""
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or not fill():
+                return buffer[pos] if pos < len(buffer) else ""
+
+    if next_char() != "[":
+        raise ValueError("Ожидался JSON-массив")
+    pos += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент не поместился в прочитанное - дочитать
+                if fill():
+                    continue
+                raise
+            # Число на границе блока могло быть прочитано не целиком ("12." из "12.5"):
+            # элемент закончен, только если за ним уже видна , или ]
+            if not _ITEM_END.match(buffer, end) and fill():
+                continue
+            break
+        pos = end
+        yield item
+
+        char = next_char()
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Неверный JSON: ожидалась , или ] вместо {char!r}")
+        pos += 1
+
+class ProductSource(ABC):
+    """Источник товаров категории.
+
+    iter_products() отдает блоки - итераторы пар (модель, цена), которые
+    DataCache.ingest() пишет в БД по мере получения. revision() - метка версии
+    источника; пока она не меняется, повторная загрузка не нужна.
+    """
+
+    name = "source"
+
+    async def revision(self) -> Optional[str]:
+        return None
+
+    @abstractmethod
+    def iter_products(self) -> AsyncIterator[Iterator[Tuple[str, str]]]:
+        """Блоки пар (модель, цена) по мере чтения источника"""
+
+class SheetsSource(ProductSource):
+    """Лист Google Sheets (через общий sheets_reader с квотой и повторами)"""
+
+    def __init__(self, spreadsheet_id: str, sheet_name: str, columns: str = "A:B",
+                 priority: int = PRIORITY_BACKGROUND, row_count: Optional[int] = None):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.columns = columns
+        self.priority = priority
+        self.row_count = row_count
+        self.name = sheet_name
+
+    async def revision(self) -> Optional[str]:
+        return await sheets_reader.get_revision(self.spreadsheet_id)
+
+    def iter_products(self) -> AsyncIterator[Iterator[Tuple[str, str]]]:
+        return sheets_reader.iter_sheet_products(
+            self.spreadsheet_id, self.sheet_name, self.priority, self.row_count, self.columns
+        )
+
+class FileSource(ProductSource):
+    """Локальный файл: строки читаются в отдельном потоке блоками по chunk_rows.
+
+    columns - диапазон модели и цены, как у листов ("A:B", "A2:B", "C3:D500"):
+    строки вне диапазона пропускаются; header - пропустить первую строку диапазона.
+    """
+
+    def __init__(self, path: str, columns: str = "A:B", header: bool = True,
+                 chunk_rows: Optional[int] = None):
+        self.path = Path(path)
+        first, self.first_row, last, self.last_row = parse_a1_range(columns)
+        self.model_index = column_index(first)
+        self.price_index = column_index(last)
+        self.header = header
+        self.chunk_rows = chunk_rows or config.FILE_CHUNK_ROWS
+        self.name = self.path.name
+
+    async def revision(self) -> Optional[str]:
+        try:
+            stat = await asyncio.to_thread(os.stat, self.path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    @abstractmethod
+    def read_rows(self) -> Iterator[List[str]]:
+        """Строки файла (списки ячеек), без учета заголовка"""
+
+    def estimate_rows(self) -> Optional[int]:
+        """Примерное число строк (для прогресса) без разбора файла; None - неизвестно"""
+        return None
+
+    def _count_lines(self) -> int:
+        lines = 0
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                lines += block.count(b'\n')
+        return lines
+
+    def _pick(self, rows: Iterator[List[str]]) -> Iterator[List[str]]:
+        """Оставить в строке только модель и цену"""
+        for row in rows:
+            if len(row) > max(self.model_index, self.price_index):
+                yield [row[self.model_index], row[self.price_index]]
+
+    def _read_chunks(self) -> Iterator[List[Tuple[str, str]]]:
+        rows = itertools.islice(self.read_rows(), self.first_row - 1, self.last_row)
+        if self.header:
+            next(rows, None)
+        products = normalize_rows(self._pick(rows))
+        while True:
+            chunk = list(itertools.islice(products, self.chunk_rows))
+            if not chunk:
+                return
+            yield chunk
+
+    async def iter_products(self) -> AsyncIterator[Iterator[Tuple[str, str]]]:
+        # Разбор файла блокирующий - каждый блок читается вне event loop
+        chunks = self._read_chunks()
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield iter(chunk)
+        finally:
+            chunks.close()
+
+class CSVSource(FileSource):
+    """CSV (разделитель , ; или табуляция определяется автоматически, BOM Excel допускается)"""
+
+    def __init__(self, path: str, encoding: str = "utf-8-sig", delimiter: Optional[str] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.encoding = encoding
+        self.delimiter = delimiter
+
+    def read_rows(self) -> Iterator[List[str]]:
+        with open(self.path, 'r', encoding=self.encoding, newline='') as f:
+            delimiter = self.delimiter
+            if delimiter is None:
+                sample = f.read(4096)
+                f.seek(0)
+                try:
+                    delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+                except csv.Error:
+                    delimiter = ','
+            yield from csv.reader(f, delimiter=delimiter)
+
+    def estimate_rows(self) -> Optional[int]:
+        return self._count_lines()
+
+class XLSXSource(FileSource):
+    """XLSX (нужен openpyxl; книга читается в режиме read_only, построчно)"""
+
+    def __init__(self, path: str, sheet: Optional[str] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.sheet = sheet
+
+    def read_rows(self) -> Iterator[List[str]]:
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("Для XLSX установите openpyxl: pip install openpyxl")
+
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[self.sheet] if self.sheet else workbook.active
+            for row in worksheet.iter_rows(values_only=True):
+                yield [cell_text(value) for value in row]
+        finally:
+            workbook.close()
+
+    def estimate_rows(self) -> Optional[int]:
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            return None
+
+        # Размер листа записан в самом файле (dimension), строки не читаются;
+        # некоторые генераторы XLSX его не пишут - тогда None
+        workbook = load_workbook(self.path, read_only=True)
+        try:
+            worksheet = workbook[self.sheet] if self.sheet else workbook.active
+            return worksheet.max_row
+        finally:
+            workbook.close()
+
+class JSONSource(FileSource):
+    """JSON: массив (разбирается по элементам) или JSON Lines (.jsonl - построчно);
+    файл целиком в память не загружается.
+
+    Элемент - [модель, цена] или {"model": ..., "price": ...}; заголовка нет.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        kwargs.setdefault("header", False)
+        super().__init__(path, **kwargs)
+
+    @staticmethod
+    def _row(item: Any) -> List[str]:
+        if isinstance(item, dict):
+            return [cell_text(item.get("model")), cell_text(item.get("price"))]
+        return [cell_text(value) for value in item]
+
+    def read_rows(self) -> Iterator[List[str]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            if self.path.suffix.lower() == '.jsonl':
+                for line in f:
+                    if line.strip():
+                        yield self._row(json.loads(line))
+            else:
+                for item in iter_json_array(f):
+                    yield self._row(item)
+
+    def estimate_rows(self) -> Optional[int]:
+        return self._count_lines() if self.path.suffix.lower() == '.jsonl' else None
+
+class RowValidator:
+    """Проверка строк импорта: слишком длинные значения отбрасываются,
+    нечисловые цены сохраняются как текст (так в прайсах оформлены заголовки разделов)"""
+
+    MAX_MODEL_LENGTH = 256
+    MAX_PRICE_LENGTH = 64
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.without_price = 0
+        self.examples: List[str] = []
+
+    def filter(self, products: Iterator[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        for model, price in products:
+            if len(model) > self.MAX_MODEL_LENGTH or len(price) > self.MAX_PRICE_LENGTH:
+                self.rejected += 1
+                if len(self.examples) < 3:
+                    self.examples.append(model[:40])
+                continue
+            if parse_price(price) is None:
+                self.without_price += 1
+            self.accepted += 1
+            yield model, price
+
+    async def wrap(self, chunks: AsyncIterator[Iterator[Tuple[str, str]]]) -> AsyncIterator[Iterator[Tuple[str, str]]]:
+        """Проверять блоки источника по мере чтения"""
+        async for chunk in chunks:
+            yield self.filter(chunk)
+
+FILE_SOURCES = {
+    '.csv': CSVSource,
+    '.txt': CSVSource,
+    '.xlsx': XLSXSource,
+    '.json': JSONSource,
+    '.jsonl': JSONSource,
+}
+
+def open_file_source(path: str, sheet: Optional[str] = None, **options) -> FileSource:
+    """Адаптер по расширению файла; относительный путь - от корня проекта.
+
+    sheet - лист книги XLSX (для остальных форматов не используется).
+    """
+    path = Path(path)
+    if not path.is_absolute():
+        path = config.BASE_DIR / path
+
+    source_class = FILE_SOURCES.get(path.suffix.lower())
+    if source_class is None:
+        raise ValueError(f"Неподдерживаемый формат файла: {path.suffix or path.name}")
+    if source_class is XLSXSource:
+        options["sheet"] = sheet
+    return source_class(str(path), **options)